@@ -2,159 +2,371 @@
 MaxCUL custom component for Home Assistant
 '''
 
+import hashlib
 import logging
+import os
 
 import voluptuous
 
 from homeassistant.config_entries import ConfigEntry
 
 from homeassistant.const import (
-    ATTR_DEVICE_ID,
-    CONF_DEVICES
+    CONF_DEVICES,
+    EVENT_HOMEASSISTANT_STOP
 )
 
 from homeassistant.core import (
     HomeAssistant,
-    ServiceCall
+    ServiceCall,
+    callback
 )
 
+from homeassistant.exceptions import HomeAssistantError
+
 import homeassistant.helpers.config_validation as cv
-from homeassistant.helpers.dispatcher import dispatcher_send
 from homeassistant.helpers import device_registry as dr
 
-from maxcul import (
-    MaxConnection,
-    EVENT_DEVICE_PAIRED,
-    EVENT_DEVICE_REPAIRED,
-    EVENT_SHUTTER_UPDATE,
-    EVENT_THERMOSTAT_UPDATE
+from custom_components.maxcul.capture import (
+    CaptureWriter,
+    async_replay,
+    capture_files
 )
 
+from custom_components.maxcul.pool import CulPool
 
+from custom_components.maxcul.store import DeviceStateStore
 
 LOGGER = logging.getLogger(__name__)
 
 DOMAIN = 'maxcul'
 
 CONF_CONNECTIONS = 'connections'
+CONF_POOL = 'pool'
+CONF_GROUPS = 'groups'
+CONF_MAX_DEVICES = 'max_devices'
+CONF_PENDING_DEVICES = 'pending_devices'
 CONF_DEVICE_PATH = 'device_path'
 
 CONF_SENDER_ID = 'sender_id'
+CONF_COMMAND_DEBOUNCE = 'command_debounce'
+CONF_STATE_HEARTBEAT = 'state_heartbeat'
+CONF_INSTRUMENTATION = 'instrumentation'
+CONF_CAPTURE = 'capture'
+CONF_GROUP_ID = 'group_id'
+CONF_LINKED_DEVICES = 'linked_devices'
+CONF_REGISTRY_FINGERPRINT = 'registry_fingerprint'
 
 SERVICE_CONF_DEVICE_PATH = 'device_path'
 SERVICE_CONF_DURATION = 'duration'
+SERVICE_CONF_PATH = 'path'
+SERVICE_CONF_SPEED = 'speed'
+
+SERVICE_ENABLE_PAIRING = 'enable_pairing'
+SERVICE_REPLAY_CAPTURE = 'replay_capture'
 
 ENABLE_PAIRING_SERVICE_SCHEMA = voluptuous.Schema({
-    voluptuous.Required(SERVICE_CONF_DEVICE_PATH): cv.string,
+    voluptuous.Optional(SERVICE_CONF_DEVICE_PATH): cv.string,
     voluptuous.Optional(SERVICE_CONF_DURATION, default=30): cv.positive_int
 })
 
+# a speed of 0 replays the capture as fast as possible
+REPLAY_CAPTURE_SERVICE_SCHEMA = voluptuous.Schema({
+    voluptuous.Required(SERVICE_CONF_PATH): cv.string,
+    voluptuous.Optional(SERVICE_CONF_DEVICE_PATH): cv.string,
+    voluptuous.Optional(SERVICE_CONF_SPEED, default=1.0): voluptuous.All(
+        voluptuous.Coerce(float),
+        voluptuous.Range(min=0)
+    )
+})
+
 SIGNAL_DEVICE_PAIRED = DOMAIN + '.device_paired'
 SIGNAL_DEVICE_REPAIRED = DOMAIN + '.device_repaired'
 SIGNAL_THERMOSTAT_UPDATE = DOMAIN + '.thermostat_update'
 SIGNAL_SHUTTER_UPDATE = DOMAIN + '.shutter_update'
+SIGNAL_BATTERY_UPDATE = DOMAIN + '.battery_update'
+SIGNAL_WALL_THERMOSTAT_UPDATE = DOMAIN + '.wall_thermostat_update'
+SIGNAL_PUSH_BUTTON_UPDATE = DOMAIN + '.push_button_update'
+SIGNAL_LINKS_CHANGED = DOMAIN + '.links_changed'
+SIGNAL_GROUPS_CHANGED = DOMAIN + '.groups_changed'
+SIGNAL_COMMAND_UPDATE = DOMAIN + '.command_update'
 
 ATTR_CONNECTION_DEVICE_PATH = 'connection_device_path'
 
+# temperature of the room measured by the wall thermostat a thermostat is linked to
+ATTR_ROOM_TEMPERATURE = 'room_temperature'
+
+# pymaxcul does not report the state of wall thermostats as an event
+EVENT_WALL_THERMOSTAT_UPDATE = 'wall_thermostat_update'
+
+DEFAULT_SENDER_ID = 0x123456
+
+# seconds to collect thermostat commands before sending only the latest one
+DEFAULT_COMMAND_DEBOUNCE = 1.0
+
+# minutes after which an unchanged state is written again, 0 to only write changes
+DEFAULT_STATE_HEARTBEAT = 0
+
+# the connection uses the constants above
+from custom_components.maxcul.connection import MaxCulConnection # pylint: disable=wrong-import-position
+
+
 async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry):
     ''' Set up MaxCUL custom component from a config entry '''
 
     if DOMAIN not in hass.data:
         hass.data[DOMAIN] = {
-            CONF_CONNECTIONS: {}
+            CONF_CONNECTIONS: {},
+            CONF_GROUPS: {},
+            CONF_MAX_DEVICES: {},
+            CONF_PENDING_DEVICES: {},
+            CONF_POOL: CulPool()
         }
 
     device_path = config_entry.data.get(CONF_DEVICE_PATH)
     sender_id = config_entry.options.get(CONF_SENDER_ID)
+    command_debounce = config_entry.options.get(CONF_COMMAND_DEBOUNCE, DEFAULT_COMMAND_DEBOUNCE)
+    state_heartbeat = config_entry.options.get(CONF_STATE_HEARTBEAT, DEFAULT_STATE_HEARTBEAT)
+    instrumentation = config_entry.options.get(CONF_INSTRUMENTATION, False)
+
+    capture = None
+    if config_entry.options.get(CONF_CAPTURE, False):
+        capture = CaptureWriter(
+            hass,
+            hass.config.path(f"{DOMAIN}_capture_{config_entry.entry_id}.bin")
+        )
+
+    state_store = DeviceStateStore(hass, _state_store_key(config_entry))
+    await state_store.async_load()
+    state_store.retain(config_entry.data.get(CONF_DEVICES).keys())
 
     connection = MaxCulConnection(
         hass,
         device_path=device_path,
-        sender_id=sender_id
+        sender_id=sender_id,
+        command_debounce=command_debounce,
+        state_heartbeat=state_heartbeat,
+        instrumentation=instrumentation,
+        capture=capture,
+        state_store=state_store,
+        pool=hass.data[DOMAIN][CONF_POOL]
     )
     connection.start()
 
+    async def _async_stop_connection(_):
+        connection.stop()
+
+        # the last records are still buffered, they must be written before shutdown
+        if connection.capture is not None:
+            await connection.capture.async_close()
+
+    config_entry.async_on_unload(
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop_connection)
+    )
+
     hass.data[DOMAIN][CONF_CONNECTIONS][device_path] = connection
+    # the devices of the entry are created by the platforms and reference the new connection
+    hass.data[DOMAIN][CONF_MAX_DEVICES][config_entry.entry_id] = {}
+
+    _async_reconcile_device_registry(hass, config_entry)
+
+    if not hass.services.has_service(DOMAIN, SERVICE_ENABLE_PAIRING):
+        async def _service_enable_pairing(service: ServiceCall):
+            await async_enable_pairing(hass, service)
+
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_ENABLE_PAIRING,
+            _service_enable_pairing,
+            schema=ENABLE_PAIRING_SERVICE_SCHEMA
+        )
+
+    if not hass.services.has_service(DOMAIN, SERVICE_REPLAY_CAPTURE):
+        async def _service_replay_capture(service: ServiceCall):
+            await async_replay_capture(hass, service)
+
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_REPLAY_CAPTURE,
+            _service_replay_capture,
+            schema=REPLAY_CAPTURE_SERVICE_SCHEMA
+        )
+
+    await hass.config_entries.async_forward_entry_setups(
+        config_entry,
+        ['climate', 'binary_sensor', 'sensor']
+    )
+
+    return True
 
-    device_registry = dr.async_get(hass)
-    for device_entry in dr.async_entries_for_config_entry(device_registry, config_entry.entry_id):
-        for (_, device_id) in device_entry.identifiers:
-            if device_id not in config_entry.data.get(CONF_DEVICES).keys():
-                device_registry.async_remove_device(device_entry.id)
 
-    def _service_enable_pairing(service: ServiceCall):
-        service_device_path = service.data[SERVICE_CONF_DEVICE_PATH]
-        duration = service.data[SERVICE_CONF_DURATION]
+async def async_enable_pairing(hass: HomeAssistant, service: ServiceCall):
+    '''
+    Enable pairing on the CUL device of the given path or, without path, on all of them
 
-        if service_device_path.replace('telnet://','') != device_path.replace('telnet://',''):
-            return
+    The service is registered once for all config entries and finds the connection of
+    the path in the pool of the domain.
+    '''
+    pool = hass.data[DOMAIN][CONF_POOL]
+    duration = service.data[SERVICE_CONF_DURATION]
 
+    if SERVICE_CONF_DEVICE_PATH in service.data:
+        connection = pool.connection(service.data[SERVICE_CONF_DEVICE_PATH])
+        if connection is None:
+            raise HomeAssistantError(
+                f"There is no CUL device {service.data[SERVICE_CONF_DEVICE_PATH]}"
+            )
+        connections = [connection]
+    else:
+        connections = pool.connections
+
+    for connection in connections:
         connection.enable_pairing(duration)
 
-    hass.services.async_register(
-        DOMAIN,
-        'enable_pairing',
-        _service_enable_pairing,
-        schema=ENABLE_PAIRING_SERVICE_SCHEMA
+
+async def async_replay_capture(hass: HomeAssistant, service: ServiceCall):
+    '''
+    Feed the received lines of a capture to the CUL device of the given path
+
+    The device path may be omitted if there is only one CUL device. Relative capture paths
+    are resolved in the configuration directory, other paths must be allowed external
+    directories.
+    '''
+    pool = hass.data[DOMAIN][CONF_POOL]
+
+    if SERVICE_CONF_DEVICE_PATH in service.data:
+        connection = pool.connection(service.data[SERVICE_CONF_DEVICE_PATH])
+        if connection is None:
+            raise HomeAssistantError(
+                f"There is no CUL device {service.data[SERVICE_CONF_DEVICE_PATH]}"
+            )
+    elif len(pool.connections) == 1:
+        connection = pool.connections[0]
+    else:
+        raise HomeAssistantError('The device path is required with more than one CUL device')
+
+    path = hass.config.path(service.data[SERVICE_CONF_PATH])
+    if (
+        os.path.commonpath([os.path.abspath(path), hass.config.config_dir]) != hass.config.config_dir
+        and not hass.config.is_allowed_path(path)
+    ):
+        raise HomeAssistantError(f"Reading the capture {path} is not allowed")
+
+    if not await hass.async_add_executor_job(capture_files, path):
+        raise HomeAssistantError(f"There is no capture {path}")
+
+    speed = service.data[SERVICE_CONF_SPEED] or None
+
+    try:
+        count = await async_replay(hass, connection, path, speed)
+    except ValueError as err:
+        raise HomeAssistantError(str(err)) from err
+
+    LOGGER.info(f"Replayed {count} lines of capture {path} on {connection.device_path}")
+
+
+async def async_remove_entry(hass: HomeAssistant, config_entry: ConfigEntry):
+    ''' Remove the stored device states of a removed config entry '''
+    await DeviceStateStore(hass, _state_store_key(config_entry)).async_remove()
+
+
+def _state_store_key(config_entry: ConfigEntry) -> str:
+    return f"{DOMAIN}.{config_entry.entry_id}"
+
+
+@callback
+def _async_reconcile_device_registry(hass: HomeAssistant, config_entry: ConfigEntry):
+    '''
+    Remove the devices of the config entry from the device registry which are not configured
+
+    The fingerprint of the configured devices is stored in the config entry once their
+    stale devices are removed. Devices only get registered once they are configured, so
+    while the fingerprint is unchanged there is nothing to remove and the registry is not
+    walked.
+    '''
+    known_devices = set(config_entry.data.get(CONF_DEVICES))
+    fingerprint = _device_fingerprint(known_devices)
+
+    # the fingerprint only covers the configured device ids, which are written to the config
+    # entry on every change of the device map. Devices added to or left in the registry by
+    # other means are deliberately ignored until the device map changes again.
+    if config_entry.data.get(CONF_REGISTRY_FINGERPRINT) == fingerprint:
+        return
+
+    device_registry = dr.async_get(hass)
+    stale_devices = [
+        device_entry.id
+        for device_entry in dr.async_entries_for_config_entry(device_registry, config_entry.entry_id)
+        if not known_devices.issuperset(device_id for (_, device_id) in device_entry.identifiers)
+    ]
+
+    LOGGER.debug(f"Removing {len(stale_devices)} stale device(s) of config entry {config_entry.entry_id}")
+
+    removed = True
+    for device_entry_id in stale_devices:
+        try:
+            device_registry.async_remove_device(device_entry_id)
+        except Exception as err: # pylint: disable=broad-except
+            LOGGER.error(f"Exception <{err}> was raised while removing stale device {device_entry_id}")
+            removed = False
+
+    # keep the previous fingerprint, so the next setup tries again
+    if not removed:
+        return
+
+    hass.config_entries.async_update_entry(
+        config_entry,
+        data={
+            **config_entry.data,
+            CONF_REGISTRY_FINGERPRINT: fingerprint
+        }
     )
 
-    await hass.config_entries.async_forward_entry_setups(config_entry, ['climate', 'binary_sensor'])
 
-    return True
+def _device_fingerprint(device_ids) -> str:
+    return hashlib.sha256(','.join(sorted(device_ids)).encode()).hexdigest()
 
 
-class MaxCulConnection:
+@callback
+def async_register_devices(hass: HomeAssistant, config_entry: ConfigEntry, devices: dict):
+    '''
+    Queue devices for being stored in the config entry
 
-    def __init__(self, hass: HomeAssistant, device_path: str, sender_id=None):
-        self._hass = hass
-        self._device_path = device_path
+    Registrations made during the same event loop iteration (a platform setup pass or a
+    burst of pairing events) are committed together in a single config entry update.
+    '''
 
-        if not sender_id:
-            sender_id = 0x123456
+    pending_devices = hass.data[DOMAIN][CONF_PENDING_DEVICES]
 
-        def callback(event, payload):
-            self._callback(event, payload)
+    if config_entry.entry_id not in pending_devices:
+        pending_devices[config_entry.entry_id] = {}
+        hass.loop.call_soon(_async_commit_devices, hass, config_entry)
 
-        self._connection = MaxConnection(
-            device_path=device_path,
-            callback=callback,
-            sender_id=sender_id
-        )
+    pending_devices[config_entry.entry_id].update(devices)
 
-    def start(self):
-        ''' Start the connection thread '''
-        self._connection.start()
-
-    def _callback(self, event, payload):
-        if event == EVENT_DEVICE_PAIRED:
-            payload[ATTR_CONNECTION_DEVICE_PATH] = self._device_path
-            dispatcher_send(self._hass, SIGNAL_DEVICE_PAIRED, payload)
-
-        elif event == EVENT_DEVICE_REPAIRED:
-            payload[ATTR_CONNECTION_DEVICE_PATH] = self._device_path
-            dispatcher_send(self._hass, SIGNAL_DEVICE_REPAIRED, payload)
-
-        elif event == EVENT_THERMOSTAT_UPDATE:
-            dispatcher_send(self._hass, SIGNAL_THERMOSTAT_UPDATE, payload)
-
-        elif event == EVENT_SHUTTER_UPDATE:
-            dispatcher_send(self._hass, SIGNAL_SHUTTER_UPDATE, payload)
-
-    def enable_pairing(self, duration):
-        ''' Enable pairing of devices '''
-        LOGGER.debug(f"Enabling pairing on {self._device_path} for {duration} s")
-        self._connection.enable_pairing(duration)
-
-    def add_paired_device(self, device_id):
-        ''' Add a device id to the paired devices '''
-        LOGGER.debug(f"Adding device {device_id}")
-        self._connection.add_paired_device(device_id)
-
-    def set_temperature(self, device_id: int, target_temperature: float, mode):
-        ''' Set the target temperature of a thermostat device '''
-        LOGGER.debug(f"Setting temperature on {device_id} to {target_temperature} (mode: {mode})")
-        self._connection.set_temperature(
-            device_id,
-            target_temperature,
-            mode
-        )
+
+@callback
+def _async_commit_devices(hass: HomeAssistant, config_entry: ConfigEntry):
+    pending_devices = hass.data[DOMAIN][CONF_PENDING_DEVICES].pop(config_entry.entry_id, {})
+
+    stored_devices = config_entry.data.get(CONF_DEVICES)
+    changed_devices = {
+        device_id: device
+        for device_id, device in pending_devices.items()
+        if stored_devices.get(device_id) != device
+    }
+
+    if not changed_devices:
+        return
+
+    LOGGER.debug(f"Storing {len(changed_devices)} device(s) in config entry {config_entry.entry_id}")
+
+    hass.config_entries.async_update_entry(
+        config_entry,
+        data={
+            **config_entry.data,
+            CONF_DEVICES: {
+                **stored_devices,
+                **changed_devices
+            }
+        }
+    )
@@ -21,11 +21,9 @@ from homeassistant.core import (
 )
 
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
-from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.entity import EntityCategory
 
 from maxcul._const import (
-    ATTR_BATTERY_LOW,
     ATTR_DEVICE_ID,
     ATTR_DEVICE_TYPE,
     ATTR_DEVICE_SERIAL,
@@ -34,16 +32,16 @@ from maxcul._const import (
 
 from custom_components.maxcul import (
     ATTR_CONNECTION_DEVICE_PATH,
-    CONF_CONNECTIONS,
     CONF_DEVICE_PATH,
-    DOMAIN,
     SIGNAL_DEVICE_PAIRED,
     SIGNAL_DEVICE_REPAIRED,
-    SIGNAL_SHUTTER_UPDATE,
-    SIGNAL_THERMOSTAT_UPDATE,
-    MaxCulConnection
+    SIGNAL_BATTERY_UPDATE,
+    async_register_devices
 )
 
+from custom_components.maxcul.device import async_get_device
+from custom_components.maxcul.entity import MaxDeviceEntity
+from custom_components.maxcul.instrumentation import STAGE_ENTITY_UPDATE
 from custom_components.maxcul.max_shutter import MaxShutter
 
 
@@ -51,18 +49,23 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
     ''' Set up the binary sensor platform for the MaxCUL integration from a config entry. '''
 
     device_path = config_entry.data.get(CONF_DEVICE_PATH)
-    connection = hass.data[DOMAIN][CONF_CONNECTIONS][device_path]
 
     devices = []
+    registrations = {}
     for device_id, device in config_entry.data.get(CONF_DEVICES).items():
-        devices.append(MaxBattery(connection, device_id, device[CONF_NAME]))
+        max_device = async_get_device(hass, config_entry, device_id, device[CONF_NAME], device[CONF_TYPE])
+        devices.append(MaxBattery(max_device))
         if device[CONF_TYPE] == SHUTTER_CONTACT:
-            devices.append(
-                MaxShutter(hass, config_entry, connection, device_id, device[CONF_NAME])
-            )
+            devices.append(MaxShutter(max_device))
+            registrations[device_id] = {
+                CONF_NAME: device[CONF_NAME],
+                CONF_TYPE: SHUTTER_CONTACT
+            }
 
     async_add_devices(devices)
 
+    async_register_devices(hass, config_entry, registrations)
+
     @callback
     def paired_callback(payload):
         connection_device_path = payload.get(ATTR_CONNECTION_DEVICE_PATH)
@@ -76,13 +79,24 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
         if device_id in devices:
             return
 
+        device_type = payload.get(ATTR_DEVICE_TYPE)
+        max_device = async_get_device(hass, config_entry, device_id, device_name, device_type)
+
         devices_to_add = []
-        devices_to_add.append(MaxBattery(connection, device_id, device_name))
+        devices_to_add.append(MaxBattery(max_device))
 
-        device_type = payload.get(ATTR_DEVICE_TYPE)
         if device_type is SHUTTER_CONTACT:
-            devices_to_add.append(
-                MaxShutter(hass, config_entry, connection, device_id, device_name)
+            devices_to_add.append(MaxShutter(max_device))
+
+            async_register_devices(
+                hass,
+                config_entry,
+                {
+                    device_id: {
+                        CONF_NAME: device_name,
+                        CONF_TYPE: SHUTTER_CONTACT
+                    }
+                }
             )
 
         async_add_devices(devices_to_add)
@@ -91,57 +105,32 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
     async_dispatcher_connect(hass, SIGNAL_DEVICE_REPAIRED, paired_callback)
 
 
-class MaxBattery(BinarySensorEntity):
+class MaxBattery(MaxDeviceEntity, BinarySensorEntity):
     ''' Battery sensor class of Max devices '''
 
-    def __init__(self, connection: MaxCulConnection, device_id, name):
-        self._name = name
-        self._device_id = device_id
-        self._connection = connection
-
-        self._battery_low = None
-
-        self._connection.add_paired_device(self.sender_id)
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        return {
-            "identifiers": {
-                (DOMAIN, self._device_id)
-            },
-            "name": self.name,
-        }
-
     async def async_added_to_hass(self) -> None:
         @callback
-        def update(payload):
-            device_id = payload.get(ATTR_DEVICE_ID)
-            if device_id != self.sender_id:
-                return
-
-            self._battery_low = payload.get(ATTR_BATTERY_LOW, None)
-
-            self.async_schedule_update_ha_state()
-
-        async_dispatcher_connect(self.hass, SIGNAL_THERMOSTAT_UPDATE, update)
-        async_dispatcher_connect(self.hass, SIGNAL_SHUTTER_UPDATE, update)
+        def update(_payload):
+            # the connection only signals flips of the flag of the device
+            started = self._connection.metrics.start()
+            self.async_write_state_on_change(True)
+            self._connection.metrics.record(STAGE_ENTITY_UPDATE, started)
+
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                self._connection.device_signal(SIGNAL_BATTERY_UPDATE, self.sender_id),
+                update
+            )
+        )
 
     @property
     def name(self) -> str:
-        return self._name + '-battery'
+        return self._device.name + '-battery'
 
     @property
     def unique_id(self) -> str:
-        return self._device_id + '-battery'
-
-    @property
-    def sender_id(self) -> int:
-        ''' Return the RF address of the device '''
-        return int(self._device_id)
-
-    @property
-    def should_poll(self) -> bool:
-        return False
+        return self._device.device_id + '-battery'
 
     @property
     def device_class(self) -> str:
@@ -152,5 +141,5 @@ class MaxBattery(BinarySensorEntity):
         return EntityCategory.DIAGNOSTIC
 
     @property
-    def is_on(self) -> bool:
-        return self._battery_low
+    def is_on(self) -> bool or None:
+        return self._device.battery_low
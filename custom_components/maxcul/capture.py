@@ -0,0 +1,229 @@
+'''
+Capture of the raw lines exchanged with a CUL device and their replay
+
+A capture is a sequence of files, each starting with a magic header followed by records
+of a monotonic timestamp, the direction and the line. The writer buffers records on the
+event loop and appends them from the executor, rotating the files at a size cap.
+'''
+
+import asyncio
+import logging
+import os
+import struct
+import time
+from typing import Iterator, NamedTuple
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+LOGGER = logging.getLogger(__name__)
+
+CAPTURE_MAGIC = b'MAXCULC1'
+
+# monotonic timestamp, direction and length of the line
+RECORD_HEADER = struct.Struct('<dBH')
+
+DIRECTION_RECEIVED = 0
+DIRECTION_SENT = 1
+
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 2
+
+# seconds records are buffered before they are written
+FLUSH_INTERVAL = 5
+
+# records are dropped instead of buffered without bound if the disk does not keep up
+MAX_BUFFERED_BYTES = 1024 * 1024
+
+# lines replayed as fast as possible between yielding to the event loop
+REPLAY_BATCH = 100
+
+
+class CaptureRecord(NamedTuple):
+    ''' A line exchanged with a CUL device '''
+
+    timestamp: float
+    direction: int
+    line: str
+
+
+class CaptureWriter:
+    ''' Append-only writer of a size capped, rotating capture '''
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        path: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backup_count: int = DEFAULT_BACKUP_COUNT
+    ):
+        self._hass = hass
+        self._path = path
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+
+        self._buffer = bytearray()
+        self._dropped = 0
+        self._cancel_flush = None
+        self._writing: asyncio.Future or None = None
+
+    @property
+    def path(self) -> str:
+        ''' Return the path of the current capture file '''
+        return self._path
+
+    @property
+    def dropped(self) -> int:
+        ''' Return the number of records dropped because the buffer was full '''
+        return self._dropped
+
+    @callback
+    def record(self, direction: int, line: str, timestamp: float or None = None):
+        ''' Buffer a line exchanged with the CUL device '''
+        data = line.encode('ascii', errors='replace')
+        if len(self._buffer) + RECORD_HEADER.size + len(data) > MAX_BUFFERED_BYTES:
+            self._dropped += 1
+            return
+
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        self._buffer += RECORD_HEADER.pack(timestamp, direction, len(data))
+        self._buffer += data
+
+        if self._cancel_flush is None:
+            self._cancel_flush = async_call_later(self._hass, FLUSH_INTERVAL, self._flush)
+
+    @callback
+    def flush(self):
+        ''' Write the buffered records from the executor '''
+        if self._cancel_flush is not None:
+            self._cancel_flush()
+            self._cancel_flush = None
+
+        # one write at a time keeps the records in order, the next flush is scheduled once it is done
+        if not self._buffer or self._writing is not None:
+            return
+
+        data = bytes(self._buffer)
+        self._buffer.clear()
+
+        self._writing = self._hass.async_add_executor_job(self._write, data)
+        self._writing.add_done_callback(self._written)
+
+    async def async_close(self):
+        ''' Write all buffered records '''
+        while self._writing is not None or self._buffer:
+            if self._writing is None:
+                self.flush()
+
+            writing = self._writing
+            await asyncio.wait([writing])
+
+            # awaiting a finished write does not yield, its done callback runs on the loop
+            while self._writing is writing:
+                await asyncio.sleep(0)
+
+    @callback
+    def _flush(self, _):
+        self._cancel_flush = None
+        self.flush()
+
+    @callback
+    def _written(self, future: asyncio.Future):
+        self._writing = None
+        if not future.cancelled() and future.exception() is not None:
+            LOGGER.error(f"Unable to write capture {self._path}: {future.exception()}")
+
+        if self._buffer and self._cancel_flush is None:
+            self._cancel_flush = async_call_later(self._hass, FLUSH_INTERVAL, self._flush)
+
+    def _write(self, data: bytes):
+        try:
+            size = os.path.getsize(self._path)
+        except FileNotFoundError:
+            size = 0
+
+        if size and size + len(data) > self._max_bytes:
+            self._rotate()
+            size = 0
+
+        with open(self._path, 'ab') as capture:
+            if not size:
+                capture.write(CAPTURE_MAGIC)
+            capture.write(data)
+
+    def _rotate(self):
+        for index in range(self._backup_count, 0, -1):
+            source = f"{self._path}.{index - 1}" if index > 1 else self._path
+            if os.path.exists(source):
+                os.replace(source, f"{self._path}.{index}")
+
+        if not self._backup_count:
+            os.remove(self._path)
+
+
+def capture_files(path: str) -> list[str]:
+    ''' Return the existing files of a capture from the oldest to the current one '''
+    backups = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        backups.append(f"{path}.{index}")
+        index += 1
+
+    return [*reversed(backups), *([path] if os.path.exists(path) else [])]
+
+
+def read_capture(path: str) -> Iterator[CaptureRecord]:
+    ''' Read the records of a capture including its rotated files '''
+    for file_path in capture_files(path):
+        with open(file_path, 'rb') as capture:
+            if capture.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+                raise ValueError(f"{file_path} is not a MaxCUL capture")
+
+            while header := capture.read(RECORD_HEADER.size):
+                if len(header) < RECORD_HEADER.size:
+                    break
+
+                timestamp, direction, length = RECORD_HEADER.unpack(header)
+                data = capture.read(length)
+                if len(data) < length:
+                    break
+
+                yield CaptureRecord(timestamp, direction, data.decode('ascii'))
+
+
+async def async_replay(
+    hass: HomeAssistant,
+    connection,
+    path: str,
+    speed: float or None = 1.0
+) -> int:
+    '''
+    Feed the received lines of a capture to a connection
+
+    The lines are fed with their recorded timing divided by speed or as fast as possible
+    if speed is None. Return the number of replayed lines.
+    '''
+    records = await hass.async_add_executor_job(
+        lambda: [record for record in read_capture(path) if record.direction == DIRECTION_RECEIVED]
+    )
+    if not records:
+        return 0
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    first = records[0].timestamp
+
+    for index, record in enumerate(records):
+        if speed is not None:
+            delay = (record.timestamp - first) / speed - (loop.time() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        elif index % REPLAY_BATCH == REPLAY_BATCH - 1:
+            await asyncio.sleep(0)
+
+        connection.feed_line(record.line)
+
+    return len(records)
@@ -2,9 +2,19 @@
 Climate platform module of MaxCUL integration
 '''
 
+import voluptuous
+
+from homeassistant.components.climate import DOMAIN as CLIMATE_DOMAIN
+
+from homeassistant.components.climate.const import (
+    HVACMode,
+    ATTR_HVAC_MODE
+)
+
 from homeassistant.config_entries import ConfigEntry
 
 from homeassistant.const import (
+    ATTR_TEMPERATURE,
     CONF_DEVICES,
     CONF_NAME,
     CONF_TYPE
@@ -12,28 +22,71 @@ from homeassistant.const import (
 
 from homeassistant.core import (
     HomeAssistant,
+    ServiceCall,
     callback
 )
 
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers import entity_platform
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.service import async_extract_entity_ids
 
 from maxcul._const import (
     ATTR_DEVICE_ID,
     ATTR_DEVICE_TYPE,
     ATTR_DEVICE_SERIAL,
-    HEATING_THERMOSTAT
+    HEATING_THERMOSTAT,
+    WALL_MOUNTED_THERMOSTAT
 )
 
 from custom_components.maxcul import (
     ATTR_CONNECTION_DEVICE_PATH,
     CONF_CONNECTIONS,
     CONF_DEVICE_PATH,
+    CONF_GROUP_ID,
+    CONF_GROUPS,
+    CONF_LINKED_DEVICES,
     DOMAIN,
     SIGNAL_DEVICE_PAIRED,
-    SIGNAL_DEVICE_REPAIRED
+    SIGNAL_DEVICE_REPAIRED,
+    SIGNAL_GROUPS_CHANGED,
+    async_register_devices
 )
 
-from custom_components.maxcul.max_thermostat import MaxThermostat
+from custom_components.maxcul.device import async_get_device
+from custom_components.maxcul.max_group import MaxGroupThermostat
+from custom_components.maxcul.max_thermostat import MaxThermostat, MaxWallThermostat
+
+from custom_components.maxcul.week_program import (
+    ATTR_WEEK_PROGRAM,
+    WEEK_PROGRAM_SCHEMA
+)
+
+CLIMATE_DEVICE_TYPES = (HEATING_THERMOSTAT, WALL_MOUNTED_THERMOSTAT)
+
+SERVICE_SET_GROUP_ID = 'set_group_id'
+SERVICE_SET_GROUP_TEMPERATURE = 'set_group_temperature'
+SERVICE_SET_WEEK_PROGRAM = 'set_week_program'
+
+SET_GROUP_ID_SERVICE_SCHEMA = {
+    voluptuous.Required(CONF_GROUP_ID): voluptuous.All(
+        voluptuous.Coerce(int),
+        voluptuous.Range(min=0, max=255)
+    )
+}
+
+SET_WEEK_PROGRAM_SERVICE_SCHEMA = {
+    voluptuous.Required(ATTR_WEEK_PROGRAM): WEEK_PROGRAM_SCHEMA
+}
+
+SET_GROUP_TEMPERATURE_SERVICE_SCHEMA = cv.make_entity_service_schema({
+    voluptuous.Required(ATTR_TEMPERATURE): voluptuous.Coerce(float),
+    voluptuous.Optional(ATTR_HVAC_MODE): voluptuous.In([
+        HVACMode.OFF,
+        HVACMode.AUTO,
+        HVACMode.HEAT
+    ])
+})
 
 
 async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, async_add_devices):
@@ -42,18 +95,53 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
     device_path = config_entry.data.get(CONF_DEVICE_PATH)
     connection = hass.data[DOMAIN][CONF_CONNECTIONS][device_path]
 
-    devices = [
-        MaxThermostat(
-            hass,
-            config_entry,
-            connection,
-            device_id,
-            device[CONF_NAME]
-        )
+    registrations = {
+        device_id: device
         for device_id, device in config_entry.data.get(CONF_DEVICES).items()
-        if device[CONF_TYPE] == HEATING_THERMOSTAT
-    ]
-    async_add_devices(devices)
+        if device[CONF_TYPE] in CLIMATE_DEVICE_TYPES
+    }
+
+    thermostats = {
+        device_id: _create_thermostat(hass, config_entry, device_id, device)
+        for device_id, device in registrations.items()
+    }
+    async_add_devices(list(thermostats.values()))
+
+    async_register_devices(hass, config_entry, registrations)
+
+    groups = hass.data[DOMAIN][CONF_GROUPS].setdefault(config_entry.entry_id, {})
+
+    @callback
+    def update_groups():
+        members = {}
+        for thermostat in thermostats.values():
+            if thermostat.group_id:
+                members.setdefault(thermostat.group_id, []).append(thermostat.sender_id)
+
+        new_groups = []
+        for group_id, device_ids in members.items():
+            if group_id in groups:
+                groups[group_id].set_members(device_ids)
+            else:
+                groups[group_id] = MaxGroupThermostat(config_entry, connection, group_id, device_ids)
+                new_groups.append(groups[group_id])
+
+        for group_id in set(groups) - set(members):
+            hass.async_create_task(groups.pop(group_id).async_remove())
+
+        if new_groups:
+            async_add_devices(new_groups)
+
+    update_groups()
+
+    @callback
+    def groups_changed_callback(entry_id):
+        if entry_id == config_entry.entry_id:
+            update_groups()
+
+    config_entry.async_on_unload(
+        async_dispatcher_connect(hass, SIGNAL_GROUPS_CHANGED, groups_changed_callback)
+    )
 
     @callback
     def paired_callback(payload):
@@ -62,7 +150,7 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
             return
 
         device_type = payload.get(ATTR_DEVICE_TYPE)
-        if device_type is not HEATING_THERMOSTAT:
+        if device_type not in CLIMATE_DEVICE_TYPES:
             return
 
         device_id = str(payload.get(ATTR_DEVICE_ID))
@@ -72,8 +160,92 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
         if device_id in devices:
             return
 
-        device = MaxThermostat(hass, config_entry, connection, device_id, device_name)
+        registration = {
+            CONF_NAME: device_name,
+            CONF_TYPE: device_type
+        }
+
+        device = _create_thermostat(hass, config_entry, device_id, registration)
+        thermostats[device_id] = device
         async_add_devices([device])
 
+        async_register_devices(hass, config_entry, {device_id: registration})
+
     async_dispatcher_connect(hass, SIGNAL_DEVICE_PAIRED, paired_callback)
     async_dispatcher_connect(hass, SIGNAL_DEVICE_REPAIRED, paired_callback)
+
+    platform = entity_platform.async_get_current_platform()
+    platform.async_register_entity_service(
+        SERVICE_SET_GROUP_ID,
+        SET_GROUP_ID_SERVICE_SCHEMA,
+        'async_set_group_id'
+    )
+    platform.async_register_entity_service(
+        SERVICE_SET_WEEK_PROGRAM,
+        SET_WEEK_PROGRAM_SERVICE_SCHEMA,
+        'async_set_week_program'
+    )
+
+    if not hass.services.has_service(DOMAIN, SERVICE_SET_GROUP_TEMPERATURE):
+        async def _service_set_group_temperature(service: ServiceCall):
+            await async_set_group_temperature(hass, service)
+
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_SET_GROUP_TEMPERATURE,
+            _service_set_group_temperature,
+            schema=SET_GROUP_TEMPERATURE_SERVICE_SCHEMA
+        )
+
+
+def _create_thermostat(
+    hass: HomeAssistant,
+    config_entry: ConfigEntry,
+    device_id: str,
+    device: dict
+) -> MaxThermostat:
+    max_device = async_get_device(hass, config_entry, device_id, device[CONF_NAME], device[CONF_TYPE])
+
+    if device[CONF_TYPE] == WALL_MOUNTED_THERMOSTAT:
+        # known wall thermostats are the keys of the link table, even without linked thermostats
+        max_device.connection.set_links(max_device.rf_address, device.get(CONF_LINKED_DEVICES, []))
+        return MaxWallThermostat(max_device, device.get(CONF_GROUP_ID, 0))
+
+    return MaxThermostat(max_device, device.get(CONF_GROUP_ID, 0))
+
+
+async def async_set_group_temperature(hass: HomeAssistant, service: ServiceCall):
+    '''
+    Set the target temperature of the selected thermostats
+
+    Thermostats covering all members of a MAX! group are set with one group message, the
+    remaining thermostats are set one by one.
+    '''
+
+    component = hass.data[CLIMATE_DOMAIN]
+    kwargs = {
+        key: value
+        for key, value in service.data.items()
+        if key in (ATTR_TEMPERATURE, ATTR_HVAC_MODE)
+    }
+
+    selected_thermostats = {}
+    for entity_id in await async_extract_entity_ids(hass, service):
+        entity = component.get_entity(entity_id)
+
+        if isinstance(entity, MaxGroupThermostat):
+            await entity.async_set_temperature(**kwargs)
+
+        elif isinstance(entity, MaxThermostat):
+            key = (entity.platform.config_entry.entry_id, entity.group_id)
+            selected_thermostats.setdefault(key, []).append(entity)
+
+    for (entry_id, group_id), thermostats in selected_thermostats.items():
+        group = hass.data[DOMAIN][CONF_GROUPS].get(entry_id, {}).get(group_id)
+
+        if group is not None and set(group.device_ids) == {t.sender_id for t in thermostats}:
+            await group.async_set_temperature(**kwargs)
+            continue
+
+        for thermostat in thermostats:
+            await thermostat.async_set_temperature(**kwargs)
@@ -0,0 +1,76 @@
+'''
+Tracking of outbound commands awaiting an ACK of their receiver
+'''
+
+from typing import Any, Callable, Hashable
+
+from maxcul._messages import MoritzMessage
+
+from custom_components.maxcul.instrumentation import LatencyHistogram
+
+ATTR_COMMAND_STATE = 'command_state'
+
+COMMAND_PENDING = 'pending'
+COMMAND_ACKNOWLEDGED = 'acknowledged'
+COMMAND_FAILED = 'failed'
+
+# upper bounds in ms of the round trip buckets, commands may wait for transmit credits
+ROUND_TRIP_BOUNDS = (250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000, 300000)
+
+
+class OutstandingCommand:
+    ''' A sent command waiting for its ACK '''
+
+    __slots__ = ('msg', 'key', 'attempt', 'issued_at', 'acknowledged', 'cancel_resend')
+
+    def __init__(
+        self,
+        msg: MoritzMessage,
+        key: Hashable,
+        issued_at: float,
+        acknowledged: Callable[[], None] or None = None
+    ):
+        self.msg = msg
+        self.key = key
+        self.attempt = 1
+        self.issued_at = issued_at
+        self.acknowledged = acknowledged
+        self.cancel_resend: Callable[[], None] or None = None
+
+    def cancel(self):
+        ''' Cancel a scheduled resend of the command '''
+        if self.cancel_resend:
+            self.cancel_resend()
+            self.cancel_resend = None
+
+
+class CommandStats:
+    ''' Round trip times and outcomes of the commands sent to a device '''
+
+    def __init__(self):
+        self.sent = 0
+        self.retries = 0
+        self.acknowledged = 0
+        self.failed = 0
+        self.round_trip = LatencyHistogram(ROUND_TRIP_BOUNDS)
+
+    @property
+    def failure_rate(self) -> float or None:
+        ''' Return the share of completed commands which were not acknowledged '''
+        completed = self.acknowledged + self.failed
+        if not completed:
+            return None
+
+        return self.failed / completed
+
+    def as_dict(self) -> dict[str, Any]:
+        ''' Return a summary of the statistics '''
+        return {
+            'sent': self.sent,
+            'retries': self.retries,
+            'acknowledged': self.acknowledged,
+            'failed': self.failed,
+            'failure_rate': self.failure_rate,
+            'p50_ms': self.round_trip.percentile(50),
+            'p95_ms': self.round_trip.percentile(95)
+        }
@@ -20,26 +20,40 @@ from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.components import usb
 
-from serial import Serial
-from maxcul._telnet import TelnetSerial
 import serial.tools.list_ports
 import voluptuous as vol
 
 from custom_components.maxcul import (
+    CONF_CAPTURE,
+    CONF_COMMAND_DEBOUNCE,
     CONF_DEVICE_PATH,
+    CONF_INSTRUMENTATION,
     CONF_SENDER_ID,
+    CONF_STATE_HEARTBEAT,
+    DEFAULT_COMMAND_DEBOUNCE,
+    DEFAULT_STATE_HEARTBEAT,
     DOMAIN
 )
 
+from custom_components.maxcul.transport import (
+    TELNET_PREFIX,
+    async_probe_cul,
+    async_probe_culs
+)
+
 CONF_MANUAL_PATH = 'Enter manually'
 
 CONF_DEVICE_TYPE = 'device_type'
 
+CUL_DETECTED = 'CUL detected'
+
 class MaxculFlowHandler(ConfigFlow, domain=DOMAIN):
     ''' Config flow handler for MaxCUL custom component '''
 
     def __init__(self) -> None:
         self._com_ports = []
+        self._device_paths = {}
+        self._cul_versions = None
 
     async def async_step_user(self, user_input=None) -> FlowResult:
         self._com_ports = await self.hass.async_add_executor_job(serial.tools.list_ports.comports)
@@ -62,16 +76,23 @@ class MaxculFlowHandler(ConfigFlow, domain=DOMAIN):
     async def async_step_device_picker(self, user_input=None) -> FlowResult:
         ''' Step for picking a serial device '''
 
-        list_of_ports = [
-            f"{p}, s/n: {p.serial_number or 'n/a'}"
-            + (f" - {p.manufacturer}" if p.manufacturer else '')
-            for p in self._com_ports
-        ]
-
-        if not list_of_ports:
+        if not self._com_ports:
             return await self.async_step_pick_host()
 
-        list_of_ports.append(CONF_MANUAL_PATH)
+        if self._cul_versions is None:
+            await self._async_probe_com_ports()
+
+        # ports with a detected CUL device first, keeping the order of the others
+        ports = sorted(
+            self._com_ports,
+            key=lambda p: self._cul_versions.get(p.device) is None
+        )
+        list_of_ports = {
+            f"{p}, s/n: {p.serial_number or 'n/a'}"
+            + (f" - {p.manufacturer}" if p.manufacturer else '')
+            + (f" - {CUL_DETECTED}" if self._cul_versions.get(p.device) else ''): p
+            for p in ports
+        }
 
         errors = {}
 
@@ -80,12 +101,10 @@ class MaxculFlowHandler(ConfigFlow, domain=DOMAIN):
             if user_selection == CONF_MANUAL_PATH:
                 return await self.async_step_manual_device_path()
 
-            port = self._com_ports[list_of_ports.index(user_selection)]
-            device_path = await self.hass.async_add_executor_job(
-                usb.get_serial_by_id, port.device
-            )
+            port = list_of_ports[user_selection]
+            device_path = self._device_paths[port.device]
 
-            if await test_connection(device_path):
+            if self._cul_versions.get(port.device) or await test_connection(device_path):
                 title = f"{port.description}, s/n: {port.serial_number or 'n/a'}"
                 title += f" - {port.manufacturer}" if port.manufacturer else ''
 
@@ -100,7 +119,7 @@ class MaxculFlowHandler(ConfigFlow, domain=DOMAIN):
             errors['base'] = 'cannot_connect_to_device'
 
         schema = vol.Schema({
-            vol.Required(CONF_DEVICE_PATH): vol.In(list_of_ports)
+            vol.Required(CONF_DEVICE_PATH): vol.In([*list_of_ports, CONF_MANUAL_PATH])
         })
         return self.async_show_form(step_id='device_picker', data_schema=schema, errors=errors)
 
@@ -137,7 +156,7 @@ class MaxculFlowHandler(ConfigFlow, domain=DOMAIN):
             host = user_input[CONF_HOST]
             port = user_input[CONF_PORT]
 
-            device_path='telnet://' + host + ':' + str(port)
+            device_path = TELNET_PREFIX + host + ':' + str(port)
 
             if await test_connection(device_path):
                 return self.async_create_entry(
@@ -156,6 +175,30 @@ class MaxculFlowHandler(ConfigFlow, domain=DOMAIN):
         })
         return self.async_show_form(step_id='pick_host', data_schema=schema, errors=errors)
 
+    async def _async_probe_com_ports(self):
+        ''' Look for CUL devices on all serial ports which are not configured yet '''
+
+        configured_device_paths = {
+            entry.data.get(CONF_DEVICE_PATH)
+            for entry in self._async_current_entries()
+        }
+
+        for port in self._com_ports:
+            self._device_paths[port.device] = await self.hass.async_add_executor_job(
+                usb.get_serial_by_id, port.device
+            )
+
+        # probing a port in use would steal the replies of its CUL from the running connection
+        self._cul_versions = await async_probe_culs(
+            self.hass.loop,
+            [
+                port.device
+                for port in self._com_ports
+                if port.device not in configured_device_paths
+                and self._device_paths[port.device] not in configured_device_paths
+            ]
+        )
+
     @staticmethod
     @callback
     def async_get_options_flow(config_entry: ConfigEntry):
@@ -164,40 +207,7 @@ class MaxculFlowHandler(ConfigFlow, domain=DOMAIN):
 
 async def test_connection(device_path: str) -> bool:
     ''' Check if device is reachable and a CUL device '''
-
-    com_port = None
-    try:
-        if device_path.startswith('telnet://'):
-            com_port = TelnetSerial(device_path, 0.5)
-        else:
-            com_port = Serial(device_path)
-    except:
-        return False
-
-    return await get_cul_version(com_port)
-
-async def get_cul_version(com_port: Serial or TelnetSerial) -> bool:
-    ''' Determine CUL version of serial/telnet device '''
-
-    cul_version = None
-
-    # was required for my nanoCUL
-    await asyncio.sleep(2)
-
-    # get CUL FW version
-    for _ in range(10):
-        com_port.write(b'V\n')
-        await asyncio.sleep(1)
-        cul_version = com_port.readline() or None
-        if cul_version is not None:
-            break
-
-    if cul_version is None:
-        com_port.close()
-        com_port = None
-        return False
-
-    return True
+    return await async_probe_cul(asyncio.get_running_loop(), device_path) is not None
 
 
 class MaxculOptionsFlowHandler(OptionsFlow):
@@ -215,7 +225,27 @@ class MaxculOptionsFlowHandler(OptionsFlow):
             return self.async_create_entry(title='', data=user_input)
 
         sender_id = self._config_entry.options.get(CONF_SENDER_ID) or 0x123456
+        command_debounce = self._config_entry.options.get(
+            CONF_COMMAND_DEBOUNCE,
+            DEFAULT_COMMAND_DEBOUNCE
+        )
+        state_heartbeat = self._config_entry.options.get(
+            CONF_STATE_HEARTBEAT,
+            DEFAULT_STATE_HEARTBEAT
+        )
+        instrumentation = self._config_entry.options.get(CONF_INSTRUMENTATION, False)
+        capture = self._config_entry.options.get(CONF_CAPTURE, False)
         schema = vol.Schema({
-            vol.Optional(CONF_SENDER_ID, default=sender_id): int
+            vol.Optional(CONF_SENDER_ID, default=sender_id): int,
+            vol.Optional(CONF_COMMAND_DEBOUNCE, default=command_debounce): vol.All(
+                vol.Coerce(float),
+                vol.Range(min=0, max=10)
+            ),
+            vol.Optional(CONF_STATE_HEARTBEAT, default=state_heartbeat): vol.All(
+                vol.Coerce(int),
+                vol.Range(min=0, max=1440)
+            ),
+            vol.Optional(CONF_INSTRUMENTATION, default=instrumentation): bool,
+            vol.Optional(CONF_CAPTURE, default=capture): bool
         })
         return self.async_show_form(step_id='init', data_schema=schema, errors=errors)
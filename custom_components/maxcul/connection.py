@@ -0,0 +1,1208 @@
+'''
+Connection to a CUL device handling the MAX! protocol of its paired devices
+'''
+
+import asyncio
+import logging
+import random
+import time
+from typing import Callable, Hashable
+
+from serial import SerialException
+
+from homeassistant.const import ATTR_DEVICE_ID
+
+from homeassistant.core import (
+    HomeAssistant,
+    callback
+)
+
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_call_later
+import homeassistant.util.dt as dt_util
+
+from maxcul import (
+    EVENT_DEVICE_PAIRED,
+    EVENT_DEVICE_REPAIRED,
+    EVENT_PUSH_BUTTON_UPDATE,
+    EVENT_SHUTTER_UPDATE,
+    EVENT_THERMOSTAT_UPDATE
+)
+
+from maxcul._const import (
+    ATTR_BATTERY_LOW,
+    ATTR_DESIRED_TEMPERATURE,
+    ATTR_DEVICE_SERIAL,
+    ATTR_DEVICE_TYPE,
+    ATTR_FIRMWARE_VERSION,
+    ATTR_MEASURED_TEMPERATURE,
+    ATTR_MODE,
+    ATTR_STATE,
+    ATTR_VALVE_POSITION,
+    CUBE
+)
+
+from maxcul._messages import (
+    AckMessage,
+    MoritzMessage,
+    PairPingMessage,
+    PairPongMessage,
+    PushButtonStateMessage,
+    RemoveGroupIdMessage,
+    SetGroupIdMessage,
+    SetTemperatureMessage,
+    ShutterContactStateMessage,
+    ThermostatStateMessage,
+    TimeInformationMessage,
+    WallThermostatControlMessage,
+    WallThermostatStateMessage
+)
+
+from custom_components.maxcul import (
+    ATTR_CONNECTION_DEVICE_PATH,
+    ATTR_ROOM_TEMPERATURE,
+    CONF_GROUP_ID,
+    CONF_LINKED_DEVICES,
+    DEFAULT_COMMAND_DEBOUNCE,
+    DEFAULT_SENDER_ID,
+    DEFAULT_STATE_HEARTBEAT,
+    DOMAIN,
+    EVENT_WALL_THERMOSTAT_UPDATE,
+    SIGNAL_BATTERY_UPDATE,
+    SIGNAL_COMMAND_UPDATE,
+    SIGNAL_DEVICE_PAIRED,
+    SIGNAL_DEVICE_REPAIRED,
+    SIGNAL_LINKS_CHANGED,
+    SIGNAL_PUSH_BUTTON_UPDATE,
+    SIGNAL_SHUTTER_UPDATE,
+    SIGNAL_THERMOSTAT_UPDATE,
+    SIGNAL_WALL_THERMOSTAT_UPDATE
+)
+
+from custom_components.maxcul.capture import (
+    DIRECTION_RECEIVED,
+    DIRECTION_SENT,
+    CaptureWriter
+)
+
+from custom_components.maxcul.commands import (
+    ATTR_COMMAND_STATE,
+    COMMAND_ACKNOWLEDGED,
+    COMMAND_FAILED,
+    COMMAND_PENDING,
+    CommandStats,
+    OutstandingCommand
+)
+
+from custom_components.maxcul.instrumentation import (
+    STAGE_DECODE,
+    STAGE_DISPATCH,
+    STAGE_HANDLE,
+    STAGE_READ,
+    FrameMetrics
+)
+
+from custom_components.maxcul.pool import CulPool
+
+from custom_components.maxcul.scheduler import (
+    COMMAND_REQUEST_BUDGET,
+    PRIORITY_BACKGROUND,
+    PRIORITY_COMMAND,
+    PRIORITY_RESPONSE,
+    CommandScheduler
+)
+
+from custom_components.maxcul.store import DeviceStateStore
+
+from custom_components.maxcul.transport import (
+    CUL_INIT_COMMANDS,
+    CulProtocol,
+    async_open_cul
+)
+
+from custom_components.maxcul.week_program import (
+    ATTR_WEEK_PROGRAM,
+    MAX_MESSAGES_PER_DAY,
+    WEEKDAYS,
+    WeekProfileMessage,
+    encode_day_program
+)
+
+LOGGER = logging.getLogger(__name__)
+
+RESPONSE_BUDGET = '21'
+
+ACK_BACKOFF_INTERVAL = 10
+ACK_MAX_ATTEMPTS = 5
+
+# seconds to wait for the CUL device to boot after the port was opened
+CUL_BOOT_DELAY = 2
+
+# bounds in seconds of the jittered exponential backoff between reconnection attempts
+RECONNECT_BACKOFF_MIN = 1
+RECONNECT_BACKOFF_MAX = 300
+
+# seconds without any line from the CUL after which it is asked for its budget, and
+# after which the link is considered dead if it still does not answer
+KEEPALIVE_INTERVAL = 60
+KEEPALIVE_TIMEOUT = 15
+
+
+class MaxCulConnection:
+    ''' Connection to a CUL device speaking the MAX! protocol on the event loop '''
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        device_path: str,
+        sender_id=None,
+        command_debounce: float = DEFAULT_COMMAND_DEBOUNCE,
+        state_heartbeat: float = DEFAULT_STATE_HEARTBEAT,
+        instrumentation: bool = False,
+        capture: CaptureWriter = None,
+        state_store: DeviceStateStore = None,
+        pool: CulPool = None
+    ):
+        self._hass = hass
+        self._device_path = device_path
+        self._state_store = state_store
+
+        if not sender_id:
+            sender_id = DEFAULT_SENDER_ID
+
+        self._sender_id = sender_id
+        self._command_debounce = command_debounce
+        self._state_heartbeat = state_heartbeat
+        self._metrics = FrameMetrics(instrumentation)
+        self._capture = capture
+        self._pending_commands = {}
+
+        self._protocol: CulProtocol or None = None
+        self._supervisor: asyncio.Task or None = None
+        self._stopped = False
+        self._disconnected = asyncio.Event()
+        self._last_line_received = time.monotonic()
+        self._cancel_keepalive = None
+
+        self._reconnect_count = 0
+        self._disconnected_at: float or None = None
+        self._downtime = 0.0
+        self._cul_version: str or None = None
+        self._cul_version_received = asyncio.Event()
+
+        self._scheduler = CommandScheduler(hass, self._write_line, self.message_sent)
+
+        self._message_counter = 0
+        self._outstanding_acks: dict[int, OutstandingCommand] = {}
+        self._command_stats: dict[int, CommandStats] = {}
+        self._week_programs: dict[int, dict[str, list]] = {}
+        self._battery_low: dict[int, bool] = {}
+
+        # thermostats linked to each wall thermostat and the wall thermostat of each of them
+        self._links: dict[int, set[int]] = {}
+        self._link_partners: dict[int, int] = {}
+
+        self._paired_devices = set()
+        self._pairing_enabled = False
+        self._cancel_pairing = None
+
+        # a connection without pool forms a pool of its own
+        self._pool = pool or CulPool()
+        self._pool.add(self)
+
+    def last_state(self, device_id: int) -> dict:
+        ''' Return the last known state of a device, as persisted across restarts '''
+        if self._state_store is None:
+            return {}
+
+        return self._state_store.get(device_id)
+
+    def battery_low(self, device_id: int) -> bool or None:
+        ''' Return whether the battery of a device is low, None if it is not known yet '''
+        if device_id in self._battery_low:
+            return self._battery_low[device_id]
+
+        return self.last_state(device_id).get(ATTR_BATTERY_LOW)
+
+    def linked_devices(self, device_id: int) -> set[int]:
+        ''' Return the thermostats linked to a wall thermostat '''
+        return set(self._links.get(device_id, ()))
+
+    def link_partner(self, device_id: int) -> int or None:
+        ''' Return the wall thermostat a thermostat is linked to, None if it is not linked '''
+        return self._link_partners.get(device_id)
+
+    @callback
+    def set_links(self, device_id: int, linked_device_ids):
+        ''' Set the thermostats linked to a wall thermostat '''
+        for linked_device_id in self._links.get(device_id, ()):
+            self._link_partners.pop(linked_device_id, None)
+
+        self._links[device_id] = {int(linked_device_id) for linked_device_id in linked_device_ids}
+        for linked_device_id in self._links[device_id]:
+            self._link_partners[linked_device_id] = device_id
+
+    @property
+    def state_heartbeat(self) -> float:
+        ''' Return the seconds after which entities write an unchanged state again, 0 if never '''
+        return self._state_heartbeat * 60
+
+    @property
+    def device_path(self) -> str:
+        ''' Return the path of the CUL device '''
+        return self._device_path
+
+    @property
+    def is_connected(self) -> bool:
+        ''' Return whether the CUL device is connected '''
+        return self._protocol is not None and self._protocol.is_connected
+
+    @property
+    def metrics(self) -> FrameMetrics:
+        ''' Return the latency and frame metrics of the receive path '''
+        return self._metrics
+
+    @property
+    def capture(self) -> CaptureWriter or None:
+        ''' Return the writer capturing the raw lines exchanged with the CUL device '''
+        return self._capture
+
+    @property
+    def command_stats(self) -> dict[int, CommandStats]:
+        ''' Return the round trip statistics of the commands sent to each device '''
+        return self._command_stats
+
+    @property
+    def reconnect_count(self) -> int:
+        ''' Return how often the connection was reestablished after it was lost '''
+        return self._reconnect_count
+
+    @property
+    def downtime(self) -> float:
+        ''' Return the total seconds the connection was lost, including an ongoing outage '''
+        if self._disconnected_at is None:
+            return self._downtime
+
+        return self._downtime + time.monotonic() - self._disconnected_at
+
+    @property
+    def scheduler(self) -> CommandScheduler:
+        ''' Return the scheduler of messages sent by the CUL device '''
+        return self._scheduler
+
+    @property
+    def pool(self) -> CulPool:
+        ''' Return the pool of CUL devices the connection belongs to '''
+        return self._pool
+
+    @property
+    def cul_version(self) -> str or None:
+        ''' Return the version reported by the CUL device '''
+        return self._cul_version
+
+    @property
+    def queue_depth(self) -> int:
+        ''' Return the number of messages waiting for transmit credits '''
+        return self._scheduler.queue_depth
+
+    @property
+    def estimated_completion(self) -> float:
+        ''' Return the estimated number of seconds until all queued messages are sent '''
+        return self._scheduler.estimated_completion
+
+    def start(self):
+        ''' Open the connection to the CUL device in the background and keep it open '''
+        self._stopped = False
+        self._supervisor = self._hass.async_create_background_task(
+            self._async_supervise(),
+            f"{DOMAIN} connection {self._device_path}"
+        )
+
+    def stop(self):
+        ''' Close the connection to the CUL device '''
+        self._stopped = True
+        self._disconnected.set()
+
+        if self._supervisor:
+            self._supervisor.cancel()
+            self._supervisor = None
+
+        if self._cancel_keepalive:
+            self._cancel_keepalive()
+            self._cancel_keepalive = None
+
+        for command in self._outstanding_acks.values():
+            command.cancel()
+        self._outstanding_acks.clear()
+
+        for (_, _, cancel_command) in self._pending_commands.values():
+            if cancel_command:
+                cancel_command()
+        self._pending_commands.clear()
+
+        self._scheduler.clear()
+        self._pool.remove(self)
+
+        if self._cancel_pairing:
+            self._cancel_pairing()
+            self._cancel_pairing = None
+
+        if self._protocol:
+            self._protocol.close()
+            self._protocol = None
+
+        if self._capture is not None:
+            self._capture.flush()
+
+    async def _async_supervise(self):
+        failures = 0
+
+        while not self._stopped:
+            if await self._async_connect():
+                failures = 0
+                await self._disconnected.wait()
+                if self._stopped:
+                    return
+
+            failures += 1
+            backoff = min(RECONNECT_BACKOFF_MAX, RECONNECT_BACKOFF_MIN * 2 ** (failures - 1))
+            # spread the attempts of several connections losing their link at the same time
+            backoff = random.uniform(backoff / 2, backoff)
+
+            LOGGER.info(f"Reconnecting to CUL device {self._device_path} in {backoff:.1f} s")
+            await asyncio.sleep(backoff)
+
+    async def _async_connect(self) -> bool:
+        self._disconnected.clear()
+        self._cul_version_received.clear()
+
+        try:
+            self._protocol = await async_open_cul(
+                self._hass.loop,
+                self._device_path,
+                self._create_protocol
+            )
+        except (OSError, ValueError, SerialException) as err:
+            LOGGER.error(f"Unable to open CUL device {self._device_path}: {err}")
+            return False
+
+        if not await self._async_init_cul():
+            LOGGER.error(f"No version from CUL device {self._device_path}, cannot communicate")
+            if self._protocol:
+                self._protocol.close()
+                self._protocol = None
+            return False
+
+        if self._disconnected_at is not None:
+            self._downtime += time.monotonic() - self._disconnected_at
+            self._disconnected_at = None
+            self._reconnect_count += 1
+            LOGGER.info(f"Reconnected to CUL device {self._device_path}")
+
+        self._last_line_received = time.monotonic()
+        self._schedule_keepalive()
+
+        return True
+
+    async def _async_init_cul(self) -> bool:
+        # was required for my nanoCUL
+        await asyncio.sleep(CUL_BOOT_DELAY)
+
+        for _ in range(10):
+            self._write_line('V')
+            try:
+                await asyncio.wait_for(self._cul_version_received.wait(), 1)
+                break
+            except asyncio.TimeoutError:
+                LOGGER.info(f"No version reported from CUL device {self._device_path} yet")
+        else:
+            return False
+
+        LOGGER.debug(f"CUL device {self._device_path} reported version {self._cul_version}")
+
+        for command in CUL_INIT_COMMANDS:
+            self._write_line(command)
+            await asyncio.sleep(0.3)
+
+        # send the messages queued while the CUL was not connected
+        self._scheduler.resume()
+
+        return True
+
+    def _create_protocol(self) -> CulProtocol:
+        protocol = CulProtocol(self.feed_line, self._connection_lost)
+        protocol.record_receive_time = self._metrics.enabled
+        return protocol
+
+    @callback
+    def _connection_lost(self, exc: Exception or None):
+        self._protocol = None
+
+        if self._cancel_keepalive:
+            self._cancel_keepalive()
+            self._cancel_keepalive = None
+
+        if self._stopped:
+            return
+
+        LOGGER.warning(f"Lost connection to CUL device {self._device_path}: {exc}")
+
+        if self._disconnected_at is None:
+            self._disconnected_at = time.monotonic()
+        self._disconnected.set()
+
+    @callback
+    def _schedule_keepalive(self):
+        if self._cancel_keepalive:
+            self._cancel_keepalive()
+
+        self._cancel_keepalive = async_call_later(self._hass, KEEPALIVE_TIMEOUT, self._keepalive)
+
+    @callback
+    def _keepalive(self, _):
+        if self._cancel_keepalive:
+            self._cancel_keepalive()
+            self._cancel_keepalive = None
+
+        if self._protocol is None:
+            return
+
+        idle = time.monotonic() - self._last_line_received
+
+        if idle >= KEEPALIVE_INTERVAL + KEEPALIVE_TIMEOUT:
+            # e.g. a network CUL behind a WiFi link which dropped without closing the socket
+            LOGGER.warning(f"CUL device {self._device_path} did not answer for {idle:.0f} s")
+            self._protocol.abort()
+            return
+
+        if idle >= KEEPALIVE_INTERVAL:
+            self._write_line(COMMAND_REQUEST_BUDGET)
+
+        self._schedule_keepalive()
+
+    @callback
+    def _write_line(self, command: str) -> bool:
+        if self._protocol is None or not self._protocol.is_connected:
+            LOGGER.error(f"CUL device {self._device_path} is not connected, unable to send {command}")
+            return False
+
+        if command != COMMAND_REQUEST_BUDGET:
+            LOGGER.debug(f"Writing command {command} to {self._device_path}")
+
+        self._protocol.write_line(command)
+        if self._capture is not None:
+            self._capture.record(DIRECTION_SENT, command)
+        return True
+
+    @callback
+    def feed_line(self, line: str):
+        ''' Process a line received from the CUL device, also used to replay captured traffic '''
+        self._last_line_received = time.monotonic()
+
+        if self._capture is not None:
+            self._capture.record(DIRECTION_RECEIVED, line, self._last_line_received)
+
+        if line.startswith(RESPONSE_BUDGET):
+            self._scheduler.budget_received(int(line[len(RESPONSE_BUDGET):].strip()) * 10)
+
+        elif line.startswith('LOVF'):
+            LOGGER.warning(f"CUL device {self._device_path} reported an exhausted duty cycle budget")
+            self._scheduler.budget_exhausted()
+
+        elif line.startswith('ZERR'):
+            LOGGER.warning(f"Received error message from CUL device {self._device_path}: '{line}'")
+
+        elif line.startswith('Z'):
+            if self._metrics.enabled and self._protocol is not None:
+                self._metrics.record(STAGE_READ, self._protocol.received_at)
+            self._frame_received(line)
+
+        elif line.startswith('V') and not self._cul_version_received.is_set():
+            self._cul_version = line
+            self._cul_version_received.set()
+
+        else:
+            LOGGER.debug(f"Got unhandled response from CUL device {self._device_path}: '{line}'")
+
+    @callback
+    def _frame_received(self, line: str):
+        started = self._metrics.start()
+        try:
+            message = MoritzMessage.decode_message(line[:-2])
+            signal_strength = int(line[-2:], base=16)
+        except Exception as err: # pylint: disable=broad-except
+            LOGGER.error(f"Exception <{err}> was raised while parsing message '{line}'")
+            return
+        self._metrics.record(STAGE_DECODE, started)
+        self._metrics.count_frame(message.__class__.__name__)
+
+        started = self._metrics.start()
+        self._pool.frame_received(self, message, signal_strength, line[:-2])
+        self._metrics.record(STAGE_HANDLE, started)
+
+    def handles_message(self, msg: MoritzMessage) -> bool:
+        ''' Return whether the message is addressed to this connection or its paired devices '''
+        if isinstance(msg, WallThermostatControlMessage):
+            # addressed to a linked thermostat, any CUL of the pool might overhear it
+            return msg.sender_id in self._links
+
+        if msg.receiver_id != 0 and msg.receiver_id != self._sender_id:
+            return False
+
+        if isinstance(msg, PairPingMessage):
+            return msg.receiver_id != 0 or self._pairing_enabled
+
+        # CULs of the pool may share their sender id, so unicasts are matched by the sender too
+        return self.is_paired(msg.sender_id)
+
+    def is_paired(self, device_id: int) -> bool:
+        ''' Return whether the device is paired with this connection '''
+        return device_id in self._paired_devices
+
+    @callback
+    def handle_message(self, msg: MoritzMessage, signal_strength: int, duplicate: bool = False):
+        ''' Handle a decoded message the pool routed to this connection '''
+        if isinstance(msg, WallThermostatControlMessage) and msg.sender_id in self._links:
+            # a wall thermostat passes its set point and room temperature on to its linked thermostats
+            self._wall_thermostat_control_received(msg, duplicate)
+
+        if msg.receiver_id != 0 and msg.receiver_id != self._sender_id:
+            # discard messages not addressed to us
+            return
+
+        if isinstance(msg, PairPingMessage):
+            # repeated pings are answered again, the platforms ignore devices already known
+            self._handle_pair_ping(msg)
+            return
+
+        if msg.receiver_id == 0 and not self.is_paired(msg.sender_id):
+            # discard broadcast messages from devices we are not paired with
+            return
+
+        if duplicate:
+            # answer retransmissions again as our reply might have been lost, but do not
+            # dispatch the same state twice
+            LOGGER.debug(f"Received duplicate message {msg} ({signal_strength})")
+        else:
+            LOGGER.debug(f"Received message {msg} ({signal_strength})")
+
+        if isinstance(msg, TimeInformationMessage):
+            if not msg.datetime:
+                # time information requested
+                self._send_time_information(msg)
+
+        elif isinstance(msg, ThermostatStateMessage):
+            self._send_ack(msg)
+            if not duplicate:
+                self._propagate_thermostat_state(msg)
+
+        elif isinstance(msg, AckMessage):
+            if duplicate:
+                return
+
+            self._ack_received(msg)
+
+            # pymaxcul decodes the status of ACKs as the one of a thermostat, acknowledged
+            # commands to wall thermostats are propagated once they are acknowledged instead
+            if msg.state == 'ok' and msg.sender_id not in self._links:
+                self._propagate_thermostat_state(msg)
+
+        elif isinstance(msg, ShutterContactStateMessage):
+            self._send_ack(msg)
+            if duplicate:
+                return
+
+            self._callback(
+                EVENT_SHUTTER_UPDATE,
+                {
+                    ATTR_DEVICE_ID: msg.sender_id,
+                    ATTR_BATTERY_LOW: msg.battery_low,
+                    ATTR_STATE: msg.state
+                }
+            )
+
+        elif isinstance(msg, PushButtonStateMessage):
+            self._send_ack(msg)
+            if duplicate:
+                return
+
+            self._callback(
+                EVENT_PUSH_BUTTON_UPDATE,
+                {
+                    ATTR_DEVICE_ID: msg.sender_id,
+                    ATTR_BATTERY_LOW: msg.battery_low,
+                    ATTR_STATE: msg.state
+                }
+            )
+
+        elif isinstance(msg, WallThermostatStateMessage):
+            self._send_ack(msg)
+            if duplicate:
+                return
+
+            self._callback(
+                EVENT_WALL_THERMOSTAT_UPDATE,
+                {
+                    ATTR_DEVICE_ID: msg.sender_id,
+                    ATTR_MEASURED_TEMPERATURE: msg.temperature,
+                    ATTR_DESIRED_TEMPERATURE: msg.desired_temperature,
+                    ATTR_MODE: msg.mode,
+                    ATTR_BATTERY_LOW: msg.battery_low
+                }
+            )
+            self._propagate_linked_state(
+                msg.sender_id,
+                msg.desired_temperature,
+                msg.mode,
+                msg.temperature
+            )
+
+        elif isinstance(msg, (SetTemperatureMessage, WallThermostatControlMessage)):
+            self._send_ack(msg)
+
+        else:
+            LOGGER.warning(f"Unhandled message of type {msg.__class__.__name__}, contains {msg}")
+
+    @callback
+    def _handle_pair_ping(self, msg: PairPingMessage):
+        if msg.receiver_id == 0:
+            # pairing after factory reset
+            if not self._pairing_enabled:
+                LOGGER.info("Pairing requested but pairing disabled, not pairing to new device")
+                return
+            event = EVENT_DEVICE_PAIRED
+
+        elif msg.receiver_id == self._sender_id:
+            # pairing after battery replacement
+            event = EVENT_DEVICE_REPAIRED
+
+        else:
+            # pair to someone else after battery replacement, don't care
+            return
+
+        if not self._send_pong(msg):
+            return
+
+        self._callback(
+            event,
+            {
+                ATTR_DEVICE_ID: msg.sender_id,
+                ATTR_DEVICE_TYPE: msg.device_type,
+                ATTR_DEVICE_SERIAL: msg.device_serial,
+                ATTR_FIRMWARE_VERSION: msg.firmware_version
+            }
+        )
+
+    @callback
+    def _propagate_thermostat_state(self, msg: ThermostatStateMessage or AckMessage):
+        self._callback(
+            EVENT_THERMOSTAT_UPDATE,
+            {
+                ATTR_DEVICE_ID: msg.sender_id,
+                ATTR_MEASURED_TEMPERATURE: msg.measured_temperature,
+                ATTR_DESIRED_TEMPERATURE: msg.desired_temperature,
+                ATTR_VALVE_POSITION: msg.valve_position,
+                ATTR_MODE: msg.mode,
+                ATTR_BATTERY_LOW: msg.battery_low
+            }
+        )
+
+    @callback
+    def _wall_thermostat_control_received(self, msg: WallThermostatControlMessage, duplicate: bool):
+        if msg.receiver_id not in self._paired_devices or duplicate:
+            return
+
+        if msg.receiver_id not in self._links[msg.sender_id]:
+            LOGGER.debug(f"Learned link of wall thermostat {msg.sender_id} to {msg.receiver_id}")
+            self.set_links(msg.sender_id, {*self._links[msg.sender_id], msg.receiver_id})
+
+            async_dispatcher_send(
+                self._hass,
+                self.device_signal(SIGNAL_LINKS_CHANGED, msg.sender_id),
+                {
+                    ATTR_DEVICE_ID: msg.sender_id,
+                    CONF_LINKED_DEVICES: sorted(self._links[msg.sender_id])
+                }
+            )
+
+        self._callback(
+            EVENT_THERMOSTAT_UPDATE,
+            {
+                ATTR_DEVICE_ID: msg.receiver_id,
+                ATTR_DESIRED_TEMPERATURE: msg.desired_temperature,
+                ATTR_ROOM_TEMPERATURE: msg.temperature
+            }
+        )
+
+    @callback
+    def _propagate_linked_state(
+        self,
+        device_id: int,
+        desired_temperature: float,
+        mode,
+        room_temperature: float or None = None
+    ):
+        # the wall thermostat forwards its state to the linked thermostats itself, so their
+        # entities are updated without commanding or waiting for each of them
+        for linked_device_id in sorted(self._links.get(device_id, ())):
+            self._callback(
+                EVENT_THERMOSTAT_UPDATE,
+                {
+                    ATTR_DEVICE_ID: linked_device_id,
+                    ATTR_DESIRED_TEMPERATURE: desired_temperature,
+                    ATTR_MODE: mode,
+                    ATTR_ROOM_TEMPERATURE: room_temperature
+                }
+            )
+
+    @callback
+    def _callback(self, event, payload):
+        if ATTR_BATTERY_LOW in payload:
+            # compared with the stored state, so before the payload is merged into it
+            self._battery_received(payload)
+
+        if event == EVENT_DEVICE_PAIRED:
+            payload[ATTR_CONNECTION_DEVICE_PATH] = self._device_path
+            async_dispatcher_send(self._hass, SIGNAL_DEVICE_PAIRED, payload)
+
+        elif event == EVENT_DEVICE_REPAIRED:
+            payload[ATTR_CONNECTION_DEVICE_PATH] = self._device_path
+            async_dispatcher_send(self._hass, SIGNAL_DEVICE_REPAIRED, payload)
+
+        elif event == EVENT_THERMOSTAT_UPDATE:
+            self._store_state(payload)
+            self._dispatch(SIGNAL_THERMOSTAT_UPDATE, payload)
+
+        elif event == EVENT_SHUTTER_UPDATE:
+            self._store_state(payload)
+            self._dispatch(SIGNAL_SHUTTER_UPDATE, payload)
+
+        elif event == EVENT_WALL_THERMOSTAT_UPDATE:
+            self._store_state(payload)
+            self._dispatch(SIGNAL_WALL_THERMOSTAT_UPDATE, payload)
+
+        elif event == EVENT_PUSH_BUTTON_UPDATE:
+            self._store_state(payload)
+            self._dispatch(SIGNAL_PUSH_BUTTON_UPDATE, payload)
+
+    @callback
+    def _battery_received(self, payload: dict):
+        device_id = payload.get(ATTR_DEVICE_ID)
+        battery_low = payload.get(ATTR_BATTERY_LOW)
+        if battery_low is None:
+            return
+
+        previous_battery_low = self.battery_low(device_id)
+        self._battery_low[device_id] = battery_low
+
+        # most frames repeat the flag, the battery entity is only told when it flips
+        if battery_low != previous_battery_low:
+            async_dispatcher_send(
+                self._hass,
+                self.device_signal(SIGNAL_BATTERY_UPDATE, device_id),
+                {
+                    ATTR_DEVICE_ID: device_id,
+                    ATTR_BATTERY_LOW: battery_low
+                }
+            )
+
+    @callback
+    def _dispatch(self, signal: str, payload: dict):
+        started = self._metrics.start()
+        async_dispatcher_send(
+            self._hass,
+            self.device_signal(signal, payload.get(ATTR_DEVICE_ID)),
+            payload
+        )
+        self._metrics.record(STAGE_DISPATCH, started)
+
+    @callback
+    def _store_state(self, payload: dict):
+        if self._state_store is not None:
+            self._state_store.update(payload.get(ATTR_DEVICE_ID), payload)
+
+    def device_signal(self, signal: str, device_id: int) -> str:
+        ''' Return the dispatcher signal of a single device on this connection '''
+        return f"{signal}.{self._device_path}.{device_id}"
+
+    @callback
+    def _next_counter(self) -> int:
+        self._message_counter = (self._message_counter + 1) % 0x100
+        return self._message_counter
+
+    @callback
+    def _send_message(
+        self,
+        msg: MoritzMessage,
+        priority: int = PRIORITY_COMMAND,
+        key: Hashable = None
+    ) -> float:
+        transmitter, delay = self._pool.enqueue(self, msg, priority, key)
+
+        if delay >= 1:
+            LOGGER.info(
+                f"Message {msg} is delayed by about {delay:.0f} s due to the duty cycle limit "
+                f"({transmitter.queue_depth} message(s) queued on {transmitter.device_path})"
+            )
+
+        return delay
+
+    @callback
+    def _has_credits_for(self, msg: MoritzMessage) -> bool:
+        return self._pool.transmitter(msg.receiver_id, self).scheduler.has_credits_for(msg)
+
+    @callback
+    def _await_ack(
+        self,
+        msg: MoritzMessage,
+        key: Hashable = None,
+        acknowledged: Callable[[], None] = None
+    ):
+        self._outstanding_acks[msg.counter] = OutstandingCommand(
+            msg,
+            key or (msg.__class__, msg.receiver_id),
+            time.monotonic(),
+            acknowledged
+        )
+        self._command_stats.setdefault(msg.receiver_id, CommandStats()).sent += 1
+        self._command_state_changed(msg.receiver_id, COMMAND_PENDING)
+
+    @callback
+    def message_sent(self, msg: MoritzMessage):
+        ''' Track a message written by any CUL of the pool until it is acknowledged '''
+        command = self._outstanding_acks.get(msg.counter)
+        if isinstance(msg, AckMessage) or command is None or command.msg is not msg:
+            return
+
+        @callback
+        def resend(_):
+            command.cancel_resend = None
+
+            if command.attempt >= ACK_MAX_ATTEMPTS:
+                del self._outstanding_acks[msg.counter]
+                LOGGER.warning(f"Did not receive an ACK for message {msg}")
+                self._command_stats[msg.receiver_id].failed += 1
+                self._command_state_changed(msg.receiver_id, COMMAND_FAILED)
+                return
+
+            command.attempt += 1
+            self._command_stats[msg.receiver_id].retries += 1
+            LOGGER.debug(f"Repeating message {msg} attempt {command.attempt}")
+
+            # retries must not delay new commands and responses within the duty cycle
+            self._send_message(msg, PRIORITY_BACKGROUND, key=command.key)
+
+        command.cancel()
+        command.cancel_resend = async_call_later(
+            self._hass,
+            ACK_BACKOFF_INTERVAL * command.attempt,
+            resend
+        )
+
+    @callback
+    def _ack_received(self, msg: AckMessage):
+        command = self._outstanding_acks.get(msg.counter)
+        if command is None or command.msg.receiver_id != msg.sender_id:
+            return
+
+        del self._outstanding_acks[msg.counter]
+        command.cancel()
+
+        stats = self._command_stats[msg.sender_id]
+        if msg.state == 'ok':
+            stats.acknowledged += 1
+            stats.round_trip.add((time.monotonic() - command.issued_at) * 1000)
+            self._command_state_changed(msg.sender_id, COMMAND_ACKNOWLEDGED)
+            if command.acknowledged is not None:
+                command.acknowledged()
+        else:
+            LOGGER.warning(f"Message {command.msg} was rejected with {msg}")
+            stats.failed += 1
+            self._command_state_changed(msg.sender_id, COMMAND_FAILED)
+
+    @callback
+    def _command_state_changed(self, device_id: int, state: str):
+        # commands to linked thermostats are sent to their wall thermostat, which passes them on
+        for target_id in (device_id, *sorted(self._links.get(device_id, ()))):
+            async_dispatcher_send(
+                self._hass,
+                self.device_signal(SIGNAL_COMMAND_UPDATE, target_id),
+                {
+                    ATTR_DEVICE_ID: target_id,
+                    ATTR_COMMAND_STATE: state
+                }
+            )
+
+    @callback
+    def _send_ack(self, msg: MoritzMessage):
+        ack_msg = msg.respond_with(
+            AckMessage,
+            counter=msg.counter,
+            sender_id=self._sender_id
+        )
+
+        if not self._has_credits_for(ack_msg):
+            LOGGER.debug("Won't send ack because budget is too low")
+            return
+
+        self._send_message(ack_msg, PRIORITY_RESPONSE)
+
+    @callback
+    def _send_time_information(self, msg: TimeInformationMessage):
+        response_msg = msg.respond_with(
+            TimeInformationMessage,
+            counter=self._next_counter(),
+            sender_id=self._sender_id,
+            datetime=dt_util.now()
+        )
+
+        if not self._has_credits_for(response_msg):
+            LOGGER.debug("Won't send time information because budget is too low")
+            return
+
+        self._send_message(response_msg, PRIORITY_RESPONSE)
+
+    @callback
+    def _send_pong(self, msg: PairPingMessage) -> bool:
+        response_msg = msg.respond_with(
+            PairPongMessage,
+            counter=self._next_counter(),
+            sender_id=self._sender_id,
+            devicetype=CUBE
+        )
+
+        if not self._has_credits_for(response_msg):
+            LOGGER.debug("Won't send pong because budget is too low")
+            return False
+
+        self._send_message(response_msg, PRIORITY_RESPONSE)
+        self._paired_devices.add(msg.sender_id)
+
+        return True
+
+    @callback
+    def enable_pairing(self, duration):
+        ''' Enable pairing of devices '''
+        LOGGER.debug(f"Enabling pairing on {self._device_path} for {duration} s")
+
+        if self._cancel_pairing:
+            self._cancel_pairing()
+
+        @callback
+        def disable_pairing(_):
+            self._pairing_enabled = False
+            self._cancel_pairing = None
+
+        self._pairing_enabled = True
+        self._cancel_pairing = async_call_later(self._hass, duration, disable_pairing)
+
+    @callback
+    def add_paired_device(self, device_id):
+        ''' Add a device id to the paired devices '''
+        LOGGER.debug(f"Adding device {device_id}")
+        self._paired_devices.add(device_id)
+
+    @callback
+    def set_temperature(self, device_id: int, target_temperature: float, mode):
+        '''
+        Set the target temperature of a thermostat device
+
+        Commands for the same device within the debounce window or while an earlier command
+        is still waiting for transmit credits supersede each other, so only the latest one
+        is sent.
+        '''
+        LOGGER.debug(f"Setting temperature on {device_id} to {target_temperature} (mode: {mode})")
+
+        self._command_state_changed(device_id, COMMAND_PENDING)
+
+        if device_id in self._pending_commands:
+            (_, _, cancel_command) = self._pending_commands[device_id]
+            self._pending_commands[device_id] = (target_temperature, mode, cancel_command)
+            return
+
+        if self._command_debounce <= 0:
+            self._pending_commands[device_id] = (target_temperature, mode, None)
+            self._send_pending_command(device_id)
+            return
+
+        @callback
+        def send_command(_):
+            self._send_pending_command(device_id)
+
+        self._pending_commands[device_id] = (
+            target_temperature,
+            mode,
+            async_call_later(self._hass, self._command_debounce, send_command)
+        )
+
+    @callback
+    def _send_pending_command(self, device_id: int):
+        (target_temperature, mode, _) = self._pending_commands.pop(device_id)
+
+        self._cancel_outstanding_commands(device_id)
+
+        msg = SetTemperatureMessage(
+            counter=self._next_counter(),
+            sender_id=self._sender_id,
+            receiver_id=device_id,
+            desired_temperature=float(target_temperature),
+            mode=mode
+        )
+
+        acknowledged = None
+        if device_id in self._links:
+            @callback
+            def acknowledged():
+                self._callback(
+                    EVENT_WALL_THERMOSTAT_UPDATE,
+                    {
+                        ATTR_DEVICE_ID: device_id,
+                        ATTR_DESIRED_TEMPERATURE: msg.desired_temperature,
+                        ATTR_MODE: msg.mode
+                    }
+                )
+                self._propagate_linked_state(device_id, msg.desired_temperature, msg.mode)
+
+        self._await_ack(msg, acknowledged=acknowledged)
+        self._send_message(msg, key=(SetTemperatureMessage, device_id))
+
+    @callback
+    def set_group_temperature(
+        self,
+        group_id: int,
+        device_ids: list[int],
+        target_temperature: float,
+        mode
+    ):
+        ''' Set the target temperature of all thermostats of a group with a single message '''
+        LOGGER.debug(
+            f"Setting temperature on group {group_id} ({len(device_ids)} devices) "
+            f"to {target_temperature} (mode: {mode})"
+        )
+
+        for device_id in device_ids:
+            if device_id in self._pending_commands:
+                (_, _, cancel_command) = self._pending_commands.pop(device_id)
+                if cancel_command:
+                    cancel_command()
+
+            self._cancel_outstanding_commands(device_id)
+            self._pool.discard((SetTemperatureMessage, device_id))
+
+        msg = SetTemperatureMessage(
+            counter=self._next_counter(),
+            sender_id=self._sender_id,
+            receiver_id=0,
+            group_id=group_id,
+            desired_temperature=float(target_temperature),
+            mode=mode
+        )
+        self._send_message(msg, key=(SetTemperatureMessage, CONF_GROUP_ID, group_id))
+
+    @callback
+    def set_group_id(self, device_id: int, group_id: int):
+        ''' Assign a thermostat device to a group, a group id of 0 removes it from its group '''
+        LOGGER.debug(f"Setting group of {device_id} to {group_id}")
+
+        if group_id:
+            msg = SetGroupIdMessage(
+                counter=self._next_counter(),
+                sender_id=self._sender_id,
+                receiver_id=device_id,
+                new_group_id=group_id
+            )
+        else:
+            msg = RemoveGroupIdMessage(
+                counter=self._next_counter(),
+                sender_id=self._sender_id,
+                receiver_id=device_id
+            )
+
+        self._await_ack(msg)
+        self._send_message(msg, key=(msg.__class__, device_id))
+
+    def week_program(self, device_id: int) -> dict[str, list]:
+        ''' Return the last acknowledged weekly program of a thermostat device '''
+        if device_id not in self._week_programs:
+            self._week_programs[device_id] = self.last_state(device_id).get(ATTR_WEEK_PROGRAM, {})
+
+        return dict(self._week_programs[device_id])
+
+    @callback
+    def set_week_program(self, device_id: int, week_program: dict[str, list]) -> list[str]:
+        '''
+        Set the program of the given days of a thermostat device
+
+        Only days differing from the last acknowledged program are sent. Their messages
+        have background priority, so they are spread over the duty cycle budget without
+        delaying other commands. Return the days which are sent.
+        '''
+        current = self.week_program(device_id)
+        days = [day for day in WEEKDAYS if day in week_program and week_program[day] != current.get(day)]
+
+        LOGGER.debug(f"Setting week program of {device_id} on {', '.join(days) or 'no days'}")
+
+        for day in days:
+            self._send_day_program(device_id, day, week_program[day])
+
+        return days
+
+    @callback
+    def _send_day_program(self, device_id: int, day: str, program: list):
+        self._cancel_outstanding_commands(device_id, WeekProfileMessage, day)
+
+        # the program of the day on the device is unknown until the new one is acknowledged
+        week_program = self.week_program(device_id)
+        week_program.pop(day, None)
+        self._store_week_program(device_id, week_program)
+
+        payloads = encode_day_program(day, program)
+        outstanding = set(range(len(payloads)))
+
+        # parts of an earlier, longer program of the day must not be sent after the new one
+        for part in range(len(payloads), MAX_MESSAGES_PER_DAY):
+            self._pool.discard((WeekProfileMessage, device_id, day, part))
+
+        for part, payload in enumerate(payloads):
+            msg = WeekProfileMessage(
+                counter=self._next_counter(),
+                sender_id=self._sender_id,
+                receiver_id=device_id,
+                payload=payload,
+                day=day,
+                part=part
+            )
+
+            @callback
+            def acknowledged(part=part):
+                outstanding.discard(part)
+                if not outstanding:
+                    self._store_week_program(device_id, {**self.week_program(device_id), day: program})
+
+            key = (WeekProfileMessage, device_id, day, part)
+            self._await_ack(msg, key, acknowledged)
+            self._send_message(msg, PRIORITY_BACKGROUND, key)
+
+    @callback
+    def _store_week_program(self, device_id: int, week_program: dict[str, list]):
+        self._week_programs[device_id] = week_program
+
+        if self._state_store is not None:
+            self._state_store.update(device_id, {ATTR_WEEK_PROGRAM: week_program})
+
+    @callback
+    def _cancel_outstanding_commands(
+        self,
+        device_id: int,
+        message_class: type = SetTemperatureMessage,
+        day: str = None
+    ):
+        # stop resending commands to this device which are superseded by a newer one
+        for counter, command in list(self._outstanding_acks.items()):
+            if (
+                isinstance(command.msg, message_class)
+                and command.msg.receiver_id == device_id
+                and getattr(command.msg, 'day', None) == day
+            ):
+                command.cancel()
+                del self._outstanding_acks[counter]
@@ -0,0 +1,86 @@
+'''
+State shared by all entities of a MAX! device
+'''
+
+from homeassistant.config_entries import ConfigEntry
+
+from homeassistant.core import (
+    HomeAssistant,
+    callback
+)
+
+from homeassistant.helpers.entity import DeviceInfo
+
+from custom_components.maxcul import (
+    CONF_CONNECTIONS,
+    CONF_DEVICE_PATH,
+    CONF_MAX_DEVICES,
+    DOMAIN,
+    MaxCulConnection
+)
+
+
+class MaxDevice:
+    '''
+    A paired MAX! device
+
+    There is one per RF address and config entry, referenced by all entities of the device
+    instead of each of them keeping a copy of connection, config entry and address.
+    '''
+
+    __slots__ = ('connection', 'config_entry', 'rf_address', 'name', 'device_type')
+
+    def __init__(
+        self,
+        connection: MaxCulConnection,
+        config_entry: ConfigEntry,
+        rf_address: int,
+        name: str,
+        device_type: str
+    ):
+        self.connection = connection
+        self.config_entry = config_entry
+        self.rf_address = rf_address
+        self.name = name
+        self.device_type = device_type
+
+    @property
+    def device_id(self) -> str:
+        ''' Return the RF address as used for the config entry and the device registry '''
+        return str(self.rf_address)
+
+    @property
+    def battery_low(self) -> bool or None:
+        ''' Return whether the battery of the device is low, None if it is not known yet '''
+        return self.connection.battery_low(self.rf_address)
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        ''' Return the device registry entry of the device '''
+        return {
+            "identifiers": {
+                (DOMAIN, self.device_id)
+            },
+            "name": self.name,
+        }
+
+
+@callback
+def async_get_device(
+    hass: HomeAssistant,
+    config_entry: ConfigEntry,
+    device_id: str or int,
+    name: str,
+    device_type: str
+) -> MaxDevice:
+    ''' Return the device of an RF address, creating it and pairing it with the connection '''
+    devices = hass.data[DOMAIN][CONF_MAX_DEVICES].setdefault(config_entry.entry_id, {})
+
+    rf_address = int(device_id)
+    device = devices.get(rf_address)
+    if device is None:
+        connection = hass.data[DOMAIN][CONF_CONNECTIONS][config_entry.data.get(CONF_DEVICE_PATH)]
+        device = devices[rf_address] = MaxDevice(connection, config_entry, rf_address, name, device_type)
+        connection.add_paired_device(rf_address)
+
+    return device
@@ -0,0 +1,45 @@
+'''
+Diagnostics support of MaxCUL integration
+'''
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from custom_components.maxcul import (
+    CONF_CONNECTIONS,
+    CONF_DEVICE_PATH,
+    DOMAIN
+)
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant,
+    config_entry: ConfigEntry
+) -> dict[str, Any]:
+    ''' Return diagnostics of the CUL connection of a config entry '''
+
+    device_path = config_entry.data.get(CONF_DEVICE_PATH)
+    connection = hass.data[DOMAIN][CONF_CONNECTIONS][device_path]
+
+    return {
+        'connection': {
+            'device_path': device_path,
+            'connected': connection.is_connected,
+            'cul_version': connection.cul_version,
+            'reconnect_count': connection.reconnect_count,
+            'downtime': round(connection.downtime, 1),
+            'queue_depth': connection.queue_depth,
+            'estimated_completion': round(connection.estimated_completion, 1)
+        },
+        'instrumentation': connection.metrics.as_dict(),
+        'capture': {
+            'path': connection.capture.path,
+            'dropped': connection.capture.dropped
+        } if connection.capture is not None else None,
+        'commands': {
+            f"{device_id:06x}": stats.as_dict()
+            for device_id, stats in connection.command_stats.items()
+        }
+    }
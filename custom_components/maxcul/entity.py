@@ -0,0 +1,69 @@
+'''
+Common behaviour of MaxCUL entities updated by received frames
+'''
+
+import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.entity import DeviceInfo
+
+from custom_components.maxcul import MaxCulConnection
+from custom_components.maxcul.device import MaxDevice
+from custom_components.maxcul.instrumentation import STAGE_STATE_WRITE
+
+
+class FrameUpdateMixin:
+    '''
+    Mixin for entities whose state is updated from received frames
+
+    Devices report their state periodically, most reports do not change anything. The state
+    is only written when it changed or, if the connection has a heartbeat configured, when
+    the last write is older than the heartbeat.
+    '''
+
+    _state_written_at: float or None = None
+
+    @callback
+    def async_write_state_on_change(self, changed: bool):
+        ''' Write the state of the entity if it changed or the heartbeat is due '''
+        now = time.monotonic()
+        heartbeat = self._connection.state_heartbeat
+
+        heartbeat_due = heartbeat > 0 and (
+            self._state_written_at is None or now - self._state_written_at >= heartbeat
+        )
+        if not changed and not heartbeat_due:
+            return
+
+        self._state_written_at = now
+
+        # an unchanged state is only recorded again if the update is forced
+        self._attr_force_update = not changed
+        started = self._connection.metrics.start()
+        self.async_write_ha_state()
+        self._connection.metrics.record(STAGE_STATE_WRITE, started)
+        self._attr_force_update = False
+
+
+class MaxDeviceEntity(FrameUpdateMixin):
+    ''' Base class of the entities of a paired MAX! device '''
+
+    def __init__(self, device: MaxDevice):
+        self._device = device
+
+    @property
+    def _connection(self) -> MaxCulConnection:
+        return self._device.connection
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        return self._device.device_info
+
+    @property
+    def sender_id(self) -> int:
+        ''' Return the RF address of the device '''
+        return self._device.rf_address
+
+    @property
+    def should_poll(self) -> bool:
+        return False
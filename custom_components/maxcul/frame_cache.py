@@ -0,0 +1,60 @@
+'''
+Cache of recently received MAX! frames for dropping retransmitted copies
+'''
+
+from collections import OrderedDict
+import time
+from typing import Hashable
+
+# seconds a received frame is remembered, retransmissions follow within a few seconds
+DUPLICATE_WINDOW = 30
+
+# upper bound of remembered frames, enough for bursts of all devices in range
+MAX_CACHED_FRAMES = 256
+
+
+class FrameCache:
+    '''
+    Bounded cache of the keys of recently received frames
+
+    Devices repeat a frame with the same message counter when they miss the ACK, and
+    frames may be received by more than one CUL. Keys are evicted once they are older
+    than the duplicate window or when the cache is full. The source the first copy of a
+    frame was received from is remembered with its key.
+    '''
+
+    def __init__(self, window: float = DUPLICATE_WINDOW, max_size: int = MAX_CACHED_FRAMES):
+        self._window = window
+        self._max_size = max_size
+        self._frames: OrderedDict[Hashable, tuple] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def seen(self, key: Hashable, source=None) -> bool:
+        ''' Remember the key and return whether it was already received within the window '''
+        now = time.monotonic()
+
+        while self._frames:
+            oldest_key, (received, _) = next(iter(self._frames.items()))
+            if now - received < self._window:
+                break
+            del self._frames[oldest_key]
+
+        if key in self._frames:
+            return True
+
+        self._frames[key] = (now, source)
+        if len(self._frames) > self._max_size:
+            self._frames.popitem(last=False)
+
+        return False
+
+    def source(self, key: Hashable):
+        ''' Return the source the first copy of a remembered frame was received from '''
+        frame = self._frames.get(key)
+        return frame[1] if frame is not None else None
+
+    def clear(self):
+        ''' Forget all received frames '''
+        self._frames.clear()
@@ -0,0 +1,135 @@
+'''
+Latency histograms and frame counters of the receive path
+'''
+
+from bisect import bisect_left
+from collections import Counter
+import time
+from typing import Any
+
+# stages of the receive path, later stages run within the earlier ones except for the read
+STAGE_READ = 'read'
+STAGE_DECODE = 'decode'
+STAGE_HANDLE = 'handle'
+STAGE_DISPATCH = 'dispatch'
+STAGE_ENTITY_UPDATE = 'entity_update'
+STAGE_STATE_WRITE = 'state_write'
+
+STAGES = (
+    STAGE_READ,
+    STAGE_DECODE,
+    STAGE_HANDLE,
+    STAGE_DISPATCH,
+    STAGE_ENTITY_UPDATE,
+    STAGE_STATE_WRITE
+)
+
+# upper bounds in ms of the histogram buckets, the last bucket is unbounded
+BUCKET_BOUNDS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250)
+
+
+class LatencyHistogram:
+    ''' Histogram of latencies in ms with fixed logarithmic buckets '''
+
+    def __init__(self, bounds: tuple = BUCKET_BOUNDS):
+        self._bounds = bounds
+        self._buckets = [0] * (len(bounds) + 1)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    @property
+    def count(self) -> int:
+        ''' Return the number of recorded latencies '''
+        return self._count
+
+    def add(self, latency: float):
+        ''' Record a latency in ms '''
+        self._buckets[bisect_left(self._bounds, latency)] += 1
+        self._count += 1
+        self._total += latency
+        self._max = max(self._max, latency)
+
+    def percentile(self, percentile: float) -> float or None:
+        ''' Return the upper bound of the bucket containing the given percentile '''
+        if not self._count:
+            return None
+
+        rank = percentile / 100 * self._count
+        seen = 0
+        for bound, count in zip(self._bounds, self._buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+
+        return self._max
+
+    def as_dict(self) -> dict[str, Any]:
+        ''' Return a summary of the histogram '''
+        return {
+            'count': self._count,
+            'mean_ms': round(self._total / self._count, 3) if self._count else None,
+            'max_ms': round(self._max, 3),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'buckets': {
+                f"le_{bound}": count
+                for bound, count in zip((*self._bounds, 'inf'), self._buckets)
+            }
+        }
+
+
+class FrameMetrics:
+    '''
+    Collects latencies of the receive path stages and counts received frames by type
+
+    When disabled, start() returns None and nothing is recorded, so an instrumented
+    stage only costs an attribute lookup.
+    '''
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+
+        self._histograms = {stage: LatencyHistogram() for stage in STAGES}
+        self._frames = Counter()
+
+    @property
+    def frame_count(self) -> int:
+        ''' Return the number of received frames '''
+        return sum(self._frames.values())
+
+    @property
+    def frames(self) -> dict[str, int]:
+        ''' Return the number of received frames by message type '''
+        return dict(self._frames)
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        ''' Return the latency histogram of a stage '''
+        return self._histograms[stage]
+
+    def start(self) -> float or None:
+        ''' Return the start time of a stage or None if disabled '''
+        return time.perf_counter() if self.enabled else None
+
+    def record(self, stage: str, started: float or None):
+        ''' Record the latency of a stage started at the given time '''
+        if started is None:
+            return
+
+        self._histograms[stage].add((time.perf_counter() - started) * 1000)
+
+    def count_frame(self, message_type: str):
+        ''' Count a received frame of the given message type '''
+        if self.enabled:
+            self._frames[message_type] += 1
+
+    def as_dict(self) -> dict[str, Any]:
+        ''' Return all collected metrics '''
+        return {
+            'enabled': self.enabled,
+            'frames': self.frames,
+            'stages': {
+                stage: histogram.as_dict()
+                for stage, histogram in self._histograms.items()
+            }
+        }
@@ -0,0 +1,255 @@
+'''
+Climate entity module for groups of Max Thermostats
+'''
+
+from typing import Any, Mapping
+import logging
+
+from homeassistant.components.climate import (
+    ClimateEntity
+)
+
+from homeassistant.components.climate.const import (
+    ClimateEntityFeature,
+    HVACMode,
+    ATTR_HVAC_MODE
+)
+
+from homeassistant.const import (
+    UnitOfTemperature,
+    ATTR_TEMPERATURE
+)
+
+from homeassistant.core import callback
+
+from homeassistant.config_entries import ConfigEntry
+
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from maxcul import (
+    ATTR_DESIRED_TEMPERATURE,
+    ATTR_MEASURED_TEMPERATURE,
+    ATTR_MODE,
+    MODE_MANUAL,
+    MIN_TEMPERATURE as OFF_TEMPERATURE,
+)
+
+from custom_components.maxcul import (
+    CONF_GROUP_ID,
+    SIGNAL_THERMOSTAT_UPDATE,
+    MaxCulConnection
+)
+
+from custom_components.maxcul.const import (
+    MIN_TEMPERATURE,
+    MAX_TEMPERATURE,
+    DEFAULT_TEMPERATURE
+)
+
+from custom_components.maxcul.entity import FrameUpdateMixin
+from custom_components.maxcul.instrumentation import STAGE_ENTITY_UPDATE
+from custom_components.maxcul.max_thermostat import MaxThermostat
+
+LOGGER = logging.getLogger(__name__)
+
+ATTR_MEMBERS = 'members'
+
+
+class MaxGroupThermostat(FrameUpdateMixin, ClimateEntity):
+    ''' Climate entity class for a MAX! group of thermostats controlled with group messages '''
+
+    def __init__(
+        self,
+        config_entry: ConfigEntry,
+        connection: MaxCulConnection,
+        group_id: int,
+        device_ids: list[int]
+    ):
+        self._config_entry = config_entry
+        self._connection = connection
+        self._group_id = group_id
+
+        self._device_ids: list[int] = []
+        self._member_states: dict[int, dict] = {}
+        self._unsubscribe_members = []
+
+        self.set_members(device_ids)
+
+    @property
+    def name(self) -> str:
+        return f"MAX! Group {self._group_id}"
+
+    @property
+    def unique_id(self) -> str:
+        return f"{self._config_entry.entry_id}-group-{self._group_id}"
+
+    @property
+    def group_id(self) -> int:
+        ''' Return the MAX! group id '''
+        return self._group_id
+
+    @property
+    def device_ids(self) -> list[int]:
+        ''' Return the RF addresses of the group members '''
+        return self._device_ids
+
+    @property
+    def should_poll(self) -> bool:
+        return False
+
+    @property
+    def supported_features(self) -> int:
+        return ClimateEntityFeature.TARGET_TEMPERATURE
+
+    @property
+    def min_temp(self) -> float:
+        return MIN_TEMPERATURE
+
+    @property
+    def max_temp(self) -> float:
+        return MAX_TEMPERATURE
+
+    @property
+    def temperature_unit(self) -> str:
+        return UnitOfTemperature.CELSIUS
+
+    @property
+    def target_temperature_step(self) -> float:
+        return 0.5
+
+    @property
+    def current_temperature(self) -> float or None:
+        temperatures = self._member_values(ATTR_MEASURED_TEMPERATURE)
+        if not temperatures:
+            return None
+
+        return round(sum(temperatures) / len(temperatures), 1)
+
+    @property
+    def target_temperature(self) -> float or None:
+        return self._shared_member_value(ATTR_DESIRED_TEMPERATURE)
+
+    @property
+    def hvac_mode(self) -> str or None:
+        mode = self._shared_member_value(ATTR_MODE)
+        if mode == MODE_MANUAL and self.target_temperature == OFF_TEMPERATURE:
+            return HVACMode.OFF
+
+        return MaxThermostat._mode_to_hvac_mode(mode)
+
+    @property
+    def hvac_modes(self) -> list[str]:
+        return [
+            HVACMode.OFF,
+            HVACMode.AUTO,
+            HVACMode.HEAT
+        ]
+
+    @property
+    def extra_state_attributes(self) -> Mapping[str, Any]:
+        return {
+            CONF_GROUP_ID: self._group_id,
+            ATTR_MEMBERS: [f"{device_id:06x}" for device_id in self._device_ids]
+        }
+
+    async def async_added_to_hass(self) -> None:
+        self._subscribe_members()
+
+    async def async_will_remove_from_hass(self) -> None:
+        self._unsubscribe()
+
+    @callback
+    def set_members(self, device_ids: list[int]):
+        ''' Replace the members of the group '''
+        self._device_ids = sorted(device_ids)
+        self._member_states = {
+            device_id: self._member_states.get(device_id, {})
+            for device_id in self._device_ids
+        }
+
+        if self.hass is None:
+            return
+
+        self._subscribe_members()
+        self.async_write_ha_state()
+
+    async def async_set_temperature(self, **kwargs) -> None:
+        target_temperature = kwargs.get(ATTR_TEMPERATURE)
+        if target_temperature is None:
+            raise ValueError(
+                f"No {ATTR_TEMPERATURE} parameter passed to set_temperature method."
+            )
+
+        mode = (
+            MaxThermostat._hvac_mode_to_mode(kwargs.get(ATTR_HVAC_MODE))
+            or self._shared_member_value(ATTR_MODE)
+            or MODE_MANUAL
+        )
+
+        self._connection.set_group_temperature(
+            self._group_id,
+            self._device_ids,
+            target_temperature,
+            mode
+        )
+
+    async def async_set_hvac_mode(self, hvac_mode: str) -> None:
+        target_temperature = self.target_temperature or DEFAULT_TEMPERATURE
+
+        if hvac_mode == HVACMode.OFF:
+            target_temperature = OFF_TEMPERATURE
+        elif target_temperature == OFF_TEMPERATURE:
+            target_temperature = DEFAULT_TEMPERATURE
+
+        self._connection.set_group_temperature(
+            self._group_id,
+            self._device_ids,
+            target_temperature,
+            MaxThermostat._hvac_mode_to_mode(hvac_mode)
+        )
+
+    def _member_values(self, attribute: str) -> list:
+        return [
+            state[attribute]
+            for state in self._member_states.values()
+            if state.get(attribute) is not None
+        ]
+
+    def _shared_member_value(self, attribute: str):
+        values = set(self._member_values(attribute))
+        if len(values) != 1:
+            return None
+
+        return values.pop()
+
+    @callback
+    def _subscribe_members(self):
+        self._unsubscribe()
+
+        for device_id in self._device_ids:
+            @callback
+            def update(payload, device_id=device_id):
+                started = self._connection.metrics.start()
+
+                state = self._member_states[device_id]
+                previous_state = dict(state)
+                for attribute in (ATTR_MEASURED_TEMPERATURE, ATTR_DESIRED_TEMPERATURE, ATTR_MODE):
+                    if payload.get(attribute) is not None:
+                        state[attribute] = payload[attribute]
+
+                self.async_write_state_on_change(state != previous_state)
+                self._connection.metrics.record(STAGE_ENTITY_UPDATE, started)
+
+            self._unsubscribe_members.append(
+                async_dispatcher_connect(
+                    self.hass,
+                    self._connection.device_signal(SIGNAL_THERMOSTAT_UPDATE, device_id),
+                    update
+                )
+            )
+
+    @callback
+    def _unsubscribe(self):
+        for unsubscribe in self._unsubscribe_members:
+            unsubscribe()
+        self._unsubscribe_members = []
@@ -0,0 +1,116 @@
+'''
+Sensor entity module for Max eco push buttons
+'''
+
+import logging
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity
+)
+
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    ATTR_STATE
+)
+
+from homeassistant.core import callback
+
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from custom_components.maxcul import (
+    DOMAIN,
+    SIGNAL_PUSH_BUTTON_UPDATE
+)
+
+from custom_components.maxcul.device import MaxDevice
+from custom_components.maxcul.entity import MaxDeviceEntity
+from custom_components.maxcul.instrumentation import STAGE_ENTITY_UPDATE
+
+LOGGER = logging.getLogger(__name__)
+
+# fired on the event bus for every press, automations trigger on it
+EVENT_PUSH_BUTTON_PRESSED = DOMAIN + '_push_button_pressed'
+
+ATTR_BUTTON = 'button'
+ATTR_RF_ADDRESS = 'rf_address'
+
+BUTTON_COMFORT = 'comfort'
+BUTTON_ECO = 'eco'
+
+
+class MaxPushButton(MaxDeviceEntity, SensorEntity):
+    ''' Sensor entity class for Max eco push buttons showing the last pressed button '''
+
+    def __init__(self, device: MaxDevice):
+        super().__init__(device)
+
+        self._button: str or None = None
+
+    async def async_added_to_hass(self) -> None:
+        @callback
+        def update(payload):
+            state = payload.get(ATTR_STATE)
+            if state is None:
+                return
+
+            started = self._connection.metrics.start()
+
+            self._button = BUTTON_COMFORT if state else BUTTON_ECO
+
+            LOGGER.debug(
+                'Received press of %s (%x): %s',
+                self.name,
+                self.sender_id,
+                self._button
+            )
+
+            self.hass.bus.async_fire(
+                EVENT_PUSH_BUTTON_PRESSED,
+                {
+                    ATTR_ENTITY_ID: self.entity_id,
+                    ATTR_RF_ADDRESS: self.sender_id,
+                    ATTR_BUTTON: self._button
+                }
+            )
+
+            # pressing the same button again is recorded as well
+            self.async_write_state_on_change(True)
+            self._connection.metrics.record(STAGE_ENTITY_UPDATE, started)
+
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                self._connection.device_signal(SIGNAL_PUSH_BUTTON_UPDATE, self.sender_id),
+                update
+            )
+        )
+
+        # show the button pressed before the restart without firing the press again
+        last_state = self._connection.last_state(self.sender_id)
+        if last_state.get(ATTR_STATE) is not None:
+            self._button = BUTTON_COMFORT if last_state[ATTR_STATE] else BUTTON_ECO
+
+    @property
+    def name(self) -> str:
+        return self._device.name
+
+    @property
+    def unique_id(self) -> str:
+        return self._device.device_id
+
+    @property
+    def icon(self) -> str:
+        return 'mdi:leaf' if self._button == BUTTON_ECO else 'mdi:white-balance-sunny'
+
+    @property
+    def device_class(self) -> str:
+        return SensorDeviceClass.ENUM
+
+    @property
+    def options(self) -> list[str]:
+        return [BUTTON_COMFORT, BUTTON_ECO]
+
+    @property
+    def native_value(self) -> str or None:
+        return self._button
@@ -3,7 +3,6 @@ Binary sensor entity module for Max window shutter sensors
 '''
 
 from typing import Any, Mapping
-import copy
 import logging
 
 from homeassistant.components.binary_sensor import (
@@ -11,84 +10,41 @@ from homeassistant.components.binary_sensor import (
     BinarySensorEntity
 )
 
-from homeassistant.config_entries import ConfigEntry
-
 from homeassistant.const import (
-    ATTR_STATE,
-    CONF_DEVICES,
-    CONF_NAME,
-    CONF_TYPE
+    ATTR_STATE
 )
 
-from homeassistant.core import (
-    HomeAssistant,
-    callback
-)
+from homeassistant.core import callback
 
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
-from homeassistant.helpers.entity import DeviceInfo
 
 from maxcul._const import (
-    ATTR_DEVICE_ID,
-    SHUTTER_CONTACT,
     SHUTTER_OPEN
 )
 
-from custom_components.maxcul import (
-    DOMAIN,
-    SIGNAL_SHUTTER_UPDATE,
-    MaxCulConnection
-)
+from custom_components.maxcul import SIGNAL_SHUTTER_UPDATE
+
+from custom_components.maxcul.device import MaxDevice
+from custom_components.maxcul.entity import MaxDeviceEntity
+from custom_components.maxcul.instrumentation import STAGE_ENTITY_UPDATE
 
 LOGGER = logging.getLogger(__name__)
 
 
-class MaxShutter(BinarySensorEntity):
+class MaxShutter(MaxDeviceEntity, BinarySensorEntity):
     ''' Binary sensor entity class for Max window shutter sensors '''
 
-    def __init__(
-        self,
-        hass: HomeAssistant,
-        config_entry: ConfigEntry,
-        connection: MaxCulConnection,
-        device_id: str,
-        name: str
-    ):
-        self._hass = hass
-        self._config_entry = config_entry
-
-        self._name = name
-        self._device_id = device_id
-        self._connection = connection
+    def __init__(self, device: MaxDevice):
+        super().__init__(device)
 
         self._is_open = None
 
-        self._connection.add_paired_device(self.sender_id)
-
-        new_data = copy.deepcopy(dict(config_entry.data))
-        new_data[CONF_DEVICES][device_id] = {
-            CONF_NAME: name,
-            CONF_TYPE: SHUTTER_CONTACT
-        }
-
-        hass.config_entries.async_update_entry(config_entry, data=new_data)
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        return {
-            "identifiers": {
-                (DOMAIN, self._device_id)
-            },
-            "name": self.name,
-        }
-
     async def async_added_to_hass(self) -> None:
         @callback
         def update(payload):
-            device_id = payload.get(ATTR_DEVICE_ID)
-            if device_id != self.sender_id:
-                return
+            started = self._connection.metrics.start()
 
+            previous_state = self._is_open
             self._is_open = payload.get(ATTR_STATE, None)
 
             LOGGER.debug(
@@ -98,26 +54,29 @@ class MaxShutter(BinarySensorEntity):
                 self._is_open
             )
 
-            self.async_schedule_update_ha_state()
+            self.async_write_state_on_change(self._is_open != previous_state)
+            self._connection.metrics.record(STAGE_ENTITY_UPDATE, started)
+
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                self._connection.device_signal(SIGNAL_SHUTTER_UPDATE, self.sender_id),
+                update
+            )
+        )
 
-        async_dispatcher_connect(self.hass, SIGNAL_SHUTTER_UPDATE, update)
+        # show the state from before the restart until the device reports again
+        last_state = self._connection.last_state(self.sender_id)
+        if last_state:
+            update(last_state)
 
     @property
     def name(self) -> str:
-        return self._name
+        return self._device.name
 
     @property
     def unique_id(self) -> str:
-        return self._device_id
-
-    @property
-    def sender_id(self) -> int:
-        ''' Return the RF address of the device '''
-        return int(self._device_id)
-
-    @property
-    def should_poll(self) -> bool:
-        return False
+        return self._device.device_id
 
     @property
     def device_class(self) -> str:
@@ -3,7 +3,6 @@ Climate entity module for Max Thermostats
 '''
 
 from typing import Any, Mapping
-import copy
 import logging
 
 from homeassistant.components.climate import (
@@ -20,34 +19,25 @@ from homeassistant.components.climate.const import (
     PRESET_NONE,
 )
 
-from homeassistant.components.maxcube.climate import (
-    ATTR_VALVE_POSITION,
-)
-
 from homeassistant.const import (
     UnitOfTemperature,
     ATTR_MODE,
     ATTR_TEMPERATURE,
-    CONF_DEVICES,
     CONF_NAME,
     CONF_TYPE,
 )
 
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.core import callback
 
-from homeassistant.config_entries import ConfigEntry
-
-from homeassistant.helpers.dispatcher import async_dispatcher_connect
-from homeassistant.helpers.entity import DeviceInfo
-
-from maxcul._const import (
-    ATTR_DEVICE_ID,
-    HEATING_THERMOSTAT
+from homeassistant.helpers.dispatcher import (
+    async_dispatcher_connect,
+    async_dispatcher_send
 )
 
 from maxcul import (
     ATTR_DESIRED_TEMPERATURE,
     ATTR_MEASURED_TEMPERATURE,
+    ATTR_VALVE_POSITION,
     MODE_AUTO,
     MODE_BOOST,
     MODE_MANUAL,
@@ -56,11 +46,23 @@ from maxcul import (
 )
 
 from custom_components.maxcul import (
-    DOMAIN,
+    ATTR_ROOM_TEMPERATURE,
+    CONF_GROUP_ID,
+    CONF_LINKED_DEVICES,
+    SIGNAL_COMMAND_UPDATE,
+    SIGNAL_GROUPS_CHANGED,
+    SIGNAL_LINKS_CHANGED,
     SIGNAL_THERMOSTAT_UPDATE,
-    MaxCulConnection
+    SIGNAL_WALL_THERMOSTAT_UPDATE,
+    MaxCulConnection,
+    async_register_devices
 )
 
+from custom_components.maxcul.commands import ATTR_COMMAND_STATE
+from custom_components.maxcul.device import MaxDevice
+from custom_components.maxcul.entity import MaxDeviceEntity
+from custom_components.maxcul.instrumentation import STAGE_ENTITY_UPDATE
+
 from custom_components.maxcul.const import (
     MIN_TEMPERATURE,
     MAX_TEMPERATURE,
@@ -70,28 +72,24 @@ from custom_components.maxcul.const import (
 LOGGER = logging.getLogger(__name__)
 
 
-class MaxThermostat(ClimateEntity):
+class MaxThermostat(MaxDeviceEntity, ClimateEntity):
     ''' Climate entity class for Max Thermostats '''
 
-    def __init__(
-        self,
-        hass: HomeAssistant,
-        config_entry: ConfigEntry,
-        connection: MaxCulConnection,
-        device_id: str,
-        name: str
-    ):
-        self._hass = hass
-        self._config_entry = config_entry
-
-        self._name = name
-        self._device_id = device_id
-        self._connection = connection
+    # signal of the connection the state of the device is received with
+    update_signal = SIGNAL_THERMOSTAT_UPDATE
+
+    def __init__(self, device: MaxDevice, group_id: int = 0):
+        super().__init__(device)
+
+        self._group_id = group_id
 
         self._current_temperature: float or None = None
         self._target_temperature: float or None = None
         self._valve_position: int or None = None
 
+        # measured by the linked wall thermostat, preferred to the one measured at the radiator
+        self._room_temperature: float or None = None
+
         self._desired_target_temperature: float or None = None
 
         # auto manual temporary boost
@@ -99,50 +97,39 @@ class MaxThermostat(ClimateEntity):
 
         self._desired_mode = None
 
-        self._connection.add_paired_device(self.sender_id)
-
-        new_data = copy.deepcopy(dict(config_entry.data))
-        new_data[CONF_DEVICES][device_id] = {
-            CONF_NAME: name,
-            CONF_TYPE: HEATING_THERMOSTAT
-        }
-
-        hass.config_entries.async_update_entry(config_entry, data=new_data)
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        return {
-            "identifiers": {
-                (DOMAIN, self._device_id)
-            },
-            "name": self.name,
-        }
+        # state of the last command sent to the device, pending until it is acknowledged
+        self._command_state: str or None = None
 
     async def async_added_to_hass(self) -> None:
         @callback
         def update(payload):
-            device_id = payload.get(ATTR_DEVICE_ID)
-            if device_id != self.sender_id:
-                return
+            started = self._connection.metrics.start()
 
             current_temperature = payload.get(ATTR_MEASURED_TEMPERATURE)
+            room_temperature = payload.get(ATTR_ROOM_TEMPERATURE)
             target_temperature = payload.get(ATTR_DESIRED_TEMPERATURE)
             valve_position = payload.get(ATTR_VALVE_POSITION)
             mode = payload.get(ATTR_MODE)
 
             LOGGER.debug(
-                'Received update of %s (%x): current_temperature: %.1f, target_temperature: %.1f, valve_position: %d, mode: %s',
+                'Received update of %s (%x): current_temperature: %s, room_temperature: %s, target_temperature: %s, valve_position: %s, mode: %s',
                 self.name,
                 self.sender_id,
                 current_temperature,
+                room_temperature,
                 target_temperature,
                 valve_position,
                 mode
             )
 
+            previous_state = self._device_state()
+
             if current_temperature is not None:
                 self._current_temperature = current_temperature
 
+            if room_temperature is not None:
+                self._room_temperature = room_temperature
+
             if target_temperature is not None:
                 self._target_temperature = target_temperature
 
@@ -155,26 +142,61 @@ class MaxThermostat(ClimateEntity):
             self._desired_target_temperature = None
             self._desired_mode = None
 
-            self.async_schedule_update_ha_state()
+            self.async_write_state_on_change(self._device_state() != previous_state)
+            self._connection.metrics.record(STAGE_ENTITY_UPDATE, started)
 
-        async_dispatcher_connect(self.hass, SIGNAL_THERMOSTAT_UPDATE, update)
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                self._connection.device_signal(self.update_signal, self.sender_id),
+                update
+            )
+        )
+
+        @callback
+        def command_update(payload):
+            self._command_state = payload.get(ATTR_COMMAND_STATE)
+            self.async_write_ha_state()
+
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                self._connection.device_signal(SIGNAL_COMMAND_UPDATE, self.sender_id),
+                command_update
+            )
+        )
+
+        # show the state from before the restart until the device reports again
+        last_state = self._connection.last_state(self.sender_id)
+        if last_state:
+            update(last_state)
+
+    def _device_state(self) -> tuple:
+        # the valve position is only shown by its sensor, here it just tells whether the device heats
+        return (
+            self.current_temperature,
+            self._target_temperature,
+            self.hvac_action,
+            self._mode
+        )
 
     @property
     def name(self) -> str:
-        return self._name
+        return self._device.name
 
     @property
     def unique_id(self) -> str:
-        return self._device_id
+        return self._device.device_id
 
     @property
-    def sender_id(self) -> int:
-        ''' Return the RF address of the device '''
-        return int(self._device_id)
+    def connection(self) -> MaxCulConnection:
+        ''' Return the connection of the device '''
+        return self._connection
 
     @property
-    def should_poll(self) -> bool:
-        return False
+    def group_id(self) -> int:
+        ''' Return the MAX! group of the device, 0 if it is not part of a group '''
+        return self._group_id
 
     @property
     def supported_features(self) -> int:
@@ -194,6 +216,9 @@ class MaxThermostat(ClimateEntity):
 
     @property
     def current_temperature(self) -> float or None:
+        if self._room_temperature is not None:
+            return self._room_temperature
+
         return self._current_temperature
 
     @property
@@ -259,11 +284,15 @@ class MaxThermostat(ClimateEntity):
 
     @property
     def extra_state_attributes(self) -> Mapping[str, Any]:
-        return {
-            ATTR_VALVE_POSITION: self._valve_position
-        }
+        attributes = {CONF_GROUP_ID: self._group_id}
+
+        # the state of the last command is only shown once a command was sent
+        if self._command_state is not None:
+            attributes[ATTR_COMMAND_STATE] = self._command_state
 
-    def set_hvac_mode(self, hvac_mode: str) -> None:
+        return attributes
+
+    async def async_set_hvac_mode(self, hvac_mode: str) -> None:
         new_temperature = self._desired_target_temperature or self._target_temperature or DEFAULT_TEMPERATURE
         new_hvac_mode = self._hvac_mode_to_mode(hvac_mode)
 
@@ -286,12 +315,12 @@ class MaxThermostat(ClimateEntity):
         self._desired_mode = new_hvac_mode
 
         self._connection.set_temperature(
-            self.sender_id,
+            self._command_target,
             new_temperature,
             new_hvac_mode
         )
 
-    def set_temperature(self, **kwargs) -> None:
+    async def async_set_temperature(self, **kwargs) -> None:
         target_temperature = kwargs.get(ATTR_TEMPERATURE)
         hvac_mode = self._desired_mode or self._mode or MODE_MANUAL
 
@@ -315,12 +344,12 @@ class MaxThermostat(ClimateEntity):
         self._desired_target_temperature = target_temperature
 
         self._connection.set_temperature(
-            self.sender_id,
+            self._command_target,
             target_temperature,
             hvac_mode
         )
 
-    def set_preset_mode(self, preset_mode: str) -> None:
+    async def async_set_preset_mode(self, preset_mode: str) -> None:
         LOGGER.debug(
             'Setting preset mode of %s (%x) to %s',
             self.name,
@@ -345,11 +374,63 @@ class MaxThermostat(ClimateEntity):
         self._desired_mode = mode
 
         self._connection.set_temperature(
-            self.sender_id,
+            self._command_target,
             target_temperature,
             mode
         )
 
+    async def async_set_group_id(self, group_id: int) -> None:
+        ''' Assign the device to a MAX! group '''
+        LOGGER.debug(
+            'Setting group of %s (%x) to %d',
+            self.name,
+            self.sender_id,
+            group_id
+        )
+
+        self._connection.set_group_id(self.sender_id, group_id)
+        self._group_id = group_id
+
+        self._async_register()
+
+        async_dispatcher_send(self.hass, SIGNAL_GROUPS_CHANGED, self._device.config_entry.entry_id)
+
+        self.async_write_ha_state()
+
+    async def async_set_week_program(self, week_program: dict[str, list]) -> None:
+        ''' Upload the program of the given days of the week to the device '''
+        days = self._connection.set_week_program(self.sender_id, week_program)
+
+        LOGGER.debug(
+            'Setting week program of %s (%x), changed days: %s',
+            self.name,
+            self.sender_id,
+            days
+        )
+
+    @property
+    def _command_target(self) -> int:
+        # a thermostat linked to a wall thermostat follows its set point, so it is commanded
+        # through the wall thermostat which passes the command on to all linked thermostats
+        return self._connection.link_partner(self.sender_id) or self.sender_id
+
+    def _registration(self) -> dict:
+        return {
+            CONF_NAME: self._device.name,
+            CONF_TYPE: self._device.device_type,
+            CONF_GROUP_ID: self._group_id
+        }
+
+    @callback
+    def _async_register(self):
+        async_register_devices(
+            self.hass,
+            self._device.config_entry,
+            {
+                self._device.device_id: self._registration()
+            }
+        )
+
     @staticmethod
     def _hvac_mode_to_mode(hvac_mode):
         return {
@@ -366,3 +447,55 @@ class MaxThermostat(ClimateEntity):
             MODE_BOOST: HVACMode.AUTO, # ?
             MODE_TEMPORARY: HVACMode.HEAT # ? vacation, away mode
         }.get(mode)
+
+
+class MaxWallThermostat(MaxThermostat):
+    '''
+    Climate entity class for Max wall thermostats
+
+    The wall thermostat measures the temperature of the room and passes its set point on
+    to the thermostats linked to it.
+    '''
+
+    update_signal = SIGNAL_WALL_THERMOSTAT_UPDATE
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+
+        @callback
+        def links_changed(payload):
+            LOGGER.debug(
+                'Thermostats linked to %s (%x) changed to %s',
+                self.name,
+                self.sender_id,
+                payload.get(CONF_LINKED_DEVICES)
+            )
+
+            self._async_register()
+            self.async_write_ha_state()
+
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                self._connection.device_signal(SIGNAL_LINKS_CHANGED, self.sender_id),
+                links_changed
+            )
+        )
+
+    @property
+    def hvac_action(self) -> str or None:
+        # the valves are at the linked thermostats
+        return None
+
+    @property
+    def extra_state_attributes(self) -> Mapping[str, Any]:
+        return {
+            **super().extra_state_attributes,
+            CONF_LINKED_DEVICES: sorted(self._connection.linked_devices(self.sender_id))
+        }
+
+    def _registration(self) -> dict:
+        return {
+            **super()._registration(),
+            CONF_LINKED_DEVICES: sorted(self._connection.linked_devices(self.sender_id))
+        }
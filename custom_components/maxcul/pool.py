@@ -0,0 +1,161 @@
+'''
+Pool of CUL devices sharing received frames and routing outbound messages
+'''
+
+import logging
+import time
+from typing import Hashable
+
+from homeassistant.core import callback
+
+from maxcul._messages import MoritzMessage
+
+from custom_components.maxcul.frame_cache import FrameCache
+from custom_components.maxcul.transport import normalize_device_path
+
+LOGGER = logging.getLogger(__name__)
+
+# seconds a received signal strength is used for routing messages to the device
+LINK_MAX_AGE = 900
+
+
+def rssi_to_dbm(signal_strength: int) -> float:
+    ''' Convert the raw signal strength byte appended to frames by the CUL to dBm '''
+    if signal_strength >= 128:
+        signal_strength -= 256
+
+    return signal_strength / 2 - 74
+
+
+class CulPool:
+    '''
+    Merges the frames received by all CUL devices into one stream
+
+    Every frame is handled once by the connection the sending device is paired with, no
+    matter which CUL received it. The signal strength of each device is tracked per CUL
+    and outbound messages are sent through the CUL with the best recent link to their
+    receiver.
+    '''
+
+    def __init__(self):
+        self._connections = []
+        self._index = {}
+        self._frame_cache = FrameCache()
+        self._links: dict[int, dict] = {}
+
+    @property
+    def connections(self) -> list:
+        ''' Return the connections of the pool '''
+        return list(self._connections)
+
+    @callback
+    def add(self, connection):
+        ''' Add a connection to the pool '''
+        if connection not in self._connections:
+            self._connections.append(connection)
+            self._index[normalize_device_path(connection.device_path)] = connection
+
+    @callback
+    def remove(self, connection):
+        ''' Remove a connection and its links from the pool '''
+        if connection in self._connections:
+            self._connections.remove(connection)
+
+        device_path = normalize_device_path(connection.device_path)
+        if self._index.get(device_path) is connection:
+            del self._index[device_path]
+
+        for links in self._links.values():
+            links.pop(connection, None)
+
+    def connection(self, device_path: str):
+        ''' Return the connection of a device path given with or without telnet:// prefix '''
+        return self._index.get(normalize_device_path(device_path))
+
+    def link_quality(self, device_id: int) -> dict[str, float]:
+        ''' Return the last signal strength in dBm of a device per CUL device path '''
+        return {
+            connection.device_path: rssi
+            for connection, (rssi, _) in self._links.get(device_id, {}).items()
+        }
+
+    @callback
+    def frame_received(
+        self,
+        receiver,
+        msg: MoritzMessage,
+        signal_strength: int,
+        frame: str
+    ):
+        ''' Handle a frame received by a CUL of the pool '''
+        self._links.setdefault(msg.sender_id, {})[receiver] = (
+            rssi_to_dbm(signal_strength),
+            time.monotonic()
+        )
+
+        # the frame without signal strength contains sender, message counter and payload
+        key = (msg.sender_id, msg.counter, frame)
+        duplicate = self._frame_cache.seen(key, receiver)
+
+        if duplicate and self._frame_cache.source(key) is not receiver:
+            # the same transmission heard by another CUL was answered already, only
+            # retransmissions heard by the first CUL are answered again
+            LOGGER.debug(f"Dropping copy of {msg} received by {receiver.device_path}")
+            return
+
+        # prefer the receiving connection, fall back to it if no connection is responsible
+        handler = next(
+            (
+                connection
+                for connection in [receiver, *self._connections]
+                if connection.handles_message(msg)
+            ),
+            receiver
+        )
+        handler.handle_message(msg, signal_strength, duplicate)
+
+    def transmitter(self, device_id: int, default):
+        ''' Return the connected CUL with the best recent link to the device '''
+        now = time.monotonic()
+
+        best, best_rssi = default, None
+        for connection, (rssi, received) in self._links.get(device_id, {}).items():
+            if now - received > LINK_MAX_AGE or not connection.is_connected:
+                continue
+
+            if best_rssi is None or rssi > best_rssi:
+                best, best_rssi = connection, rssi
+
+        return best
+
+    @callback
+    def enqueue(
+        self,
+        origin,
+        msg: MoritzMessage,
+        priority: int,
+        key: Hashable = None
+    ):
+        '''
+        Queue a message of the origin connection on the CUL routed to its receiver
+
+        Return the transmitting connection and the estimated delay in seconds. A queued
+        message with the same key on another CUL is dropped, as it is superseded.
+        '''
+        transmitter = self.transmitter(msg.receiver_id, origin)
+
+        if key is not None:
+            self.discard(key, exclude=transmitter)
+
+        if transmitter is not origin:
+            LOGGER.debug(f"Routing message {msg} through {transmitter.device_path}")
+
+        delay = transmitter.scheduler.enqueue(msg, priority, key, origin.message_sent)
+        return transmitter, delay
+
+    @callback
+    def discard(self, key: Hashable, exclude=None):
+        ''' Drop the queued messages occupying the given slot on all CUL devices '''
+        for connection in self._connections:
+            if connection is not exclude:
+                connection.scheduler.discard(key)
@@ -0,0 +1,296 @@
+'''
+Duty cycle aware scheduler for outbound MAX! messages
+'''
+
+import heapq
+import itertools
+import logging
+import time
+from typing import Callable, Hashable
+
+from homeassistant.core import (
+    HomeAssistant,
+    callback
+)
+
+from homeassistant.helpers.event import async_call_later
+
+from maxcul._messages import MoritzMessage
+
+LOGGER = logging.getLogger(__name__)
+
+COMMAND_REQUEST_BUDGET = 'X'
+
+PRIORITY_RESPONSE = 0
+PRIORITY_COMMAND = 1
+PRIORITY_BACKGROUND = 2
+
+# the CUL accumulates 1% of the elapsed time as transmit credit, capped at 9 s
+CREDIT_REGAIN_RATE = 0.01
+MAX_CREDITS = 9000
+
+# airtime in ms of the wake-up preamble and of each byte sent at 10 kbit/s
+PREAMBLE_AIRTIME = 1000
+BYTE_AIRTIME = 0.8
+
+# minimum seconds between two budget requests to the CUL
+BUDGET_REQUEST_INTERVAL = 10
+
+
+def estimate_airtime(command: str) -> float:
+    ''' Return the estimated airtime in ms of an encoded Zs command '''
+    return PREAMBLE_AIRTIME + (len(command) - 2) / 2 * BYTE_AIRTIME
+
+
+class CommandScheduler:
+    '''
+    Queues outbound messages by priority and sends them within the transmit credits of the CUL
+
+    The credits are estimated locally from the airtime of sent messages and the regain rate
+    of the 1% rule and are corrected whenever the CUL reports its actual budget. Messages
+    queued with a key occupy a slot: a newer message with the same key replaces the queued
+    one in place instead of being sent after it.
+
+    Queue entries are lists of priority, sequence number, message, key, the callback to
+    notify once the message was written and the estimated airtime of the message. The
+    airtime queued per priority is kept as running total, so the delay of a message is
+    estimated without sorting the queue or encoding the messages ahead of it.
+    '''
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        write_line: Callable[[str], bool],
+        sent_callback: Callable[[MoritzMessage], None] = None
+    ):
+        self._hass = hass
+        self._write_line = write_line
+        self._sent_callback = sent_callback
+
+        self._queue = []
+        self._slots = {}
+        self._sequence = itertools.count()
+        self._queued_airtime: dict[int, float] = {}
+
+        self._credits = 0.0
+        self._credits_timestamp = time.monotonic()
+        self._last_sent: tuple or None = None
+
+        self._budget_checked_at: float or None = None
+        self._cancel_wakeup = None
+
+    @property
+    def credits(self) -> float:
+        ''' Return the estimated transmit credits of the CUL in ms '''
+        elapsed = time.monotonic() - self._credits_timestamp
+        return min(MAX_CREDITS, self._credits + elapsed * 1000 * CREDIT_REGAIN_RATE)
+
+    @property
+    def queue_depth(self) -> int:
+        ''' Return the number of messages waiting to be sent '''
+        return len(self._queue)
+
+    @property
+    def estimated_completion(self) -> float:
+        ''' Return the estimated number of seconds until all queued messages are sent '''
+        return self._estimate_delay(sum(self._queued_airtime.values()))
+
+    def has_credits_for(self, msg: MoritzMessage) -> bool:
+        ''' Return whether the message could be sent right away '''
+        return self.credits >= estimate_airtime(msg.encode_message())
+
+    @callback
+    def enqueue(
+        self,
+        msg: MoritzMessage,
+        priority: int = PRIORITY_COMMAND,
+        key: Hashable = None,
+        sent_callback: Callable[[MoritzMessage], None] = None
+    ) -> float:
+        '''
+        Queue a message and return the estimated number of seconds until it is sent
+
+        The sent callback replaces the callback of the scheduler for this message.
+        '''
+
+        sent_callback = sent_callback or self._sent_callback
+        airtime = estimate_airtime(msg.encode_message())
+        entry = self._slots.get(key) if key is not None else None
+
+        if entry is not None:
+            LOGGER.debug(f"Message {entry[2]} is superseded by {msg}")
+            self._track_airtime(entry, -1)
+            entry[2] = msg
+            entry[4] = sent_callback
+            entry[5] = airtime
+
+            # e.g. a new command superseding a background retry
+            if priority < entry[0]:
+                entry[0] = priority
+                heapq.heapify(self._queue)
+
+            self._track_airtime(entry, 1)
+
+            # the superseded message keeps its place among the messages of its priority
+            queued_before = sum(
+                queued[5]
+                for queued in self._queue
+                if queued[0] == entry[0] and queued[1] <= entry[1]
+            )
+        else:
+            entry = [priority, next(self._sequence), msg, key, sent_callback, airtime]
+            heapq.heappush(self._queue, entry)
+            self._track_airtime(entry, 1)
+            if key is not None:
+                self._slots[key] = entry
+
+            # a new message is queued after all messages of its priority
+            queued_before = self._queued_airtime[priority]
+
+        delay = self._estimate_delay(queued_before + sum(
+            queued_airtime
+            for queued_priority, queued_airtime in self._queued_airtime.items()
+            if queued_priority < entry[0]
+        ))
+
+        self._process()
+
+        return delay
+
+    @callback
+    def discard(self, key: Hashable):
+        ''' Drop the queued message occupying the given slot '''
+        entry = self._slots.pop(key, None)
+        if entry is None:
+            return
+
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+        self._track_airtime(entry, -1)
+
+    @callback
+    def budget_received(self, budget: int):
+        ''' Correct the estimated credits with the budget in ms reported by the CUL '''
+        LOGGER.debug(f"Got pending budget: {budget} ms")
+
+        self._set_credits(budget)
+        self._budget_checked_at = time.monotonic()
+        self._last_sent = None
+
+        self._process()
+
+    @callback
+    def budget_exhausted(self):
+        ''' Handle the CUL refusing to send because of an exhausted budget '''
+        self._set_credits(0)
+
+        entry = self._last_sent
+        self._last_sent = None
+
+        # the last message was not sent by the CUL, queue it again unless it was superseded
+        if entry is not None and (entry[3] is None or entry[3] not in self._slots):
+            LOGGER.debug(f"Requeueing message {entry[2]} refused by the CUL")
+            heapq.heappush(self._queue, entry)
+            self._track_airtime(entry, 1)
+            if entry[3] is not None:
+                self._slots[entry[3]] = entry
+
+        self._process()
+
+    @callback
+    def resume(self):
+        ''' Ask the CUL for its budget and continue sending queued messages '''
+        self._budget_checked_at = None
+        self._process()
+        self._request_budget()
+
+    @callback
+    def clear(self):
+        ''' Drop all queued messages and pending timers '''
+        self._queue.clear()
+        self._slots.clear()
+        self._queued_airtime.clear()
+        self._last_sent = None
+
+        if self._cancel_wakeup:
+            self._cancel_wakeup()
+            self._cancel_wakeup = None
+
+    def _set_credits(self, credits_ms: float):
+        self._credits = credits_ms
+        self._credits_timestamp = time.monotonic()
+
+    def _track_airtime(self, entry: list, sign: int):
+        if not self._queue:
+            # start over with an empty queue instead of accumulating rounding errors
+            self._queued_airtime.clear()
+            return
+
+        self._queued_airtime[entry[0]] = self._queued_airtime.get(entry[0], 0.0) + sign * entry[5]
+
+    def _estimate_delay(self, airtime: float) -> float:
+        # sending the airtime takes its own duration plus the time to regain missing credits
+        missing_credits = max(0.0, airtime - self.credits)
+        return airtime / 1000 + missing_credits / (1000 * CREDIT_REGAIN_RATE)
+
+    @callback
+    def _process(self):
+        if self._cancel_wakeup:
+            self._cancel_wakeup()
+            self._cancel_wakeup = None
+
+        while self._queue:
+            entry = self._queue[0]
+            msg = entry[2]
+            airtime = entry[5]
+
+            credits = self.credits
+            if credits < airtime:
+                self._wait_for_credits(airtime - credits)
+                return
+
+            if not self._write_line(msg.encode_message()):
+                return
+
+            heapq.heappop(self._queue)
+            self._track_airtime(entry, -1)
+            if entry[3] is not None:
+                del self._slots[entry[3]]
+
+            self._set_credits(credits - airtime)
+            self._last_sent = entry
+
+            if entry[4]:
+                entry[4](msg)
+
+    @callback
+    def _wait_for_credits(self, missing_credits: float):
+        delay = missing_credits / (1000 * CREDIT_REGAIN_RATE)
+
+        # the estimate might be too pessimistic, ask the CUL before waiting
+        if self._request_budget():
+            delay = min(delay, BUDGET_REQUEST_INTERVAL)
+
+        LOGGER.debug(f"Waiting {delay:.0f} s for transmit credits, {len(self._queue)} message(s) queued")
+
+        @callback
+        def wakeup(_):
+            self._cancel_wakeup = None
+            self._process()
+
+        self._cancel_wakeup = async_call_later(self._hass, delay, wakeup)
+
+    @callback
+    def _request_budget(self) -> bool:
+        now = time.monotonic()
+        if (
+            self._budget_checked_at is not None
+            and now - self._budget_checked_at < BUDGET_REQUEST_INTERVAL
+        ):
+            return False
+
+        if not self._write_line(COMMAND_REQUEST_BUDGET):
+            return False
+
+        self._budget_checked_at = now
+        return True
@@ -0,0 +1,271 @@
+'''
+Sensor platform module of MaxCUL integration
+'''
+
+from datetime import timedelta
+from typing import Any, Mapping
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass
+)
+
+from homeassistant.config_entries import ConfigEntry
+
+from homeassistant.const import (
+    CONF_DEVICES,
+    CONF_NAME,
+    CONF_TYPE,
+    PERCENTAGE,
+    UnitOfTemperature
+)
+
+from homeassistant.core import (
+    HomeAssistant,
+    callback
+)
+
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity import EntityCategory
+
+from maxcul._const import (
+    ATTR_DEVICE_ID,
+    ATTR_DEVICE_SERIAL,
+    ATTR_DEVICE_TYPE,
+    ATTR_MEASURED_TEMPERATURE,
+    ATTR_VALVE_POSITION,
+    HEATING_THERMOSTAT,
+    PUSH_BUTTON
+)
+
+from custom_components.maxcul import (
+    ATTR_CONNECTION_DEVICE_PATH,
+    CONF_CONNECTIONS,
+    CONF_DEVICE_PATH,
+    DOMAIN,
+    SIGNAL_DEVICE_PAIRED,
+    SIGNAL_DEVICE_REPAIRED,
+    SIGNAL_THERMOSTAT_UPDATE,
+    MaxCulConnection,
+    async_register_devices
+)
+
+from custom_components.maxcul.device import MaxDevice, async_get_device
+from custom_components.maxcul.entity import MaxDeviceEntity
+from custom_components.maxcul.instrumentation import STAGE_ENTITY_UPDATE, STAGES
+from custom_components.maxcul.max_push_button import MaxPushButton
+
+# the diagnostics sensor polls the collected metrics instead of adding work to the receive path
+SCAN_INTERVAL = timedelta(seconds=30)
+
+
+async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, async_add_devices):
+    ''' Set up the sensor platform for the MaxCUL integration from a config entry. '''
+
+    device_path = config_entry.data.get(CONF_DEVICE_PATH)
+    connection = hass.data[DOMAIN][CONF_CONNECTIONS][device_path]
+
+    devices = []
+    registrations = {}
+    for device_id, device in config_entry.data.get(CONF_DEVICES).items():
+        if device[CONF_TYPE] == HEATING_THERMOSTAT:
+            devices.extend(
+                _thermostat_sensors(
+                    async_get_device(hass, config_entry, device_id, device[CONF_NAME], HEATING_THERMOSTAT)
+                )
+            )
+
+        elif device[CONF_TYPE] == PUSH_BUTTON:
+            devices.append(
+                MaxPushButton(
+                    async_get_device(hass, config_entry, device_id, device[CONF_NAME], PUSH_BUTTON)
+                )
+            )
+            registrations[device_id] = {
+                CONF_NAME: device[CONF_NAME],
+                CONF_TYPE: PUSH_BUTTON
+            }
+
+    if connection.metrics.enabled:
+        devices.append(MaxCulFramesSensor(config_entry, connection))
+
+    async_add_devices(devices)
+
+    async_register_devices(hass, config_entry, registrations)
+
+    @callback
+    def paired_callback(payload):
+        connection_device_path = payload.get(ATTR_CONNECTION_DEVICE_PATH)
+        if connection_device_path is not device_path:
+            return
+
+        device_type = payload.get(ATTR_DEVICE_TYPE)
+        if device_type not in (HEATING_THERMOSTAT, PUSH_BUTTON):
+            return
+
+        device_id = str(payload.get(ATTR_DEVICE_ID))
+        if device_id in config_entry.data.get(CONF_DEVICES):
+            return
+
+        device_name = payload.get(ATTR_DEVICE_SERIAL)
+        device = async_get_device(hass, config_entry, device_id, device_name, device_type)
+
+        if device_type is HEATING_THERMOSTAT:
+            async_add_devices(_thermostat_sensors(device))
+            return
+
+        async_add_devices([MaxPushButton(device)])
+
+        async_register_devices(
+            hass,
+            config_entry,
+            {
+                device_id: {
+                    CONF_NAME: device_name,
+                    CONF_TYPE: PUSH_BUTTON
+                }
+            }
+        )
+
+    config_entry.async_on_unload(
+        async_dispatcher_connect(hass, SIGNAL_DEVICE_PAIRED, paired_callback)
+    )
+    config_entry.async_on_unload(
+        async_dispatcher_connect(hass, SIGNAL_DEVICE_REPAIRED, paired_callback)
+    )
+
+
+def _thermostat_sensors(device: MaxDevice) -> list:
+    return [
+        MaxValvePosition(device),
+        MaxMeasuredTemperature(device)
+    ]
+
+
+class MaxThermostatSensor(MaxDeviceEntity, SensorEntity):
+    '''
+    Sensor of a value reported by a thermostat
+
+    Values are kept out of the climate entity, so they are recorded as numbers which
+    long-term statistics can be compiled of.
+    '''
+
+    # attribute of the thermostat update payload and suffix of name and unique id
+    attribute: str = None
+
+    def __init__(self, device: MaxDevice):
+        super().__init__(device)
+
+        self._value: float or None = None
+
+    async def async_added_to_hass(self) -> None:
+        @callback
+        def update(payload):
+            value = payload.get(self.attribute)
+            if value is None:
+                return
+
+            started = self._connection.metrics.start()
+
+            previous_value = self._value
+            self._value = value
+
+            self.async_write_state_on_change(self._value != previous_value)
+            self._connection.metrics.record(STAGE_ENTITY_UPDATE, started)
+
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                self._connection.device_signal(SIGNAL_THERMOSTAT_UPDATE, self.sender_id),
+                update
+            )
+        )
+
+        last_state = self._connection.last_state(self.sender_id)
+        if last_state:
+            update(last_state)
+
+    @property
+    def name(self) -> str:
+        return f"{self._device.name}-{self.attribute}"
+
+    @property
+    def unique_id(self) -> str:
+        return f"{self._device.device_id}-{self.attribute}"
+
+    @property
+    def state_class(self) -> str:
+        return SensorStateClass.MEASUREMENT
+
+    @property
+    def native_value(self) -> float or None:
+        return self._value
+
+
+class MaxValvePosition(MaxThermostatSensor):
+    ''' Valve position of a Max thermostat in percent '''
+
+    attribute = ATTR_VALVE_POSITION
+
+    @property
+    def icon(self) -> str:
+        return 'mdi:valve'
+
+    @property
+    def native_unit_of_measurement(self) -> str:
+        return PERCENTAGE
+
+
+class MaxMeasuredTemperature(MaxThermostatSensor):
+    ''' Temperature measured by a Max thermostat '''
+
+    attribute = ATTR_MEASURED_TEMPERATURE
+
+    @property
+    def device_class(self) -> str:
+        return SensorDeviceClass.TEMPERATURE
+
+    @property
+    def native_unit_of_measurement(self) -> str:
+        return UnitOfTemperature.CELSIUS
+
+
+class MaxCulFramesSensor(SensorEntity):
+    ''' Diagnostics sensor counting the frames received by a CUL device '''
+
+    def __init__(self, config_entry: ConfigEntry, connection: MaxCulConnection):
+        self._config_entry = config_entry
+        self._connection = connection
+
+    @property
+    def name(self) -> str:
+        return f"{self._config_entry.title} frames"
+
+    @property
+    def unique_id(self) -> str:
+        return f"{self._config_entry.entry_id}-frames"
+
+    @property
+    def entity_category(self) -> str:
+        return EntityCategory.DIAGNOSTIC
+
+    @property
+    def state_class(self) -> str:
+        return SensorStateClass.TOTAL_INCREASING
+
+    @property
+    def native_value(self) -> int:
+        return self._connection.metrics.frame_count
+
+    @property
+    def extra_state_attributes(self) -> Mapping[str, Any]:
+        metrics = self._connection.metrics
+        attributes = dict(metrics.frames)
+
+        for stage in STAGES:
+            histogram = metrics.histogram(stage)
+            attributes[f"{stage}_p50_ms"] = histogram.percentile(50)
+            attributes[f"{stage}_p95_ms"] = histogram.percentile(95)
+
+        return attributes
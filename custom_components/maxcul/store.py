@@ -0,0 +1,75 @@
+'''
+Persistent store of the last known state of MAX! devices
+'''
+
+from homeassistant.core import (
+    HomeAssistant,
+    callback
+)
+
+from homeassistant.helpers.storage import Store
+
+from maxcul._const import ATTR_DEVICE_ID
+
+STORAGE_VERSION = 1
+
+# seconds to collect state changes before they are written to disk
+STORAGE_SAVE_DELAY = 30
+
+
+class DeviceStateStore:
+    '''
+    Keeps the last reported state of each device keyed by its RF address
+
+    Only the attributes of received payloads are kept. Changes are written to disk
+    in batches after a short delay.
+    '''
+
+    def __init__(self, hass: HomeAssistant, key: str):
+        self._store = Store(hass, STORAGE_VERSION, key)
+        self._states: dict[str, dict] = {}
+
+    async def async_load(self):
+        ''' Load the stored states '''
+        self._states = await self._store.async_load() or {}
+
+    async def async_remove(self):
+        ''' Remove the stored states from disk '''
+        self._states = {}
+        await self._store.async_remove()
+
+    def get(self, device_id: int) -> dict:
+        ''' Return the last known state of a device '''
+        return dict(self._states.get(str(device_id), {}))
+
+    @callback
+    def update(self, device_id: int, payload: dict):
+        ''' Merge a received payload into the state of a device '''
+        state = self._states.setdefault(str(device_id), {})
+
+        changed = False
+        for attribute, value in payload.items():
+            if attribute == ATTR_DEVICE_ID or value is None or state.get(attribute) == value:
+                continue
+
+            state[attribute] = value
+            changed = True
+
+        if changed:
+            self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    @callback
+    def retain(self, device_ids):
+        ''' Drop the states of all devices except the given ones '''
+        device_ids = {str(device_id) for device_id in device_ids}
+
+        removed = [device_id for device_id in self._states if device_id not in device_ids]
+        for device_id in removed:
+            del self._states[device_id]
+
+        if removed:
+            self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self) -> dict:
+        return self._states
@@ -0,0 +1,206 @@
+'''
+Asyncio transport for serial and network CUL devices
+'''
+
+import asyncio
+from functools import partial
+import logging
+import re
+import time
+from typing import Callable, Iterable
+
+import async_timeout
+import serial
+import serial_asyncio
+
+LOGGER = logging.getLogger(__name__)
+
+TELNET_PREFIX = 'telnet://'
+
+DEFAULT_BAUDRATE = 38400
+
+# enable reporting of signal strength, receive MAX! messages, disable FHT mode
+CUL_INIT_COMMANDS = ('X21', 'Zr', 'T01')
+
+COMMAND_VERSION = 'V'
+
+# e.g. "V 1.67 nanoCUL868" or "V 1.26.08 a-culfw Build: 169 ..."
+VERSION_BANNER = re.compile(r'^V \d+\.\d+')
+
+# seconds between version requests and until a probed device is given up
+PROBE_INTERVAL = 0.5
+PROBE_TIMEOUT = 5
+
+
+class CulProtocol(asyncio.Protocol):
+    ''' Line based protocol spoken by CUL devices '''
+
+    def __init__(
+        self,
+        line_callback: Callable[[str], None],
+        connection_lost_callback: Callable[[Exception or None], None] = None
+    ):
+        self._line_callback = line_callback
+        self._connection_lost_callback = connection_lost_callback
+
+        self._transport: asyncio.Transport or None = None
+        self._buffer = bytearray()
+
+        # when enabled, the time of the last received chunk is kept for latency measurements
+        self.record_receive_time = False
+        self.received_at: float or None = None
+
+    @property
+    def is_connected(self) -> bool:
+        ''' Return whether the transport is open '''
+        return self._transport is not None and not self._transport.is_closing()
+
+    def connection_made(self, transport: asyncio.Transport):
+        self._transport = transport
+
+    def data_received(self, data: bytes):
+        if self.record_receive_time:
+            self.received_at = time.perf_counter()
+
+        self._buffer += data
+
+        while True:
+            index = self._buffer.find(b'\n')
+            if index < 0:
+                break
+
+            line = self._buffer[:index].rstrip(b'\r').decode('ascii', errors='replace')
+            del self._buffer[:index + 1]
+
+            if line:
+                self._line_callback(line)
+
+    def connection_lost(self, exc: Exception or None):
+        self._transport = None
+        self._buffer.clear()
+
+        if self._connection_lost_callback:
+            self._connection_lost_callback(exc)
+
+    def write_line(self, command: str):
+        ''' Write a single command line to the CUL device '''
+        self._transport.write((command + '\r\n').encode())
+
+    def close(self):
+        ''' Close the underlying transport '''
+        if self._transport is not None:
+            self._transport.close()
+
+    def abort(self):
+        ''' Close the underlying transport without flushing pending writes '''
+        if self._transport is not None:
+            self._transport.abort()
+
+
+def normalize_device_path(device_path: str) -> str:
+    ''' Return the device path without telnet:// prefix, as entered in service calls '''
+    device_path = device_path.strip()
+    if device_path.startswith(TELNET_PREFIX):
+        return device_path[len(TELNET_PREFIX):]
+
+    return device_path
+
+
+async def async_open_cul(
+    loop: asyncio.AbstractEventLoop,
+    device_path: str,
+    protocol_factory: Callable[[], CulProtocol]
+) -> CulProtocol:
+    ''' Open a serial or telnet:// CUL device and return its connected protocol '''
+
+    if device_path.startswith(TELNET_PREFIX):
+        host, _, port = device_path[len(TELNET_PREFIX):].rpartition(':')
+        _, protocol = await loop.create_connection(protocol_factory, host, int(port))
+    else:
+        # opening a serial port can block, e.g. on unresponsive USB devices
+        opening = loop.run_in_executor(
+            None,
+            partial(serial.serial_for_url, device_path, baudrate=DEFAULT_BAUDRATE)
+        )
+        try:
+            serial_instance = await asyncio.shield(opening)
+        except asyncio.CancelledError:
+            # do not leak the port if it is opened after the caller gave up
+            opening.add_done_callback(_close_opened_port)
+            raise
+
+        _, protocol = await serial_asyncio.connection_for_serial(
+            loop,
+            protocol_factory,
+            serial_instance
+        )
+
+    return protocol
+
+
+def _close_opened_port(opening: asyncio.Future):
+    if not opening.cancelled() and opening.exception() is None:
+        opening.result().close()
+
+
+def is_version_banner(line: str) -> bool:
+    ''' Return whether the line is the reply of a CUL device to a version request '''
+    return VERSION_BANNER.match(line) is not None
+
+
+async def async_probe_cul(
+    loop: asyncio.AbstractEventLoop,
+    device_path: str,
+    timeout: float = PROBE_TIMEOUT
+) -> str or None:
+    '''
+    Return the version banner of the CUL device at the given path or None if there is none
+
+    Some CUL devices reset when the port is opened and ignore commands until they booted, so the
+    version is requested repeatedly until a banner arrives or the timeout expires. The port is
+    always closed again.
+    '''
+
+    banner = loop.create_future()
+
+    def line_received(line: str):
+        if not banner.done() and is_version_banner(line):
+            banner.set_result(line)
+
+    protocol = None
+    try:
+        # asyncio.timeout requires Python 3.11, Home Assistant 2023.7 still supports 3.10
+        async with async_timeout.timeout(timeout):
+            protocol = await async_open_cul(loop, device_path, lambda: CulProtocol(line_received))
+
+            while not banner.done():
+                if protocol.is_connected:
+                    protocol.write_line(COMMAND_VERSION)
+                await asyncio.wait([banner], timeout=PROBE_INTERVAL)
+
+            return banner.result()
+
+    # malformed paths, e.g. a telnet:// path without port, raise ValueError
+    except (OSError, ValueError, serial.SerialException, asyncio.TimeoutError) as exc:
+        LOGGER.debug(f"No CUL device found at {device_path}: {exc!r}")
+        return None
+
+    finally:
+        if protocol is not None:
+            protocol.close()
+
+
+async def async_probe_culs(
+    loop: asyncio.AbstractEventLoop,
+    device_paths: Iterable[str],
+    timeout: float = PROBE_TIMEOUT
+) -> dict[str, str or None]:
+    ''' Probe the given device paths concurrently and return their version banners '''
+
+    device_paths = list(device_paths)
+    banners = await asyncio.gather(*(
+        async_probe_cul(loop, device_path, timeout)
+        for device_path in device_paths
+    ))
+
+    return dict(zip(device_paths, banners))
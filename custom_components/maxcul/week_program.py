@@ -0,0 +1,136 @@
+'''
+Weekly programs of MAX! thermostats and their encoding
+
+The program of a day is a list of up to 13 switch points, each holding a temperature until
+a time of the day in minutes. The last switch point lasts until the end of the day.
+'''
+
+import voluptuous
+
+from maxcul._messages import ConfigWeekProfileMessage
+
+ATTR_WEEK_PROGRAM = 'week_program'
+ATTR_TEMPERATURE = 'temperature'
+ATTR_UNTIL = 'until'
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# the MAX! protocol numbers the days of the week starting with saturday
+DAY_IDS = {
+    'saturday': 0,
+    'sunday': 1,
+    'monday': 2,
+    'tuesday': 3,
+    'wednesday': 4,
+    'thursday': 5,
+    'friday': 6
+}
+
+WEEK_PROFILE_MESSAGE_ID = 0x10
+
+MAX_SWITCH_POINTS = 13
+
+# a message carries at most 7 switch points, the rest of the day follows in a second one
+SWITCH_POINTS_PER_MESSAGE = 7
+MAX_MESSAGES_PER_DAY = -(-MAX_SWITCH_POINTS // SWITCH_POINTS_PER_MESSAGE)
+
+MINUTES_PER_DAY = 24 * 60
+UNTIL_RESOLUTION = 5
+
+MIN_TEMPERATURE = 4.5
+MAX_TEMPERATURE = 30.5
+
+
+def parse_until(value) -> int:
+    ''' Validate a time of the day given as HH:MM and return it in minutes '''
+    try:
+        hours, minutes = (int(part) for part in str(value).split(':'))
+    except ValueError as err:
+        raise voluptuous.Invalid(f"Invalid time {value}, expected HH:MM") from err
+
+    until = hours * 60 + minutes
+    if not 0 < until <= MINUTES_PER_DAY or minutes >= 60 or until % UNTIL_RESOLUTION:
+        raise voluptuous.Invalid(
+            f"Invalid time {value}, expected HH:MM up to 24:00 in steps of {UNTIL_RESOLUTION} minutes"
+        )
+
+    return until
+
+
+def validate_day_program(switch_points: list[dict]) -> list[list]:
+    ''' Validate the switch points of a day and return them as [temperature, until] pairs '''
+    program = [
+        [round(switch_point[ATTR_TEMPERATURE] * 2) / 2, switch_point[ATTR_UNTIL]]
+        for switch_point in switch_points
+    ]
+
+    untils = [until for (_, until) in program]
+    if untils != sorted(set(untils)):
+        raise voluptuous.Invalid('The switch points of a day must be in chronological order')
+
+    if untils[-1] != MINUTES_PER_DAY:
+        raise voluptuous.Invalid('The last switch point of a day must last until 24:00')
+
+    return program
+
+
+DAY_PROGRAM_SCHEMA = voluptuous.All(
+    [
+        voluptuous.Schema({
+            voluptuous.Required(ATTR_TEMPERATURE): voluptuous.All(
+                voluptuous.Coerce(float),
+                voluptuous.Range(min=MIN_TEMPERATURE, max=MAX_TEMPERATURE)
+            ),
+            voluptuous.Required(ATTR_UNTIL): parse_until
+        })
+    ],
+    voluptuous.Length(min=1, max=MAX_SWITCH_POINTS),
+    validate_day_program
+)
+
+WEEK_PROGRAM_SCHEMA = voluptuous.Schema({
+    voluptuous.In(WEEKDAYS): DAY_PROGRAM_SCHEMA
+})
+
+
+def encode_day_program(day: str, program: list[list]) -> list[str]:
+    ''' Return the payloads of the week profile messages setting the program of a day '''
+    payloads = []
+    for part, start in enumerate(range(0, len(program), SWITCH_POINTS_PER_MESSAGE)):
+        payload = f"{part << 4 | DAY_IDS[day]:02X}"
+        for (temperature, until) in program[start:start + SWITCH_POINTS_PER_MESSAGE]:
+            payload += f"{int(temperature * 2) << 9 | until // UNTIL_RESOLUTION:04X}"
+        payloads.append(payload)
+
+    return payloads
+
+
+class WeekProfileMessage(ConfigWeekProfileMessage):
+    ''' Sets a part of the program of a day, pymaxcul does not encode week profiles '''
+
+    payload = None
+
+    @staticmethod
+    def decode_payload(payload):
+        day = next(name for name, day_id in DAY_IDS.items() if day_id == int(payload[:2], 16) & 0x0F)
+        program = []
+        for index in range(2, len(payload), 4):
+            switch_point = int(payload[index:index + 4], 16)
+            program.append([(switch_point >> 9) / 2, (switch_point & 0x1FF) * UNTIL_RESOLUTION])
+
+        return {
+            'day': day,
+            'part': int(payload[:2], 16) >> 4,
+            'program': program,
+            'payload': payload
+        }
+
+    def encode_payload(self):
+        return self.payload
+
+    def encode_message(self):
+        message = (
+            f"{self.counter:02X}{self.flag:02X}{WEEK_PROFILE_MESSAGE_ID:02X}"
+            f"{self.sender_id:06X}{self.receiver_id:06X}{self.group_id:02X}{self.payload}"
+        )
+        return f"Zs{len(message) // 2:02X}{message}"
@@ -0,0 +1,19 @@
+'''
+Load benchmarks are not part of the test run, they only run when asked for with --benchmark-only
+'''
+
+from pathlib import Path
+
+import pytest
+
+BENCHMARKS_PATH = Path(__file__).parent
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]):
+    if config.getoption('benchmark_only', default=False):
+        return
+
+    skip = pytest.mark.skip(reason='load benchmarks only run with --benchmark-only')
+    for item in items:
+        if BENCHMARKS_PATH in item.path.parents:
+            item.add_marker(skip)
@@ -0,0 +1,282 @@
+'''
+Load benchmarks of the receive path and the platform setup for growing device counts
+
+Run them with `pytest tests/benchmarks --benchmark-only --benchmark-json=benchmark.json`
+and compare the JSON of two commits with `pytest-benchmark compare`. Throughput, latency
+percentiles, event loop lag and memory per entity are stored in the `extra_info` of each
+benchmark.
+'''
+
+import asyncio
+from functools import partial
+from itertools import cycle
+import time
+import tracemalloc
+
+import pytest
+
+from homeassistant.const import (
+    ATTR_STATE,
+    CONF_DEVICES,
+    CONF_NAME,
+    CONF_TYPE
+)
+
+from homeassistant.core import HomeAssistant
+
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from maxcul import (
+    EVENT_SHUTTER_UPDATE,
+    EVENT_THERMOSTAT_UPDATE
+)
+
+from maxcul._const import (
+    ATTR_BATTERY_LOW,
+    ATTR_DESIRED_TEMPERATURE,
+    ATTR_DEVICE_ID,
+    ATTR_MEASURED_TEMPERATURE,
+    ATTR_MODE,
+    ATTR_VALVE_POSITION,
+    HEATING_THERMOSTAT,
+    MODE_MANUAL,
+    SHUTTER_CLOSED,
+    SHUTTER_CONTACT,
+    SHUTTER_OPEN
+)
+
+from custom_components.maxcul import (
+    CONF_DEVICE_PATH,
+    DOMAIN,
+    MaxCulConnection,
+    async_setup_entry
+)
+
+from custom_components.maxcul.capture import (
+    DIRECTION_RECEIVED,
+    CaptureWriter,
+    async_replay
+)
+
+from custom_components.maxcul.instrumentation import LatencyHistogram
+
+from ..conftest import MockConnectionFactory
+
+pytest.importorskip('pytest_benchmark')
+
+DEVICE_COUNTS = (10, 100, 1000)
+
+# frames replayed per benchmark round
+FRAMES_PER_ROUND = 1000
+
+# frames replayed between yielding to the event loop while measuring its lag
+FRAMES_PER_BATCH = 50
+LAG_PROBE_INTERVAL = 0.01
+
+SETUP_ROUNDS = 3
+
+REPLAY_ROUNDS = 5
+
+
+def _config(device_count: int, index: int = 0) -> dict:
+    ''' Return the config of a CUL with every fourth device being a shutter contact '''
+    offset = 0x100000 * (index + 1)
+    return {
+        CONF_DEVICE_PATH: f"/dev/ttyBENCH{index}",
+        CONF_DEVICES: {
+            str(offset + number): {
+                CONF_NAME: f"Device {index} {number}",
+                CONF_TYPE: SHUTTER_CONTACT if number % 4 == 3 else HEATING_THERMOSTAT
+            }
+            for number in range(device_count)
+        }
+    }
+
+
+def _traffic(config: dict) -> list[tuple]:
+    ''' Return two reports of each device, changing the state of each entity between them '''
+    traffic = []
+    for report in range(2):
+        for device_id, device in config[CONF_DEVICES].items():
+            if device[CONF_TYPE] == SHUTTER_CONTACT:
+                traffic.append((EVENT_SHUTTER_UPDATE, {
+                    ATTR_DEVICE_ID: int(device_id),
+                    ATTR_STATE: SHUTTER_OPEN if report else SHUTTER_CLOSED,
+                    ATTR_BATTERY_LOW: False
+                }))
+            else:
+                traffic.append((EVENT_THERMOSTAT_UPDATE, {
+                    ATTR_DEVICE_ID: int(device_id),
+                    ATTR_MEASURED_TEMPERATURE: 20.0 + report,
+                    ATTR_DESIRED_TEMPERATURE: 21.0,
+                    ATTR_VALVE_POSITION: 10 * report,
+                    ATTR_MODE: MODE_MANUAL,
+                    ATTR_BATTERY_LOW: False
+                }))
+    return traffic
+
+
+async def _async_setup(hass: HomeAssistant, config: dict, index: int = 0) -> MockConfigEntry:
+    config_entry = MockConfigEntry(domain=DOMAIN, data=config, entry_id=f"bench{index}")
+    config_entry.add_to_hass(hass)
+
+    assert await async_setup_entry(hass, config_entry)
+    await hass.async_block_till_done()
+
+    return config_entry
+
+
+@pytest.mark.parametrize('device_count', DEVICE_COUNTS)
+async def test_frame_throughput(
+    hass: HomeAssistant,
+    max_connection_factory: MockConnectionFactory,
+    benchmark,
+    device_count: int
+):
+    ''' Replay state reports of all devices through the connection callback '''
+
+    config = _config(device_count)
+    await _async_setup(hass, config)
+    connection = max_connection_factory.connections[config[CONF_DEVICE_PATH]]
+
+    frames = cycle(_traffic(config))
+
+    def replay():
+        for _ in range(FRAMES_PER_ROUND):
+            connection.call_callback(*next(frames))
+
+    # dispatching to the entities is synchronous, so a round runs without yielding
+    benchmark(replay)
+
+    latency = LatencyHistogram()
+    for _ in range(FRAMES_PER_ROUND):
+        started = time.perf_counter()
+        connection.call_callback(*next(frames))
+        latency.add((time.perf_counter() - started) * 1000)
+
+    benchmark.extra_info['device_count'] = device_count
+    benchmark.extra_info['frames_per_second'] = round(FRAMES_PER_ROUND / benchmark.stats.stats.mean)
+    benchmark.extra_info['frame_latency'] = latency.as_dict()
+    benchmark.extra_info['event_loop_lag'] = await _event_loop_lag(connection, frames)
+
+
+async def _event_loop_lag(connection, frames) -> dict:
+    ''' Replay frames in batches while measuring how late a periodic timer fires '''
+    lag = LatencyHistogram()
+    done = asyncio.Event()
+
+    async def probe():
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            expected = loop.time() + LAG_PROBE_INTERVAL
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            lag.add(max(0.0, loop.time() - expected) * 1000)
+
+    task = asyncio.create_task(probe())
+    for _ in range(FRAMES_PER_ROUND // FRAMES_PER_BATCH * 10):
+        for _ in range(FRAMES_PER_BATCH):
+            connection.call_callback(*next(frames))
+        await asyncio.sleep(0)
+    done.set()
+    await task
+
+    return lag.as_dict()
+
+
+@pytest.mark.parametrize('device_count', DEVICE_COUNTS)
+async def test_platform_setup(
+    hass: HomeAssistant,
+    max_connection_factory: MockConnectionFactory,
+    benchmark,
+    device_count: int
+):
+    ''' Set up the climate and binary sensor platforms of a CUL with all its devices '''
+
+    rounds = iter(range(1, SETUP_ROUNDS + 1))
+
+    def setup():
+        index = next(rounds)
+        future = asyncio.run_coroutine_threadsafe(
+            _async_setup(hass, _config(device_count, index), index),
+            hass.loop
+        )
+        future.result()
+
+    # the setup runs on the event loop, which has to be free while the benchmark waits, and
+    # the benchmark must not be a tracked job as the setup blocks until those are done
+    await hass.loop.run_in_executor(
+        None,
+        partial(benchmark.pedantic, setup, rounds=SETUP_ROUNDS, iterations=1)
+    )
+
+    entity_count = len(hass.states.async_all())
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    await _async_setup(hass, _config(device_count, 0))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    entities_per_setup = entity_count // SETUP_ROUNDS
+
+    benchmark.extra_info['device_count'] = device_count
+    benchmark.extra_info['entity_count'] = entities_per_setup
+    benchmark.extra_info['memory_per_entity_bytes'] = round(allocated / entities_per_setup)
+
+
+def _capture_frames(config: dict) -> list[str]:
+    ''' Return raw thermostat state frames as received from the CUL, two of each device '''
+    frames = []
+    for report in range(2):
+        for counter, (device_id, device) in enumerate(config[CONF_DEVICES].items()):
+            if device[CONF_TYPE] != HEATING_THERMOSTAT:
+                continue
+            payload = f"19{10 * report:02X}2A{200 + report:04X}"
+            frames.append(f"Z0F{counter % 0x100:02X}0260{int(device_id):06X}00000000{payload}3C")
+    return frames
+
+
+@pytest.mark.parametrize('device_count', DEVICE_COUNTS)
+async def test_capture_replay(
+    hass: HomeAssistant,
+    max_connection_factory: MockConnectionFactory,
+    benchmark,
+    device_count: int,
+    tmp_path
+):
+    ''' Replay a capture of raw frames as fast as possible, decoding included '''
+
+    config = _config(device_count)
+    await _async_setup(hass, config)
+    connection = max_connection_factory.connections[config[CONF_DEVICE_PATH]]
+    for device_id in config[CONF_DEVICES]:
+        # the mocked connection does not track paired devices
+        MaxCulConnection.add_paired_device(connection, int(device_id))
+
+    path = str(tmp_path / 'capture.bin')
+    capture = CaptureWriter(hass, path)
+    frames = _capture_frames(config)
+    for index, frame in enumerate(frames):
+        capture.record(DIRECTION_RECEIVED, frame, index * 0.01)
+    await capture.async_close()
+
+    def replay():
+        asyncio.run_coroutine_threadsafe(
+            async_replay(hass, connection, path, speed=None),
+            hass.loop
+        ).result()
+
+    def forget_frames():
+        # every round replays the same frames, which are otherwise dropped as duplicates
+        connection.pool._frame_cache.clear()
+
+    await hass.loop.run_in_executor(
+        None,
+        partial(benchmark.pedantic, replay, setup=forget_frames, rounds=REPLAY_ROUNDS)
+    )
+
+    assert hass.states.get('climate.device_0_0').attributes['current_temperature'] == 20.1
+
+    benchmark.extra_info['device_count'] = device_count
+    benchmark.extra_info['frames_per_second'] = round(len(frames) / benchmark.stats.stats.mean)
@@ -1,10 +1,18 @@
 import pytest
 from typing import Dict
+from unittest.mock import MagicMock
 
 import custom_components.maxcul
 from custom_components.maxcul import (
     MaxCulConnection
 )
+from custom_components.maxcul.transport import CulProtocol
+
+# thermostat 0A1B2C broadcasting manual mode, valve 0 %, 21.5 °C desired, 23.0 °C measured
+THERMOSTAT_STATE_FRAME = 'Z0F0102600A1B2C0000000019002B00E6' + '3C'
+
+# wall thermostat 0B1C2D broadcasting its state with a low battery
+WALL_THERMOSTAT_STATE_FRAME = 'Z0F0100700B1C2D0000000002002A00D2' + '3C'
 
 @pytest.fixture(autouse=True)
 def auto_enable_custom_integrations(enable_custom_integrations):
@@ -17,19 +25,32 @@ def max_connection_factory(monkeypatch: pytest.MonkeyPatch):
     monkeypatch.setattr(custom_components.maxcul, 'MaxCulConnection', mock_connection_create_function)
     return factory
 
+def connect_protocol(connection: MaxCulConnection) -> list:
+    ''' Attach a protocol to the connection which writes to the returned list '''
+    written = []
+    protocol = CulProtocol(connection.feed_line)
+    protocol.connection_made(MagicMock(is_closing=MagicMock(return_value=False)))
+    protocol.write_line = written.append
+    connection._protocol = protocol
+    return written
+
+def ack_frame(counter: int, sender_id: int) -> str:
+    ''' Return a received ACK frame of the device for the message with the counter '''
+    return f"Z0E{counter:02X}0202{sender_id:06X}123456000119002B" + '3C'
+
 class MockConnectionFactory():
 
     def __init__(self):
         self.connections: Dict[str, MockConnection] = {}
 
     def get_create_function(self):
-        def create_function(hass, device_path, sender_id):
-            return self.create(hass, device_path, sender_id)
+        def create_function(hass, device_path, sender_id, **kwargs):
+            return self.create(hass, device_path, sender_id, **kwargs)
 
         return create_function
 
-    def create(self, hass, device_path, sender_id):
-        connection = MockConnection(hass, device_path, sender_id)
+    def create(self, hass, device_path, sender_id, **kwargs):
+        connection = MockConnection(hass, device_path, sender_id, **kwargs)
         self.connections[device_path] = connection
         return connection
 
@@ -39,9 +60,10 @@ class MockConnection(MaxCulConnection):
         self,
         hass,
         device_path,
-        sender_id
+        sender_id,
+        **kwargs
     ):
-        super().__init__(hass, device_path, sender_id)
+        super().__init__(hass, device_path, sender_id, **kwargs)
 
     def start(self):
         pass
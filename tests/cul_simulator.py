@@ -0,0 +1,362 @@
+'''
+Simulator of a CUL device and the MAX! devices in its range
+
+The simulator speaks the line protocol of a CUL running culfw over a pseudo terminal and
+over TCP (for telnet:// device paths). It answers version and budget requests, accounts
+transmit credits like the 1% rule of the firmware, acknowledges commands addressed to its
+simulated devices and lets them report their state periodically. Packet loss is drawn from
+a seeded random generator, so runs with the same seed and timing are reproducible.
+'''
+
+import asyncio
+import os
+import random
+import tty
+
+from maxcul._const import (
+    HEATING_THERMOSTAT,
+    MODE_AUTO,
+    MODE_BOOST,
+    MODE_MANUAL,
+    MODE_TEMPORARY,
+    SHUTTER_CONTACT
+)
+
+from maxcul._messages import (
+    MoritzMessage,
+    RemoveGroupIdMessage,
+    SetGroupIdMessage,
+    SetTemperatureMessage
+)
+
+DEFAULT_VERSION = 'V 1.67 SimCUL868'
+
+MODE_IDS = {
+    MODE_AUTO: 0,
+    MODE_MANUAL: 1,
+    MODE_TEMPORARY: 2,
+    MODE_BOOST: 3
+}
+
+# transmit credits of culfw in ms, 1% of the elapsed time is regained
+MAX_CREDITS = 9000
+CREDIT_REGAIN_RATE = 0.01
+PREAMBLE_AIRTIME = 1000
+BYTE_AIRTIME = 0.8
+
+
+def dbm_to_rssi(dbm: float) -> int:
+    ''' Convert a signal strength in dBm to the raw byte appended to frames by the CUL '''
+    raw = int((dbm + 74) * 2)
+    return raw + 256 if raw < 0 else raw
+
+
+class SimulatedThermostat:
+    ''' A MAX! radiator thermostat '''
+
+    device_type = HEATING_THERMOSTAT
+    message_type = 0x60
+
+    def __init__(
+        self,
+        rf_address: int,
+        desired_temperature: float = 21.0,
+        measured_temperature: float = 20.0,
+        valve_position: int = 0,
+        mode: str = MODE_MANUAL,
+        battery_low: bool = False,
+        group_id: int = 0
+    ):
+        self.rf_address = rf_address
+        self.desired_temperature = desired_temperature
+        self.measured_temperature = measured_temperature
+        self.valve_position = valve_position
+        self.mode = mode
+        self.battery_low = battery_low
+        self.group_id = group_id
+
+    def status(self) -> str:
+        ''' Return the status bytes shared by state reports and ACKs '''
+        status = MODE_IDS[self.mode] | (0x80 if self.battery_low else 0)
+        return f"{status:02X}{self.valve_position:02X}{int(self.desired_temperature * 2):02X}"
+
+    def payload(self) -> str:
+        ''' Return the payload of a state report '''
+        return self.status() + f"{int(self.measured_temperature * 10):04X}"
+
+    def apply(self, msg: MoritzMessage) -> bool:
+        ''' Apply a received command and return whether it is acknowledged '''
+        if isinstance(msg, SetTemperatureMessage):
+            self.desired_temperature = msg.desired_temperature
+            self.mode = msg.mode
+            return True
+
+        if isinstance(msg, SetGroupIdMessage):
+            self.group_id = msg.new_group_id
+            return True
+
+        if isinstance(msg, RemoveGroupIdMessage):
+            self.group_id = 0
+            return True
+
+        return False
+
+
+class SimulatedShutterContact:
+    ''' A MAX! window shutter contact '''
+
+    device_type = SHUTTER_CONTACT
+    message_type = 0x30
+
+    def __init__(self, rf_address: int, is_open: bool = False, battery_low: bool = False):
+        self.rf_address = rf_address
+        self.is_open = is_open
+        self.battery_low = battery_low
+        self.group_id = 0
+
+    def status(self) -> str:
+        ''' Return the status byte of the contact '''
+        return f"{(0x80 if self.battery_low else 0) | (0x02 if self.is_open else 0):02X}"
+
+    def payload(self) -> str:
+        ''' Return the payload of a state report '''
+        return self.status()
+
+    def apply(self, msg: MoritzMessage) -> bool:
+        ''' Shutter contacts do not accept commands '''
+        return False
+
+
+class CulSimulator:
+    '''
+    Simulated CUL device with MAX! devices in its range
+
+    Commands written by the host are collected in `commands`, messages which were sent
+    over the air in `transmitted`.
+    '''
+
+    def __init__(
+        self,
+        devices: list,
+        receiver_id: int = 0x123456,
+        report_interval: float or None = None,
+        packet_loss: float = 0.0,
+        credits: float = MAX_CREDITS,
+        signal_strength: float = -60.0,
+        ack_delay: float = 0.05,
+        seed: int = 0,
+        version: str = DEFAULT_VERSION
+    ):
+        self.devices = {device.rf_address: device for device in devices}
+        self.receiver_id = receiver_id
+        self.report_interval = report_interval
+        self.packet_loss = packet_loss
+        self.signal_strength = signal_strength
+        self.ack_delay = ack_delay
+        self.version = version
+
+        self.commands: list[str] = []
+        self.transmitted: list[MoritzMessage] = []
+        self.refused = 0
+
+        self._random = random.Random(seed)
+        self._counters = {rf_address: 0 for rf_address in self.devices}
+        self._credits = credits
+        self._credits_timestamp: float or None = None
+
+        self._writers = []
+        self._clients: set[asyncio.Task] = set()
+        self._server: asyncio.Server or None = None
+        self._pty: tuple or None = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        ''' Return the running event loop '''
+        return asyncio.get_running_loop()
+
+    async def start_tcp(self, host: str = '127.0.0.1') -> str:
+        ''' Listen on a local TCP port and return its telnet:// device path '''
+        self._server = await asyncio.start_server(self._handle_client, host, 0)
+        self._start_reports()
+        return f"telnet://{host}:{self._server.sockets[0].getsockname()[1]}"
+
+    async def start_pty(self) -> str:
+        ''' Open a pseudo terminal and return the device path of its serial end '''
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        os.set_blocking(master, False)
+
+        buffer = bytearray()
+
+        def readable():
+            try:
+                data = os.read(master, 1024)
+            except OSError:
+                return
+            buffer.extend(data)
+            for line in _split_lines(buffer):
+                self._command_received(line)
+
+        def write(line: str):
+            os.write(master, (line + '\r\n').encode())
+
+        self.loop.add_reader(master, readable)
+        self._writers.append(write)
+        self._pty = (master, slave)
+        self._start_reports()
+
+        return os.ttyname(slave)
+
+    async def stop(self):
+        ''' Close all connections and stop reporting '''
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+        for client in self._clients:
+            client.cancel()
+        if self._clients:
+            await asyncio.wait(self._clients)
+        self._clients.clear()
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        if self._pty is not None:
+            self.loop.remove_reader(self._pty[0])
+            for fd in self._pty:
+                os.close(fd)
+            self._pty = None
+
+        self._writers.clear()
+
+    def report(self, rf_address: int):
+        ''' Let a device send a report of its state to the host '''
+        device = self.devices[rf_address]
+        self._receive(device, device.message_type, self.receiver_id, device.payload())
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        def write(line: str):
+            if not writer.is_closing():
+                writer.write((line + '\r\n').encode())
+
+        self._writers.append(write)
+        self._clients.add(asyncio.current_task())
+        try:
+            while line := await reader.readline():
+                line = line.decode().strip()
+                if line:
+                    self._command_received(line)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._writers.remove(write)
+            self._clients.discard(asyncio.current_task())
+            writer.close()
+
+    def _start_reports(self):
+        if not self.report_interval or self._tasks:
+            return
+
+        for index, rf_address in enumerate(self.devices):
+            # spread the reports of the devices over the interval
+            offset = self.report_interval * index / len(self.devices)
+            self._tasks.append(self.loop.create_task(self._report_periodically(rf_address, offset)))
+
+    async def _report_periodically(self, rf_address: int, offset: float):
+        await asyncio.sleep(offset)
+        while True:
+            self.report(rf_address)
+            await asyncio.sleep(self.report_interval)
+
+    def _write(self, line: str):
+        for write in list(self._writers):
+            write(line)
+
+    def _lost(self) -> bool:
+        return self.packet_loss > 0 and self._random.random() < self.packet_loss
+
+    def _current_credits(self) -> float:
+        now = self.loop.time()
+        if self._credits_timestamp is not None:
+            elapsed = (now - self._credits_timestamp) * 1000
+            self._credits = min(MAX_CREDITS, self._credits + elapsed * CREDIT_REGAIN_RATE)
+        self._credits_timestamp = now
+        return self._credits
+
+    def _command_received(self, line: str):
+        self.commands.append(line)
+
+        if line == 'V':
+            self._write(self.version)
+
+        elif line == 'X':
+            self._write(f"21  {int(self._current_credits() / 10):3d}")
+
+        elif line.startswith('Zs'):
+            self._transmit(line)
+
+    def _transmit(self, command: str):
+        airtime = PREAMBLE_AIRTIME + (len(command) - 2) / 2 * BYTE_AIRTIME
+        if self._current_credits() < airtime:
+            self.refused += 1
+            self._write('LOVF')
+            return
+
+        self._credits -= airtime
+
+        try:
+            msg = MoritzMessage.decode_message('Z' + command[2:])
+        except Exception:  # pylint: disable=broad-except
+            # messages pymaxcul cannot decode are sent but not understood by the devices
+            return
+        self.transmitted.append(msg)
+
+        if self._lost():
+            return
+
+        if msg.receiver_id == 0 and msg.group_id:
+            receivers = [d for d in self.devices.values() if d.group_id == msg.group_id]
+        else:
+            receivers = [self.devices[msg.receiver_id]] if msg.receiver_id in self.devices else []
+
+        for device in receivers:
+            if device.apply(msg) and msg.receiver_id != 0:
+                self.loop.call_later(self.ack_delay, self._acknowledge, device, msg)
+
+    def _acknowledge(self, device, msg: MoritzMessage):
+        self._receive(device, 0x02, msg.sender_id, '01' + device.status(), counter=msg.counter)
+
+    def _receive(
+        self,
+        device,
+        message_type: int,
+        receiver_id: int,
+        payload: str,
+        counter: int or None = None
+    ):
+        if counter is None:
+            counter = self._counters[device.rf_address] = (self._counters[device.rf_address] + 1) % 0x100
+
+        if self._lost():
+            return
+
+        body = (
+            f"{counter:02X}02{message_type:02X}"
+            f"{device.rf_address:06X}{receiver_id:06X}{device.group_id:02X}{payload}"
+        )
+        rssi = dbm_to_rssi(self.signal_strength)
+        self._write(f"Z{len(body) // 2:02X}{body}{rssi:02X}")
+
+
+def _split_lines(buffer: bytearray) -> list[str]:
+    lines = []
+    while (index := buffer.find(b'\n')) >= 0:
+        line = buffer[:index].strip().decode()
+        del buffer[:index + 1]
+        if line:
+            lines.append(line)
+    return lines
@@ -9,12 +9,15 @@ from homeassistant.const import (
 )
 
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.dispatcher import async_dispatcher_send
 
 from pytest_homeassistant_custom_component.common import (
   MockConfigEntry
 )
 
+from maxcul import (
+    EVENT_SHUTTER_UPDATE
+)
+
 from maxcul._const import (
     ATTR_DEVICE_ID,
     ATTR_BATTERY_LOW,
@@ -26,12 +29,13 @@ from maxcul._const import (
 from custom_components.maxcul import (
     CONF_DEVICE_PATH,
     DOMAIN,
-    SIGNAL_SHUTTER_UPDATE,
     async_setup_entry
 )
 
+from .conftest import MockConnectionFactory
 
-async def test_update(hass: HomeAssistant):
+
+async def test_update(hass: HomeAssistant, max_connection_factory: MockConnectionFactory):
     ''' Test state update of shutter contacts '''
 
     config = {
@@ -50,9 +54,10 @@ async def test_update(hass: HomeAssistant):
 
     assert hass.states.get('binary_sensor.shuttercontact1').state == 'off'
 
-    async_dispatcher_send(
-        hass,
-        SIGNAL_SHUTTER_UPDATE,
+    connection = max_connection_factory.connections[config[CONF_DEVICE_PATH]]
+
+    connection.call_callback(
+        EVENT_SHUTTER_UPDATE,
         {
             ATTR_DEVICE_ID: 12345,
             ATTR_BATTERY_LOW: False,
@@ -0,0 +1,198 @@
+'''
+Test module for the capture of raw CUL lines and their replay
+'''
+
+import pytest
+
+from homeassistant.const import (
+    CONF_DEVICES,
+    CONF_NAME,
+    CONF_TYPE,
+    EVENT_HOMEASSISTANT_STOP
+)
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from maxcul._const import ATTR_MEASURED_TEMPERATURE, HEATING_THERMOSTAT
+
+from custom_components.maxcul import (
+    CONF_CAPTURE,
+    CONF_DEVICE_PATH,
+    DOMAIN,
+    SIGNAL_THERMOSTAT_UPDATE,
+    MaxCulConnection,
+    async_setup_entry
+)
+
+from custom_components.maxcul.capture import (
+    DIRECTION_RECEIVED,
+    DIRECTION_SENT,
+    CaptureWriter,
+    async_replay,
+    capture_files,
+    read_capture
+)
+
+from .conftest import THERMOSTAT_STATE_FRAME, MockConnectionFactory, connect_protocol
+
+
+async def test_lines_are_captured(hass: HomeAssistant, tmp_path):
+    ''' Test that received and written lines are appended to the capture '''
+
+    path = str(tmp_path / 'capture.bin')
+    connection = MaxCulConnection(hass, '/dev/tty0', capture=CaptureWriter(hass, path))
+    connect_protocol(connection)
+
+    connection.feed_line('V 1.67 nanoCUL868')
+    connection._write_line('X')
+    connection.feed_line('21  900')
+
+    # nothing is written from the event loop
+    assert not capture_files(path)
+
+    await connection.capture.async_close()
+
+    records = list(read_capture(path))
+    assert [(record.direction, record.line) for record in records] == [
+        (DIRECTION_RECEIVED, 'V 1.67 nanoCUL868'),
+        (DIRECTION_SENT, 'X'),
+        (DIRECTION_RECEIVED, '21  900')
+    ]
+    assert records[0].timestamp <= records[2].timestamp
+
+    connection.stop()
+
+
+async def test_capture_is_rotated(hass: HomeAssistant, tmp_path):
+    ''' Test that the capture is capped in size and keeps the configured backups '''
+
+    path = str(tmp_path / 'capture.bin')
+    capture = CaptureWriter(hass, path, max_bytes=100, backup_count=2)
+
+    for index in range(10):
+        capture.record(DIRECTION_RECEIVED, f"{THERMOSTAT_STATE_FRAME} {index}")
+        await capture.async_close()
+
+    assert capture_files(path) == [f"{path}.2", f"{path}.1", path]
+
+    # the oldest records were rotated out, the remaining ones are read in order
+    lines = [record.line for record in read_capture(path)]
+    assert lines == [f"{THERMOSTAT_STATE_FRAME} {index}" for index in range(7, 10)]
+
+
+async def test_capture_is_replayed(hass: HomeAssistant, tmp_path):
+    ''' Test that the received lines of a capture are fed through a connection '''
+
+    path = str(tmp_path / 'capture.bin')
+    capture = CaptureWriter(hass, path)
+    capture.record(DIRECTION_RECEIVED, THERMOSTAT_STATE_FRAME, 10.0)
+    capture.record(DIRECTION_SENT, 'X', 10.01)
+    capture.record(DIRECTION_RECEIVED, THERMOSTAT_STATE_FRAME, 10.05)
+    await capture.async_close()
+
+    connection = MaxCulConnection(hass, '/dev/tty0')
+    connection.add_paired_device(0x0A1B2C)
+
+    payloads = []
+    async_dispatcher_connect(
+        hass,
+        connection.device_signal(SIGNAL_THERMOSTAT_UPDATE, 0x0A1B2C),
+        payloads.append
+    )
+
+    assert await async_replay(hass, connection, path) == 2
+    assert await async_replay(hass, connection, path, speed=None) == 2
+
+    # retransmitted frames are only dispatched once
+    assert len(payloads) == 1
+    assert payloads[0][ATTR_MEASURED_TEMPERATURE] == 23.0
+
+    connection.stop()
+
+
+async def _setup_capturing_entry(hass: HomeAssistant, tmp_path) -> MockConfigEntry:
+    hass.config.config_dir = str(tmp_path)
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            CONF_DEVICE_PATH: '/dev/tty0',
+            CONF_DEVICES: {
+                '662316': {
+                    CONF_NAME: 'Thermostat1',
+                    CONF_TYPE: HEATING_THERMOSTAT
+                }
+            }
+        },
+        options={CONF_CAPTURE: True},
+        entry_id='test'
+    )
+    config_entry.add_to_hass(hass)
+
+    assert await async_setup_entry(hass, config_entry)
+    await hass.async_block_till_done()
+
+    return config_entry
+
+
+async def test_capture_is_written_on_stop(
+    hass: HomeAssistant,
+    tmp_path,
+    max_connection_factory: MockConnectionFactory
+):
+    ''' Test that records buffered while a write is in progress are written on shutdown '''
+    await _setup_capturing_entry(hass, tmp_path)
+
+    connection = max_connection_factory.connections['/dev/tty0']
+    connection.feed_line('V 1.67 nanoCUL868')
+    connection.capture.flush()
+    connection.feed_line('21  900')
+
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_STOP)
+    await hass.async_block_till_done()
+
+    assert [record.line for record in read_capture(connection.capture.path)] == [
+        'V 1.67 nanoCUL868',
+        '21  900'
+    ]
+
+
+async def test_replay_capture_service(
+    hass: HomeAssistant,
+    tmp_path,
+    max_connection_factory: MockConnectionFactory
+):
+    ''' Test that the service replays a capture of the configuration directory '''
+    await _setup_capturing_entry(hass, tmp_path)
+
+    capture = CaptureWriter(hass, str(tmp_path / 'replay.bin'))
+    capture.record(DIRECTION_RECEIVED, THERMOSTAT_STATE_FRAME, 10.0)
+    capture.record(DIRECTION_RECEIVED, THERMOSTAT_STATE_FRAME.replace('Z0F01', 'Z0F02', 1), 60.0)
+    await capture.async_close()
+
+    connection = max_connection_factory.connections['/dev/tty0']
+    MaxCulConnection.add_paired_device(connection, 0x0A1B2C)
+
+    payloads = []
+    async_dispatcher_connect(
+        hass,
+        connection.device_signal(SIGNAL_THERMOSTAT_UPDATE, 0x0A1B2C),
+        payloads.append
+    )
+
+    # the recorded timing of 50 s is skipped
+    await hass.services.async_call(DOMAIN, 'replay_capture', {'path': 'replay.bin', 'speed': 0}, blocking=True)
+    await hass.async_block_till_done()
+
+    assert len(payloads) == 2
+
+    with pytest.raises(HomeAssistantError):
+        await hass.services.async_call(DOMAIN, 'replay_capture', {'path': '/etc/hostname'}, blocking=True)
+
+    with pytest.raises(HomeAssistantError):
+        await hass.services.async_call(DOMAIN, 'replay_capture', {'path': 'missing.bin'}, blocking=True)
+
+    connection.stop()
@@ -2,6 +2,12 @@
 Test module for climate entities
 '''
 
+from datetime import timedelta
+from unittest.mock import ANY, patch
+
+import pytest
+import voluptuous as vol
+
 from homeassistant.const import (
     CONF_DEVICES,
     CONF_NAME,
@@ -9,14 +15,25 @@ from homeassistant.const import (
 )
 
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.dispatcher import async_dispatcher_send
+import homeassistant.util.dt as dt_util
 
 from homeassistant.components.climate import (
     HVAC_MODE_HEAT
 )
 
 from pytest_homeassistant_custom_component.common import (
-  MockConfigEntry
+  MockConfigEntry,
+  async_fire_time_changed
+)
+
+from maxcul import (
+    EVENT_THERMOSTAT_UPDATE
+)
+
+from maxcul._messages import (
+    MoritzMessage,
+    SetGroupIdMessage,
+    SetTemperatureMessage
 )
 
 from maxcul._const import (
@@ -27,18 +44,45 @@ from maxcul._const import (
     ATTR_VALVE_POSITION,
     ATTR_MODE,
     HEATING_THERMOSTAT,
-    MODE_MANUAL
+    MODE_MANUAL,
+    WALL_MOUNTED_THERMOSTAT
 )
 
 from custom_components.maxcul import (
     CONF_DEVICE_PATH,
+    CONF_GROUP_ID,
+    CONF_LINKED_DEVICES,
     DOMAIN,
-    SIGNAL_THERMOSTAT_UPDATE,
+    MaxCulConnection,
     async_setup_entry
 )
 
+from custom_components.maxcul.week_program import WeekProfileMessage
+
+from .conftest import MockConnectionFactory, ack_frame, connect_protocol
+
+GROUP_CONFIG = {
+    CONF_DEVICE_PATH: '/dev/tty0',
+    CONF_DEVICES: {
+        '662316': {
+            CONF_NAME: 'Thermostat1',
+            CONF_TYPE: HEATING_THERMOSTAT,
+            CONF_GROUP_ID: 3
+        },
+        '662317': {
+            CONF_NAME: 'Thermostat2',
+            CONF_TYPE: HEATING_THERMOSTAT,
+            CONF_GROUP_ID: 3
+        },
+        '662318': {
+            CONF_NAME: 'Thermostat3',
+            CONF_TYPE: HEATING_THERMOSTAT
+        }
+    }
+}
+
 
-async def test_update(hass: HomeAssistant):
+async def test_update(hass: HomeAssistant, max_connection_factory: MockConnectionFactory):
     ''' Test updating of thermostat state '''
     config = {
         CONF_DEVICE_PATH: '/dev/tty0',
@@ -56,9 +100,26 @@ async def test_update(hass: HomeAssistant):
 
     assert hass.states.get('climate.thermostat1').state == 'unknown'
 
-    async_dispatcher_send(
-        hass,
-        SIGNAL_THERMOSTAT_UPDATE,
+    connection = max_connection_factory.connections[config[CONF_DEVICE_PATH]]
+
+    connection.call_callback(
+        EVENT_THERMOSTAT_UPDATE,
+        {
+            ATTR_DEVICE_ID: 54321,
+            ATTR_MEASURED_TEMPERATURE: 19.0,
+            ATTR_DESIRED_TEMPERATURE: 17.0,
+            ATTR_VALVE_POSITION: 0,
+            ATTR_MODE: MODE_MANUAL,
+            ATTR_BATTERY_LOW: False
+        }
+    )
+
+    await hass.async_block_till_done()
+
+    assert hass.states.get('climate.thermostat1').state == 'unknown'
+
+    connection.call_callback(
+        EVENT_THERMOSTAT_UPDATE,
         {
             ATTR_DEVICE_ID: 12345,
             ATTR_MEASURED_TEMPERATURE: 23.0,
@@ -75,4 +136,349 @@ async def test_update(hass: HomeAssistant):
     assert state.state == HVAC_MODE_HEAT
     assert state.attributes.get('temperature') == 21.5
     assert state.attributes.get('current_temperature') == 23.0
+    # no command was sent to the thermostat yet
+    assert 'command_state' not in state.attributes
+
+
+async def test_state_is_restored(
+    hass: HomeAssistant,
+    hass_storage: dict,
+    max_connection_factory: MockConnectionFactory
+):
+    ''' Test that thermostats start with their persisted state and keep storing updates '''
+    config = {
+        CONF_DEVICE_PATH: '/dev/tty0',
+        CONF_DEVICES: {
+            '12345': {
+                CONF_NAME: 'Thermostat1',
+                CONF_TYPE: HEATING_THERMOSTAT
+            }
+        }
+    }
+    config_entry = MockConfigEntry(domain=DOMAIN, data=config, entry_id='test')
+
+    hass_storage[f"{DOMAIN}.test"] = {
+        'version': 1,
+        'key': f"{DOMAIN}.test",
+        'data': {
+            '12345': {
+                ATTR_MEASURED_TEMPERATURE: 20.0,
+                ATTR_DESIRED_TEMPERATURE: 19.5,
+                ATTR_VALVE_POSITION: 10,
+                ATTR_MODE: MODE_MANUAL
+            },
+            '54321': {
+                ATTR_MEASURED_TEMPERATURE: 18.0
+            }
+        }
+    }
+
+    assert await async_setup_entry(hass, config_entry)
+    await hass.async_block_till_done()
+
+    state = hass.states.get('climate.thermostat1')
+    assert state.state == HVAC_MODE_HEAT
+    assert state.attributes.get('temperature') == 19.5
+    assert state.attributes.get('current_temperature') == 20.0
+
+    connection = max_connection_factory.connections[config[CONF_DEVICE_PATH]]
+
+    connection.call_callback(
+        EVENT_THERMOSTAT_UPDATE,
+        {
+            ATTR_DEVICE_ID: 12345,
+            ATTR_MEASURED_TEMPERATURE: 21.0,
+            ATTR_DESIRED_TEMPERATURE: None,
+            ATTR_VALVE_POSITION: 0,
+            ATTR_MODE: MODE_MANUAL,
+            ATTR_BATTERY_LOW: False
+        }
+    )
+
+    await hass.async_block_till_done()
+
+    assert connection.last_state(12345) == {
+        ATTR_MEASURED_TEMPERATURE: 21.0,
+        ATTR_DESIRED_TEMPERATURE: 19.5,
+        ATTR_VALVE_POSITION: 0,
+        ATTR_MODE: MODE_MANUAL,
+        ATTR_BATTERY_LOW: False
+    }
+    assert connection.last_state(54321) == {}
+
+
+async def test_unchanged_state_is_not_written(
+    hass: HomeAssistant,
+    max_connection_factory: MockConnectionFactory
+):
+    ''' Test that periodic reports without changes do not write the state again '''
+    config = {
+        CONF_DEVICE_PATH: '/dev/tty0',
+        CONF_DEVICES: {
+            '12345': {
+                CONF_NAME: 'Thermostat1',
+                CONF_TYPE: HEATING_THERMOSTAT
+            }
+        }
+    }
+    config_entry = MockConfigEntry(domain=DOMAIN, data=config, entry_id='test')
+
+    assert await async_setup_entry(hass, config_entry)
+    await hass.async_block_till_done()
+
+    connection = max_connection_factory.connections[config[CONF_DEVICE_PATH]]
+    thermostat = hass.data['climate'].get_entity('climate.thermostat1')
+
+    payload = {
+        ATTR_DEVICE_ID: 12345,
+        ATTR_MEASURED_TEMPERATURE: 23.0,
+        ATTR_DESIRED_TEMPERATURE: 21.5,
+        ATTR_VALVE_POSITION: 0,
+        ATTR_MODE: MODE_MANUAL,
+        ATTR_BATTERY_LOW: False
+    }
+
+    with patch.object(thermostat, 'async_write_ha_state') as write_state:
+        connection.call_callback(EVENT_THERMOSTAT_UPDATE, dict(payload))
+        connection.call_callback(EVENT_THERMOSTAT_UPDATE, dict(payload))
+        connection.call_callback(
+            EVENT_THERMOSTAT_UPDATE,
+            {**payload, ATTR_MEASURED_TEMPERATURE: 22.5}
+        )
+        await hass.async_block_till_done()
+
+    assert write_state.call_count == 2
+
+
+async def test_wall_thermostat_links(hass: HomeAssistant, max_connection_factory: MockConnectionFactory):
+    ''' Test that linked thermostats follow their wall thermostat and are commanded through it '''
+    config = {
+        CONF_DEVICE_PATH: '/dev/tty0',
+        CONF_DEVICES: {
+            '728109': {
+                CONF_NAME: 'Wall1',
+                CONF_TYPE: WALL_MOUNTED_THERMOSTAT,
+                CONF_LINKED_DEVICES: [662316]
+            },
+            '662316': {
+                CONF_NAME: 'Thermostat1',
+                CONF_TYPE: HEATING_THERMOSTAT
+            },
+            '662317': {
+                CONF_NAME: 'Thermostat2',
+                CONF_TYPE: HEATING_THERMOSTAT
+            }
+        }
+    }
+    config_entry = MockConfigEntry(domain=DOMAIN, data=config, entry_id='test')
+    config_entry.add_to_hass(hass)
+
+    assert await async_setup_entry(hass, config_entry)
+    await hass.async_block_till_done()
+
+    connection = max_connection_factory.connections[config[CONF_DEVICE_PATH]]
+    for device_id in config[CONF_DEVICES]:
+        MaxCulConnection.add_paired_device(connection, int(device_id))
+
+    # wall thermostat 0B1C2D reporting 21.0 °C desired and measured
+    connection.feed_line('Z0F0100700B1C2D0000000002002A00D2' + '3C')
+    await hass.async_block_till_done()
+
+    wall = hass.states.get('climate.wall1')
+    assert wall.attributes['current_temperature'] == 21.0
+    assert wall.attributes['temperature'] == 21.0
+    assert wall.attributes[CONF_LINKED_DEVICES] == [662316]
+
+    # the linked thermostat takes over the set point and the room temperature without RF traffic
+    thermostat = hass.states.get('climate.thermostat1')
+    assert thermostat.attributes['current_temperature'] == 21.0
+    assert thermostat.attributes['temperature'] == 21.0
+    assert hass.states.get('climate.thermostat2').attributes['temperature'] is None
+
+    with patch.object(connection, 'set_temperature') as set_temperature:
+        await hass.services.async_call(
+            'climate',
+            'set_temperature',
+            {'entity_id': 'climate.thermostat1', 'temperature': 19.0},
+            blocking=True
+        )
+
+    set_temperature.assert_called_once_with(728109, 19.0, ANY)
+
+    # the wall thermostat passing 21.5 °C and 22.5 °C on to 0A1B2D reveals another link
+    connection.feed_line('Z0C0200420B1C2D0A1B2D002BE1' + '3C')
+    await hass.async_block_till_done()
+    await hass.async_block_till_done()
+
+    assert connection.linked_devices(728109) == {662316, 662317}
+    assert connection.link_partner(662317) == 728109
+    assert config_entry.data[CONF_DEVICES]['728109'][CONF_LINKED_DEVICES] == [662316, 662317]
+
+    thermostat = hass.states.get('climate.thermostat2')
+    assert thermostat.attributes['current_temperature'] == 22.5
+    assert thermostat.attributes['temperature'] == 21.5
+
+
+async def _setup_group(hass: HomeAssistant, max_connection_factory: MockConnectionFactory):
+    config_entry = MockConfigEntry(domain=DOMAIN, data=GROUP_CONFIG, entry_id='test')
+    config_entry.add_to_hass(hass)
+
+    assert await async_setup_entry(hass, config_entry)
+    await hass.async_block_till_done()
+
+    connection = max_connection_factory.connections[GROUP_CONFIG[CONF_DEVICE_PATH]]
+    written = connect_protocol(connection)
+    connection._protocol.data_received(b'21  900\r\n')
+
+    return config_entry, connection, written
+
+
+def _sent_messages(written: list) -> list:
+    return [MoritzMessage.decode_message(line) for line in written if line.startswith('Zs')]
+
+
+async def test_group_temperature_service_sends_group_message(
+    hass: HomeAssistant,
+    max_connection_factory: MockConnectionFactory
+):
+    ''' Test that selecting all thermostats of a group sends a single group message '''
+    _, connection, written = await _setup_group(hass, max_connection_factory)
+
+    await hass.services.async_call(
+        DOMAIN,
+        'set_group_temperature',
+        {'entity_id': ['climate.thermostat1', 'climate.thermostat2'], 'temperature': 21.0},
+        blocking=True
+    )
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=2))
+    await hass.async_block_till_done()
+
+    messages = _sent_messages(written)
+    assert len(messages) == 1
+    assert isinstance(messages[0], SetTemperatureMessage)
+    assert messages[0].receiver_id == 0
+    assert messages[0].group_id == 3
+    assert messages[0].desired_temperature == 21.0
+
+    connection.stop()
+
+
+async def test_group_temperature_service_sends_unicasts(
+    hass: HomeAssistant,
+    max_connection_factory: MockConnectionFactory
+):
+    ''' Test that a selection not covering a whole group sends one message per thermostat '''
+    _, connection, written = await _setup_group(hass, max_connection_factory)
+
+    await hass.services.async_call(
+        DOMAIN,
+        'set_group_temperature',
+        {'entity_id': ['climate.thermostat1', 'climate.thermostat3'], 'temperature': 19.5},
+        blocking=True
+    )
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=2))
+    await hass.async_block_till_done()
+
+    messages = _sent_messages(written)
+    assert sorted(message.receiver_id for message in messages) == [662316, 662318]
+    assert all(isinstance(message, SetTemperatureMessage) for message in messages)
+    assert all(message.desired_temperature == 19.5 for message in messages)
+
+    assert hass.states.get('climate.thermostat1').attributes['command_state'] == 'pending'
+    assert 'command_state' not in hass.states.get('climate.thermostat2').attributes
+
+    connection.stop()
+
+
+async def test_set_group_id_service(
+    hass: HomeAssistant,
+    max_connection_factory: MockConnectionFactory
+):
+    ''' Test that assigning a group sends the group id and creates the group entity '''
+    config_entry, connection, written = await _setup_group(hass, max_connection_factory)
+
+    assert hass.states.get('climate.max_group_3').attributes['members'] == ['0a1b2c', '0a1b2d']
+
+    await hass.services.async_call(
+        DOMAIN,
+        'set_group_id',
+        {'entity_id': 'climate.thermostat3', 'group_id': 5},
+        blocking=True
+    )
+    await hass.async_block_till_done()
+
+    messages = _sent_messages(written)
+    assert len(messages) == 1
+    assert isinstance(messages[0], SetGroupIdMessage)
+    assert messages[0].receiver_id == 662318
+    # pymaxcul does not decode the new group id, it is the whole payload
+    assert messages[0].raw_payload == '05'
+
+    assert hass.states.get('climate.thermostat3').attributes[CONF_GROUP_ID] == 5
+    assert config_entry.data[CONF_DEVICES]['662318'][CONF_GROUP_ID] == 5
+    assert hass.states.get('climate.max_group_5').attributes['members'] == ['0a1b2e']
+
+    connection.stop()
+
+
+async def test_set_week_program_service(
+    hass: HomeAssistant,
+    max_connection_factory: MockConnectionFactory
+):
+    ''' Test that the service validates the program and uploads only changed days '''
+    _, connection, written = await _setup_group(hass, max_connection_factory)
+
+    with pytest.raises(vol.Invalid):
+        await hass.services.async_call(
+            DOMAIN,
+            'set_week_program',
+            {
+                'entity_id': 'climate.thermostat1',
+                'week_program': {'monday': [{'temperature': 20, 'until': '22:00'}]}
+            },
+            blocking=True
+        )
+
+    assert not written
+
+    week_program = {
+        'monday': [
+            {'temperature': 17, 'until': '06:00'},
+            {'temperature': 21.5, 'until': '22:00'},
+            {'temperature': 17, 'until': '24:00'}
+        ],
+        'tuesday': [{'temperature': 19, 'until': '24:00'}]
+    }
+
+    await hass.services.async_call(
+        DOMAIN,
+        'set_week_program',
+        {'entity_id': 'climate.thermostat1', 'week_program': week_program},
+        blocking=True
+    )
+    await hass.async_block_till_done()
+
+    # pymaxcul does not decode week profiles, the payload follows the 12 byte header
+    sent = [WeekProfileMessage.decode_payload(line[24:]) for line in written if line.startswith('Zs')]
+    assert [payload['day'] for payload in sent] == ['monday', 'tuesday']
+    assert sent[0]['program'] == [[17.0, 360], [21.5, 1320], [17.0, 1440]]
+
+    for line in written:
+        if line.startswith('Zs'):
+            connection.feed_line(ack_frame(int(line[4:6], 16), 0x0A1B2C))
+
+    written.clear()
+    week_program['tuesday'] = [{'temperature': 18, 'until': '24:00'}]
+
+    await hass.services.async_call(
+        DOMAIN,
+        'set_week_program',
+        {'entity_id': 'climate.thermostat1', 'week_program': week_program},
+        blocking=True
+    )
+    await hass.async_block_till_done()
+
+    sent = [WeekProfileMessage.decode_payload(line[24:]) for line in written if line.startswith('Zs')]
+    assert [(payload['day'], payload['program']) for payload in sent] == [('tuesday', [[18.0, 1440]])]
 
+    connection.stop()
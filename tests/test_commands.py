@@ -0,0 +1,220 @@
+'''
+Test module for sending commands and tracking their ACKs
+'''
+
+from datetime import timedelta
+from unittest.mock import patch
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+import homeassistant.util.dt as dt_util
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from maxcul._const import (
+    ATTR_DESIRED_TEMPERATURE,
+    ATTR_MODE,
+    MODE_MANUAL
+)
+
+from maxcul._messages import MoritzMessage
+
+from custom_components.maxcul import (
+    ATTR_ROOM_TEMPERATURE,
+    SIGNAL_COMMAND_UPDATE,
+    SIGNAL_THERMOSTAT_UPDATE,
+    SIGNAL_WALL_THERMOSTAT_UPDATE,
+    MaxCulConnection
+)
+
+from custom_components.maxcul.commands import (
+    ATTR_COMMAND_STATE,
+    COMMAND_ACKNOWLEDGED,
+    COMMAND_FAILED,
+    COMMAND_PENDING
+)
+
+from .conftest import ack_frame, connect_protocol
+
+
+async def test_commands_wait_for_budget(hass: HomeAssistant):
+    ''' Test that commands are only written once the CUL reported enough budget '''
+
+    connection = MaxCulConnection(hass, '/dev/tty0', command_debounce=0)
+
+    written = connect_protocol(connection)
+
+    connection.set_temperature(0x0A1B2C, 21.5, MODE_MANUAL)
+
+    assert written == ['X']
+
+    connection._protocol.data_received(b'21  900\r\n')
+
+    assert written[1].startswith('Zs')
+
+    connection.stop()
+
+
+async def test_superseded_commands_are_coalesced(hass: HomeAssistant):
+    ''' Test that only the latest command within the debounce window is sent '''
+
+    connection = MaxCulConnection(hass, '/dev/tty0', command_debounce=1)
+
+    written = connect_protocol(connection)
+
+    connection._protocol.data_received(b'21  900\r\n')
+
+    for target_temperature in (19.0, 19.5, 20.0, 20.5):
+        connection.set_temperature(0x0A1B2C, target_temperature, MODE_MANUAL)
+
+    assert not written
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=2))
+    await hass.async_block_till_done()
+
+    assert len(written) == 1
+    assert MoritzMessage.decode_message(written[0]).desired_temperature == 20.5
+
+    connection.stop()
+
+
+async def test_group_temperature_is_one_message(hass: HomeAssistant):
+    ''' Test that a group temperature replaces the pending commands of its members '''
+
+    connection = MaxCulConnection(hass, '/dev/tty0', command_debounce=1)
+
+    written = connect_protocol(connection)
+
+    connection._protocol.data_received(b'21  900\r\n')
+
+    connection.set_temperature(0x0A1B2C, 19.0, MODE_MANUAL)
+    connection.set_group_temperature(3, [0x0A1B2C, 0x0A1B2D], 21.0, MODE_MANUAL)
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=2))
+    await hass.async_block_till_done()
+
+    assert len(written) == 1
+    message = MoritzMessage.decode_message(written[0])
+    assert message.receiver_id == 0
+    assert message.group_id == 3
+    assert message.desired_temperature == 21.0
+
+    connection.stop()
+
+
+async def test_commands_are_correlated_with_acks(hass: HomeAssistant):
+    ''' Test that a command is pending until its ACK and its round trip is recorded '''
+
+    connection = MaxCulConnection(hass, '/dev/tty0', command_debounce=0)
+    written = connect_protocol(connection)
+    connection._protocol.data_received(b'21  900\r\n')
+
+    states = []
+    async_dispatcher_connect(
+        hass,
+        connection.device_signal(SIGNAL_COMMAND_UPDATE, 0x0A1B2C),
+        lambda payload: states.append(payload[ATTR_COMMAND_STATE])
+    )
+
+    connection.set_temperature(0x0A1B2C, 21.5, MODE_MANUAL)
+    counter = MoritzMessage.decode_message(written[-1]).counter
+
+    # an ACK of another device with the same counter is not correlated
+    connection.feed_line(ack_frame(counter, 0x0A1B2D))
+    await hass.async_block_till_done()
+
+    assert states[-1] == COMMAND_PENDING
+
+    connection.feed_line(ack_frame(counter, 0x0A1B2C))
+    await hass.async_block_till_done()
+
+    assert states[-1] == COMMAND_ACKNOWLEDGED
+
+    stats = connection.command_stats[0x0A1B2C].as_dict()
+    assert stats['acknowledged'] == 1
+    assert stats['failure_rate'] == 0
+    assert stats['p95_ms'] is not None
+
+    connection.stop()
+
+
+async def test_unacknowledged_command_fails_after_retries(hass: HomeAssistant):
+    ''' Test that a command is resent a bounded number of times before it fails '''
+
+    connection = MaxCulConnection(hass, '/dev/tty0', command_debounce=0)
+    written = connect_protocol(connection)
+    connection._protocol.data_received(b'21  900\r\n')
+
+    states = []
+    async_dispatcher_connect(
+        hass,
+        connection.device_signal(SIGNAL_COMMAND_UPDATE, 0x0A1B2C),
+        lambda payload: states.append(payload[ATTR_COMMAND_STATE])
+    )
+
+    with patch('custom_components.maxcul.connection.ACK_BACKOFF_INTERVAL', 0):
+        connection.set_temperature(0x0A1B2C, 21.5, MODE_MANUAL)
+        for _ in range(10):
+            connection._scheduler.budget_received(9000)
+            async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=1))
+            await hass.async_block_till_done()
+
+    assert len([line for line in written if line.startswith('Zs')]) == 5
+    assert states[-1] == COMMAND_FAILED
+    assert connection.command_stats[0x0A1B2C].as_dict()['retries'] == 4
+
+    connection.stop()
+
+
+async def test_wall_thermostat_command_updates_linked_thermostats(hass: HomeAssistant):
+    ''' Test that one acknowledged command to a wall thermostat updates its linked thermostats '''
+
+    connection = MaxCulConnection(hass, '/dev/tty0', command_debounce=0)
+    connection.set_links(0x0B1C2D, [0x0A1B2C])
+    written = connect_protocol(connection)
+    connection._protocol.data_received(b'21  900\r\n')
+
+    wall_payloads = []
+    async_dispatcher_connect(
+        hass,
+        connection.device_signal(SIGNAL_WALL_THERMOSTAT_UPDATE, 0x0B1C2D),
+        wall_payloads.append
+    )
+    payloads = []
+    async_dispatcher_connect(
+        hass,
+        connection.device_signal(SIGNAL_THERMOSTAT_UPDATE, 0x0A1B2C),
+        payloads.append
+    )
+    states = []
+    async_dispatcher_connect(
+        hass,
+        connection.device_signal(SIGNAL_COMMAND_UPDATE, 0x0A1B2C),
+        lambda payload: states.append(payload[ATTR_COMMAND_STATE])
+    )
+
+    connection.set_temperature(0x0B1C2D, 19.0, MODE_MANUAL)
+    await hass.async_block_till_done()
+
+    # the linked thermostat shows the state of the command sent through its wall thermostat
+    assert states[-1] == COMMAND_PENDING
+    commands = [line for line in written if line.startswith('Zs')]
+    assert len(commands) == 1
+
+    command = MoritzMessage.decode_message('Z' + commands[0][2:])
+    assert command.receiver_id == 0x0B1C2D
+
+    connection.feed_line(ack_frame(command.counter, 0x0B1C2D))
+    await hass.async_block_till_done()
+
+    assert wall_payloads[-1][ATTR_DESIRED_TEMPERATURE] == 19.0
+    assert payloads == [{
+        'device_id': 0x0A1B2C,
+        ATTR_DESIRED_TEMPERATURE: 19.0,
+        ATTR_MODE: MODE_MANUAL,
+        ATTR_ROOM_TEMPERATURE: None
+    }]
+    assert len([line for line in written if line.startswith('Zs')]) == 1
+    assert states[-1] == COMMAND_ACKNOWLEDGED
+
+    connection.stop()
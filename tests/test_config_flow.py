@@ -0,0 +1,30 @@
+'''
+Test module for the config flow
+'''
+
+import pytest
+
+from homeassistant.core import HomeAssistant
+from homeassistant.data_entry_flow import FlowResultType
+
+from custom_components.maxcul import (
+    CONF_DEVICE_PATH,
+    DOMAIN
+)
+
+from custom_components.maxcul.config_flow import MaxculFlowHandler
+
+
+@pytest.mark.parametrize('device_path', ['telnet://localhost', 'telnet://:abc', 'foo://bar'])
+async def test_malformed_manual_path(hass: HomeAssistant, device_path: str):
+    ''' Test that a malformed device path is shown as connection error instead of raising '''
+
+    flow = MaxculFlowHandler()
+    flow.hass = hass
+    flow.handler = DOMAIN
+    flow.flow_id = 'test'
+
+    result = await flow.async_step_manual_device_path({CONF_DEVICE_PATH: device_path})
+
+    assert result['type'] == FlowResultType.FORM
+    assert result['errors'] == {'base': 'cannot_connect_to_device'}
@@ -0,0 +1,40 @@
+'''
+Test module for dropping duplicate frames
+'''
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from custom_components.maxcul import (
+    SIGNAL_THERMOSTAT_UPDATE,
+    MaxCulConnection
+)
+
+from .conftest import THERMOSTAT_STATE_FRAME
+
+
+async def test_duplicate_frames_are_dropped(hass: HomeAssistant):
+    ''' Test that a retransmitted frame is only dispatched once '''
+
+    connection = MaxCulConnection(hass, '/dev/tty0')
+    connection.add_paired_device(0x0A1B2C)
+
+    payloads = []
+    async_dispatcher_connect(
+        hass,
+        connection.device_signal(SIGNAL_THERMOSTAT_UPDATE, 0x0A1B2C),
+        payloads.append
+    )
+
+    # the same frame received with different signal strengths, e.g. by two CULs
+    connection.feed_line(THERMOSTAT_STATE_FRAME)
+    connection.feed_line(THERMOSTAT_STATE_FRAME[:-2] + '40')
+    await hass.async_block_till_done()
+
+    assert len(payloads) == 1
+
+    # the next message of the device has another counter
+    connection.feed_line('Z0F0202600A1B2C0000000019002B00E6' + '3C')
+    await hass.async_block_till_done()
+
+    assert len(payloads) == 2
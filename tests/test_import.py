@@ -0,0 +1,63 @@
+'''
+Test module for the import footprint of the integration
+'''
+
+import json
+import subprocess
+import sys
+
+# modules the integration and its platforms must not pull in when loaded
+UNWANTED_MODULES = (
+    'homeassistant.components.maxcube',
+    'maxcube',
+)
+
+# the integration and its platforms are imported after the climate component, which is
+# loaded anyway. Their own imports must stay a small fraction of that baseline, a heavy
+# dependency imported by accident exceeds it.
+IMPORT_TIME_MARGIN = 0.1
+
+IMPORT_SCRIPT = '''
+import json
+import sys
+import time
+
+start = time.perf_counter()
+
+import homeassistant.components.climate
+
+baseline = time.perf_counter() - start
+start = time.perf_counter()
+
+import custom_components.maxcul
+import custom_components.maxcul.binary_sensor
+import custom_components.maxcul.climate
+import custom_components.maxcul.sensor
+
+print(json.dumps({
+    'baseline': baseline,
+    'duration': time.perf_counter() - start,
+    'modules': sorted(sys.modules)
+}))
+'''
+
+
+def test_import_footprint():
+    ''' Test that loading the integration only imports what its platforms need '''
+
+    result = subprocess.run(
+        [sys.executable, '-c', IMPORT_SCRIPT],
+        capture_output=True,
+        check=True,
+        text=True
+    )
+    benchmark = json.loads(result.stdout.splitlines()[-1])
+
+    unwanted = [
+        module
+        for module in benchmark['modules']
+        if module.startswith(UNWANTED_MODULES)
+    ]
+
+    assert not unwanted
+    assert benchmark['duration'] < benchmark['baseline'] * IMPORT_TIME_MARGIN
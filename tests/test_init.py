@@ -1,12 +1,22 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
 from homeassistant.const import CONF_DEVICES, CONF_NAME, CONF_TYPE
 from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import device_registry as dr
 from pytest_homeassistant_custom_component.common import (
   MockConfigEntry
 )
 
 from custom_components.maxcul import (
     CONF_DEVICE_PATH,
+    CONF_MAX_DEVICES,
+    CONF_REGISTRY_FINGERPRINT,
     DOMAIN,
+    _async_reconcile_device_registry,
+    _device_fingerprint,
     async_setup_entry
 )
 
@@ -22,7 +32,7 @@ from maxcul._const import (
     HEATING_THERMOSTAT
 )
 
-from .conftest import MockConnectionFactory, max_connection_factory
+from .conftest import MockConnection, MockConnectionFactory, max_connection_factory
 
 
 async def test_setup_entry(hass):
@@ -45,6 +55,39 @@ async def test_setup_entry(hass):
     assert hass.data.get('entity_registry').entities.get('climate.thermostat1')
 
 
+async def test_entities_share_device(hass: HomeAssistant):
+    ''' Test that the entities of a device share one state object and pair it once '''
+
+    config = {
+        CONF_DEVICE_PATH: '/dev/tty0',
+        CONF_DEVICES: {
+            '12345': {
+                CONF_NAME: 'Thermostat1',
+                CONF_TYPE: HEATING_THERMOSTAT
+            }
+        }
+    }
+    config_entry = MockConfigEntry(domain=DOMAIN, data=config, entry_id='test')
+
+    with patch.object(MockConnection, 'add_paired_device') as add_paired_device:
+        assert await async_setup_entry(hass, config_entry)
+        await hass.async_block_till_done()
+
+    add_paired_device.assert_called_once_with(12345)
+
+    devices = hass.data[DOMAIN][CONF_MAX_DEVICES]['test']
+    assert list(devices) == [12345]
+
+    entities = [
+        entity
+        for platform in ('climate', 'binary_sensor', 'sensor')
+        for entity in hass.data[platform].entities
+        if entity.unique_id.startswith('12345')
+    ]
+    assert len(entities) == 4
+    assert all(entity._device is devices[12345] for entity in entities)
+
+
 async def test_pairing(hass: HomeAssistant, max_connection_factory: MockConnectionFactory):
     ''' Test pairing of device '''
 
@@ -82,3 +125,190 @@ async def test_pairing(hass: HomeAssistant, max_connection_factory: MockConnecti
         CONF_NAME: 'Thermostat1',
         CONF_TYPE: HEATING_THERMOSTAT
     }
+
+
+async def test_device_registrations_are_batched(
+    hass: HomeAssistant,
+    max_connection_factory: MockConnectionFactory
+):
+    ''' Test that pairing bursts are stored with a single config entry update '''
+
+    config = {
+        CONF_DEVICE_PATH: '/dev/tty0',
+        CONF_DEVICES: {
+            '12345': {
+                CONF_NAME: 'Thermostat1',
+                CONF_TYPE: HEATING_THERMOSTAT
+            }
+        },
+        # the device registry was reconciled with these devices before
+        CONF_REGISTRY_FINGERPRINT: _device_fingerprint(['12345'])
+    }
+    config_entry = MockConfigEntry(domain=DOMAIN, data=config, entry_id='test')
+    config_entry.add_to_hass(hass)
+
+    with patch.object(
+        hass.config_entries,
+        'async_update_entry',
+        wraps=hass.config_entries.async_update_entry
+    ) as update_entry:
+        assert await async_setup_entry(hass, config_entry)
+        await hass.async_block_till_done()
+
+        assert update_entry.call_count == 0
+
+        connection = max_connection_factory.connections[config[CONF_DEVICE_PATH]]
+        for device_id in (23456, 34567):
+            connection.call_callback(
+                EVENT_DEVICE_PAIRED,
+                {
+                    ATTR_DEVICE_ID: device_id,
+                    ATTR_DEVICE_TYPE: HEATING_THERMOSTAT,
+                    ATTR_DEVICE_SERIAL: f"Thermostat{device_id}",
+                    ATTR_FIRMWARE_VERSION: 1.0
+                }
+            )
+
+        await hass.async_block_till_done()
+        await hass.async_block_till_done()
+
+        assert update_entry.call_count == 1
+
+    assert set(config_entry.data.get(CONF_DEVICES).keys()) == {'12345', '23456', '34567'}
+
+
+async def test_pairing_service_targets_all_culs(
+    hass: HomeAssistant,
+    max_connection_factory: MockConnectionFactory
+):
+    ''' Test that the pairing service reaches each CUL by its path or all of them at once '''
+
+    for index, device_path in enumerate(('/dev/tty0', 'telnet://192.168.0.1:2323')):
+        config_entry = MockConfigEntry(
+            domain=DOMAIN,
+            data={CONF_DEVICE_PATH: device_path, CONF_DEVICES: {}},
+            entry_id=f"test{index}"
+        )
+        assert await async_setup_entry(hass, config_entry)
+    await hass.async_block_till_done()
+
+    serial = max_connection_factory.connections['/dev/tty0']
+    telnet = max_connection_factory.connections['telnet://192.168.0.1:2323']
+    serial.enable_pairing = MagicMock()
+    telnet.enable_pairing = MagicMock()
+
+    await hass.services.async_call(
+        DOMAIN,
+        'enable_pairing',
+        {'device_path': '192.168.0.1:2323', 'duration': 30},
+        blocking=True
+    )
+
+    serial.enable_pairing.assert_not_called()
+    telnet.enable_pairing.assert_called_once_with(30)
+
+    await hass.services.async_call(DOMAIN, 'enable_pairing', {'duration': 60}, blocking=True)
+
+    serial.enable_pairing.assert_called_once_with(60)
+    telnet.enable_pairing.assert_called_with(60)
+
+    with pytest.raises(HomeAssistantError):
+        await hass.services.async_call(
+            DOMAIN,
+            'enable_pairing',
+            {'device_path': '/dev/tty1'},
+            blocking=True
+        )
+
+
+async def test_stale_devices_are_removed_once(
+    hass: HomeAssistant,
+    max_connection_factory: MockConnectionFactory
+):
+    ''' Test that the device registry is only reconciled when the configured devices changed '''
+
+    devices = {
+        '12345': {
+            CONF_NAME: 'Thermostat1',
+            CONF_TYPE: HEATING_THERMOSTAT
+        }
+    }
+    changed_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_DEVICE_PATH: '/dev/tty0', CONF_DEVICES: devices},
+        entry_id='changed'
+    )
+    reconciled_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            CONF_DEVICE_PATH: '/dev/tty1',
+            CONF_DEVICES: devices,
+            CONF_REGISTRY_FINGERPRINT: _device_fingerprint(devices)
+        },
+        entry_id='reconciled'
+    )
+
+    changed_entry.add_to_hass(hass)
+    reconciled_entry.add_to_hass(hass)
+
+    device_registry = dr.async_get(hass)
+    device_registry.async_get_or_create(
+        config_entry_id=changed_entry.entry_id,
+        identifiers={(DOMAIN, '54321')}
+    )
+
+    assert await async_setup_entry(hass, changed_entry)
+    await hass.async_block_till_done()
+
+    assert not device_registry.async_get_device({(DOMAIN, '54321')})
+    assert changed_entry.data[CONF_REGISTRY_FINGERPRINT] == _device_fingerprint(devices)
+
+    device_registry.async_get_or_create(
+        config_entry_id=reconciled_entry.entry_id,
+        identifiers={(DOMAIN, '54321')}
+    )
+
+    assert await async_setup_entry(hass, reconciled_entry)
+    await hass.async_block_till_done()
+
+    # the registry is not walked again for an unchanged device map
+    assert device_registry.async_get_device({(DOMAIN, '54321')})
+
+
+async def test_fingerprint_is_kept_after_failed_removal(
+    hass: HomeAssistant,
+    max_connection_factory: MockConnectionFactory
+):
+    ''' Test that the registry is reconciled again when removing a stale device failed '''
+
+    devices = {
+        '12345': {
+            CONF_NAME: 'Thermostat1',
+            CONF_TYPE: HEATING_THERMOSTAT
+        }
+    }
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_DEVICE_PATH: '/dev/tty0', CONF_DEVICES: devices},
+        entry_id='test'
+    )
+    config_entry.add_to_hass(hass)
+
+    device_registry = dr.async_get(hass)
+    device_registry.async_get_or_create(
+        config_entry_id=config_entry.entry_id,
+        identifiers={(DOMAIN, '54321')}
+    )
+
+    with patch.object(device_registry, 'async_remove_device', side_effect=HomeAssistantError):
+        assert await async_setup_entry(hass, config_entry)
+        await hass.async_block_till_done()
+
+    assert device_registry.async_get_device({(DOMAIN, '54321')})
+    assert CONF_REGISTRY_FINGERPRINT not in config_entry.data
+
+    # the next setup of the config entry
+    _async_reconcile_device_registry(hass, config_entry)
+
+    assert not device_registry.async_get_device({(DOMAIN, '54321')})
+    assert config_entry.data[CONF_REGISTRY_FINGERPRINT] == _device_fingerprint(devices)
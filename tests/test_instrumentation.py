@@ -0,0 +1,43 @@
+'''
+Test module for the instrumentation of the receive path
+'''
+
+from unittest.mock import MagicMock
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.maxcul import MaxCulConnection
+
+from custom_components.maxcul.instrumentation import (
+    STAGE_DECODE,
+    STAGE_DISPATCH,
+    STAGE_READ
+)
+
+from .conftest import THERMOSTAT_STATE_FRAME, connect_protocol
+
+
+async def test_receive_path_is_instrumented(hass: HomeAssistant):
+    ''' Test that stage latencies and frame types are only recorded when enabled '''
+
+    disabled = MaxCulConnection(hass, '/dev/tty0')
+    disabled.add_paired_device(0x0A1B2C)
+    connect_protocol(disabled)
+    disabled._protocol.data_received(THERMOSTAT_STATE_FRAME.encode() + b'\r\n')
+
+    assert disabled.metrics.frame_count == 0
+    assert disabled.metrics.histogram(STAGE_DECODE).count == 0
+
+    enabled = MaxCulConnection(hass, '/dev/tty1', instrumentation=True)
+    enabled.add_paired_device(0x0A1B2C)
+    enabled._protocol = enabled._create_protocol()
+    enabled._protocol.connection_made(MagicMock(is_closing=MagicMock(return_value=False)))
+    enabled._protocol.data_received(THERMOSTAT_STATE_FRAME.encode() + b'\r\n')
+
+    assert enabled.metrics.frames == {'ThermostatStateMessage': 1}
+    for stage in (STAGE_READ, STAGE_DECODE, STAGE_DISPATCH):
+        assert enabled.metrics.histogram(stage).count == 1
+    assert enabled.metrics.as_dict()['stages'][STAGE_DECODE]['p95_ms'] is not None
+
+    disabled.stop()
+    enabled.stop()
@@ -0,0 +1,171 @@
+'''
+Test module for pools of CULs sharing their devices
+'''
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from maxcul._const import ATTR_DESIRED_TEMPERATURE, MODE_MANUAL
+from maxcul._messages import AckMessage, MoritzMessage
+
+from custom_components.maxcul import (
+    SIGNAL_COMMAND_UPDATE,
+    SIGNAL_THERMOSTAT_UPDATE,
+    MaxCulConnection
+)
+
+from custom_components.maxcul.commands import (
+    ATTR_COMMAND_STATE,
+    COMMAND_ACKNOWLEDGED
+)
+
+from custom_components.maxcul.pool import CulPool
+
+from .conftest import THERMOSTAT_STATE_FRAME, ack_frame, connect_protocol
+
+
+async def test_pool_merges_frames_and_routes_commands(hass: HomeAssistant):
+    ''' Test that frames of all CULs are dispatched once and commands use the best link '''
+
+    pool = CulPool()
+    owner = MaxCulConnection(hass, '/dev/tty0', command_debounce=0, pool=pool)
+    other = MaxCulConnection(hass, 'telnet://cul:2323', command_debounce=0, pool=pool)
+    owner.add_paired_device(0x0A1B2C)
+
+    owner_written = connect_protocol(owner)
+    other_written = connect_protocol(other)
+    owner._protocol.data_received(b'21  900\r\n')
+    other._protocol.data_received(b'21  900\r\n')
+
+    payloads = []
+    async_dispatcher_connect(
+        hass,
+        owner.device_signal(SIGNAL_THERMOSTAT_UPDATE, 0x0A1B2C),
+        payloads.append
+    )
+
+    # received weakly by the CUL the device is paired with and strongly by the other one
+    owner.feed_line(THERMOSTAT_STATE_FRAME[:-2] + 'B0')
+    other.feed_line(THERMOSTAT_STATE_FRAME[:-2] + '20')
+    await hass.async_block_till_done()
+
+    assert len(payloads) == 1
+    assert pool.link_quality(0x0A1B2C) == {'/dev/tty0': -114.0, 'telnet://cul:2323': -58.0}
+
+    owner_written.clear()
+    other_written.clear()
+
+    owner.set_temperature(0x0A1B2C, 21.5, MODE_MANUAL)
+
+    assert not owner_written
+    assert MoritzMessage.decode_message(other_written[-1]).desired_temperature == 21.5
+
+    owner.stop()
+    other.stop()
+
+
+async def test_pool_acknowledges_frame_once(hass: HomeAssistant):
+    ''' Test that a frame heard by two CULs is acknowledged once, a retransmission again '''
+
+    pool = CulPool()
+    owner = MaxCulConnection(hass, '/dev/tty0', pool=pool)
+    other = MaxCulConnection(hass, 'telnet://cul:2323', pool=pool)
+    owner.add_paired_device(0x0A1B2C)
+
+    written = connect_protocol(owner)
+    written_by_other = connect_protocol(other)
+    owner._protocol.data_received(b'21  900\r\n')
+    other._protocol.data_received(b'21  900\r\n')
+
+    def acks() -> int:
+        return len([
+            line
+            for line in [*written, *written_by_other]
+            if line.startswith('Zs') and isinstance(MoritzMessage.decode_message('Z' + line[2:]), AckMessage)
+        ])
+
+    owner.feed_line(THERMOSTAT_STATE_FRAME)
+    other.feed_line(THERMOSTAT_STATE_FRAME)
+
+    assert acks() == 1
+
+    # the device did not receive the ACK and repeats the frame
+    owner.feed_line(THERMOSTAT_STATE_FRAME)
+
+    assert acks() == 2
+
+    owner.stop()
+    other.stop()
+
+
+async def test_pool_routes_unicasts_to_paired_connection(hass: HomeAssistant):
+    ''' Test that unicasts are handled by the connection the sender is paired with '''
+
+    # both connections use the default sender id
+    pool = CulPool()
+    owner = MaxCulConnection(hass, '/dev/tty0', command_debounce=0, pool=pool)
+    other = MaxCulConnection(hass, 'telnet://cul:2323', command_debounce=0, pool=pool)
+    owner.add_paired_device(0x0A1B2C)
+
+    owner_written = connect_protocol(owner)
+    other_written = connect_protocol(other)
+    owner._protocol.data_received(b'21  900\r\n')
+    other._protocol.data_received(b'21  900\r\n')
+
+    payloads = []
+    async_dispatcher_connect(
+        hass,
+        owner.device_signal(SIGNAL_THERMOSTAT_UPDATE, 0x0A1B2C),
+        payloads.append
+    )
+    states = []
+    async_dispatcher_connect(
+        hass,
+        owner.device_signal(SIGNAL_COMMAND_UPDATE, 0x0A1B2C),
+        lambda payload: states.append(payload[ATTR_COMMAND_STATE])
+    )
+
+    # the state report of the thermostat addressed to the CUL is only heard by the other one
+    other.feed_line(THERMOSTAT_STATE_FRAME.replace('0A1B2C000000', '0A1B2C123456', 1))
+    await hass.async_block_till_done()
+
+    assert len(payloads) == 1
+
+    owner.set_temperature(0x0A1B2C, 21.5, MODE_MANUAL)
+    command = MoritzMessage.decode_message([*owner_written, *other_written][-1])
+
+    other.feed_line(ack_frame(command.counter, 0x0A1B2C))
+    await hass.async_block_till_done()
+
+    assert states[-1] == COMMAND_ACKNOWLEDGED
+
+    owner.stop()
+    other.stop()
+
+
+async def test_pool_routes_wall_thermostat_control(hass: HomeAssistant):
+    ''' Test that a wall thermostat control frame heard by another CUL updates the linked thermostat '''
+
+    pool = CulPool()
+    owner = MaxCulConnection(hass, '/dev/tty0', pool=pool)
+    other = MaxCulConnection(hass, 'telnet://cul:2323', pool=pool)
+    owner.set_links(0x0B1C2D, [0x0A1B2C])
+    owner.add_paired_device(0x0A1B2D)
+
+    payloads = []
+    async_dispatcher_connect(
+        hass,
+        owner.device_signal(SIGNAL_THERMOSTAT_UPDATE, 0x0A1B2D),
+        payloads.append
+    )
+
+    # wall thermostat 0B1C2D passing 21.5 °C and 22.5 °C on to 0A1B2D
+    other.feed_line('Z0C0200420B1C2D0A1B2D002BE1' + '3C')
+    await hass.async_block_till_done()
+
+    assert owner.linked_devices(0x0B1C2D) == {0x0A1B2C, 0x0A1B2D}
+    assert payloads[-1][ATTR_DESIRED_TEMPERATURE] == 21.5
+    assert not other.linked_devices(0x0B1C2D)
+
+    owner.stop()
+    other.stop()
@@ -0,0 +1,146 @@
+'''
+Test module for the duty cycle aware command scheduler
+'''
+
+import pytest
+
+from homeassistant.core import HomeAssistant
+
+from maxcul import MODE_MANUAL
+
+from maxcul._messages import (
+    AckMessage,
+    SetTemperatureMessage
+)
+
+from custom_components.maxcul.scheduler import (
+    COMMAND_REQUEST_BUDGET,
+    CREDIT_REGAIN_RATE,
+    PRIORITY_RESPONSE,
+    CommandScheduler,
+    estimate_airtime
+)
+
+
+def _set_temperature_message(counter: int) -> SetTemperatureMessage:
+    return SetTemperatureMessage(
+        counter=counter,
+        sender_id=0x123456,
+        receiver_id=0x0A1B2C,
+        desired_temperature=21.0,
+        mode=MODE_MANUAL
+    )
+
+
+async def test_waits_for_reported_budget(hass: HomeAssistant):
+    ''' Test that messages are held back until the CUL reports enough credits '''
+
+    written = []
+    scheduler = CommandScheduler(hass, lambda line: written.append(line) or True)
+
+    scheduler.enqueue(_set_temperature_message(1))
+
+    assert written == [COMMAND_REQUEST_BUDGET]
+    assert scheduler.queue_depth == 1
+
+    scheduler.budget_received(9000)
+
+    assert written[1].startswith('Zs')
+    assert scheduler.queue_depth == 0
+
+    scheduler.clear()
+
+
+async def test_responses_are_sent_first(hass: HomeAssistant):
+    ''' Test that queued responses overtake queued commands '''
+
+    written = []
+    scheduler = CommandScheduler(hass, lambda line: written.append(line) or True)
+
+    command = _set_temperature_message(1)
+    ack = AckMessage(counter=2, sender_id=0x123456, receiver_id=0x0A1B2C, group_id=0)
+
+    scheduler.enqueue(command)
+    scheduler.enqueue(ack, PRIORITY_RESPONSE)
+
+    scheduler.budget_received(int(estimate_airtime(ack.encode_message())) + 1)
+
+    assert written[1:] == [ack.encode_message()]
+    assert scheduler.queue_depth == 1
+    assert scheduler.estimated_completion > 60
+
+    scheduler.clear()
+
+
+async def test_refused_message_is_requeued(hass: HomeAssistant):
+    ''' Test that a message refused by the CUL with LOVF is sent again later '''
+
+    written = []
+    scheduler = CommandScheduler(hass, lambda line: written.append(line) or True)
+
+    scheduler.budget_received(9000)
+    scheduler.enqueue(_set_temperature_message(1))
+
+    assert scheduler.queue_depth == 0
+
+    scheduler.budget_exhausted()
+
+    assert scheduler.queue_depth == 1
+
+    scheduler.clear()
+
+
+async def test_queued_message_is_superseded(hass: HomeAssistant):
+    ''' Test that a queued message is replaced by a newer one with the same key '''
+
+    written = []
+    scheduler = CommandScheduler(hass, lambda line: written.append(line) or True)
+
+    first = _set_temperature_message(1)
+    second = _set_temperature_message(2)
+
+    scheduler.enqueue(first, key=0x0A1B2C)
+    scheduler.enqueue(second, key=0x0A1B2C)
+
+    assert scheduler.queue_depth == 1
+
+    scheduler.budget_received(9000)
+
+    assert written[1:] == [second.encode_message()]
+
+    scheduler.clear()
+
+
+async def test_delay_follows_queue_position(hass: HomeAssistant):
+    ''' Test that the estimated delay covers the airtime queued before a message '''
+
+    scheduler = CommandScheduler(hass, lambda line: True)
+
+    airtime = estimate_airtime(_set_temperature_message(1).encode_message())
+    # without credits every ms of airtime takes 100 ms to regain, the credits regained
+    # while the test runs are negligible
+    per_message = airtime / 1000 + airtime / (1000 * CREDIT_REGAIN_RATE)
+
+    delays = [scheduler.enqueue(_set_temperature_message(counter), key=counter) for counter in (1, 2, 3)]
+
+    assert delays == pytest.approx([per_message, 2 * per_message, 3 * per_message], abs=0.01)
+
+    # a superseded message keeps its position
+    assert scheduler.enqueue(_set_temperature_message(4), key=2) == pytest.approx(2 * per_message, abs=0.01)
+
+    ack = AckMessage(counter=5, sender_id=0x123456, receiver_id=0x0A1B2C, group_id=0)
+    ack_airtime = estimate_airtime(ack.encode_message())
+
+    assert scheduler.enqueue(ack, PRIORITY_RESPONSE) == pytest.approx(
+        ack_airtime / 1000 + ack_airtime / (1000 * CREDIT_REGAIN_RATE),
+        abs=0.01
+    )
+
+    scheduler.discard(1)
+
+    assert scheduler.estimated_completion == pytest.approx(
+        2 * per_message + ack_airtime / 1000 + ack_airtime / (1000 * CREDIT_REGAIN_RATE),
+        abs=0.01
+    )
+
+    scheduler.clear()
@@ -0,0 +1,135 @@
+'''
+Test module for sensors
+'''
+
+from homeassistant.components.sensor import (
+    ATTR_STATE_CLASS,
+    SensorStateClass
+)
+
+from homeassistant.const import (
+    CONF_DEVICES,
+    CONF_NAME,
+    CONF_TYPE
+)
+
+from homeassistant.core import HomeAssistant
+
+from pytest_homeassistant_custom_component.common import (
+  MockConfigEntry,
+  async_capture_events
+)
+
+from maxcul import (
+    EVENT_PUSH_BUTTON_UPDATE,
+    EVENT_THERMOSTAT_UPDATE
+)
+
+from maxcul._const import (
+    ATTR_BATTERY_LOW,
+    ATTR_DESIRED_TEMPERATURE,
+    ATTR_DEVICE_ID,
+    ATTR_MEASURED_TEMPERATURE,
+    ATTR_MODE,
+    ATTR_STATE,
+    ATTR_VALVE_POSITION,
+    HEATING_THERMOSTAT,
+    MODE_MANUAL,
+    PUSH_BUTTON
+)
+
+from custom_components.maxcul import (
+    CONF_DEVICE_PATH,
+    DOMAIN,
+    async_setup_entry
+)
+
+from custom_components.maxcul.max_push_button import (
+    ATTR_BUTTON,
+    BUTTON_COMFORT,
+    BUTTON_ECO,
+    EVENT_PUSH_BUTTON_PRESSED
+)
+
+from .conftest import MockConnectionFactory
+
+
+async def test_thermostat_sensors(hass: HomeAssistant, max_connection_factory: MockConnectionFactory):
+    ''' Test that valve position and measured temperature are sensors instead of climate attributes '''
+
+    config = {
+        CONF_DEVICE_PATH: '/dev/tty0',
+        CONF_DEVICES: {
+            '12345': {
+                CONF_NAME: 'Thermostat1',
+                CONF_TYPE: HEATING_THERMOSTAT
+            }
+        }
+    }
+    config_entry = MockConfigEntry(domain=DOMAIN, data=config, entry_id='test')
+
+    assert await async_setup_entry(hass, config_entry)
+    await hass.async_block_till_done()
+
+    connection = max_connection_factory.connections[config[CONF_DEVICE_PATH]]
+
+    connection.call_callback(
+        EVENT_THERMOSTAT_UPDATE,
+        {
+            ATTR_DEVICE_ID: 12345,
+            ATTR_MEASURED_TEMPERATURE: 19.5,
+            ATTR_DESIRED_TEMPERATURE: 21.0,
+            ATTR_VALVE_POSITION: 35,
+            ATTR_MODE: MODE_MANUAL,
+            ATTR_BATTERY_LOW: False
+        }
+    )
+    await hass.async_block_till_done()
+
+    valve_position = hass.states.get('sensor.thermostat1_valve_position')
+    assert valve_position.state == '35'
+    assert valve_position.attributes[ATTR_STATE_CLASS] == SensorStateClass.MEASUREMENT
+
+    measured_temperature = hass.states.get('sensor.thermostat1_measured_temperature')
+    assert measured_temperature.state == '19.5'
+    assert measured_temperature.attributes[ATTR_STATE_CLASS] == SensorStateClass.MEASUREMENT
+
+    thermostat = hass.states.get('climate.thermostat1')
+    assert thermostat.attributes['hvac_action'] == 'heating'
+    assert ATTR_VALVE_POSITION not in thermostat.attributes
+
+
+async def test_push_button(hass: HomeAssistant, max_connection_factory: MockConnectionFactory):
+    ''' Test that every press of an eco push button is fired as event and shown as state '''
+
+    config = {
+        CONF_DEVICE_PATH: '/dev/tty0',
+        CONF_DEVICES: {
+            '23456': {
+                CONF_NAME: 'EcoButton1',
+                CONF_TYPE: PUSH_BUTTON
+            }
+        }
+    }
+    config_entry = MockConfigEntry(domain=DOMAIN, data=config, entry_id='test')
+
+    assert await async_setup_entry(hass, config_entry)
+    await hass.async_block_till_done()
+
+    events = async_capture_events(hass, EVENT_PUSH_BUTTON_PRESSED)
+    connection = max_connection_factory.connections[config[CONF_DEVICE_PATH]]
+
+    for state in (False, False, True):
+        connection.call_callback(
+            EVENT_PUSH_BUTTON_UPDATE,
+            {
+                ATTR_DEVICE_ID: 23456,
+                ATTR_BATTERY_LOW: False,
+                ATTR_STATE: state
+            }
+        )
+        await hass.async_block_till_done()
+
+    assert [event.data[ATTR_BUTTON] for event in events] == [BUTTON_ECO, BUTTON_ECO, BUTTON_COMFORT]
+    assert hass.states.get('sensor.ecobutton1').state == BUTTON_COMFORT
+    assert hass.states.get('binary_sensor.ecobutton1_battery').state == 'off'
@@ -0,0 +1,114 @@
+'''
+Test module running connections against the simulated CUL
+'''
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from maxcul._const import MODE_MANUAL
+
+from custom_components.maxcul import (
+    SIGNAL_COMMAND_UPDATE,
+    SIGNAL_SHUTTER_UPDATE,
+    SIGNAL_THERMOSTAT_UPDATE,
+    MaxCulConnection
+)
+
+from custom_components.maxcul.commands import ATTR_COMMAND_STATE, COMMAND_ACKNOWLEDGED
+
+from .cul_simulator import CulSimulator, SimulatedShutterContact, SimulatedThermostat
+
+
+async def _wait_for(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.05)
+    raise AssertionError('condition not met')
+
+
+async def _run_against(hass: HomeAssistant, simulator: CulSimulator, device_path: str):
+    thermostat, shutter = simulator.devices
+
+    with patch('custom_components.maxcul.connection.CUL_BOOT_DELAY', 0):
+        connection = MaxCulConnection(hass, device_path, command_debounce=0)
+        connection.add_paired_device(thermostat)
+        connection.add_paired_device(shutter)
+
+        reports = []
+        states = []
+        async_dispatcher_connect(
+            hass,
+            connection.device_signal(SIGNAL_THERMOSTAT_UPDATE, thermostat),
+            reports.append
+        )
+        async_dispatcher_connect(
+            hass,
+            connection.device_signal(SIGNAL_SHUTTER_UPDATE, shutter),
+            reports.append
+        )
+        async_dispatcher_connect(
+            hass,
+            connection.device_signal(SIGNAL_COMMAND_UPDATE, thermostat),
+            lambda payload: states.append(payload[ATTR_COMMAND_STATE])
+        )
+
+        connection.start()
+        await _wait_for(lambda: connection.cul_version is not None)
+
+        simulator.report(thermostat)
+        simulator.report(shutter)
+        await _wait_for(lambda: len(reports) == 2)
+
+        connection.set_temperature(thermostat, 23.5, MODE_MANUAL)
+        await _wait_for(lambda: states and states[-1] == COMMAND_ACKNOWLEDGED)
+
+        assert simulator.devices[thermostat].desired_temperature == 23.5
+        assert connection.command_stats[thermostat].as_dict()['acknowledged'] == 1
+
+        connection.stop()
+
+
+@pytest.mark.enable_socket
+async def test_connection_over_tcp(hass: HomeAssistant):
+    ''' Test that reports and command ACKs of simulated devices pass a telnet CUL '''
+
+    simulator = CulSimulator([SimulatedThermostat(0x0A1B2C), SimulatedShutterContact(0x0A1B2D)])
+    device_path = await simulator.start_tcp()
+
+    await _run_against(hass, simulator, device_path)
+
+    await simulator.stop()
+
+
+async def test_connection_over_pty(hass: HomeAssistant):
+    ''' Test that reports and command ACKs of simulated devices pass a serial CUL '''
+
+    simulator = CulSimulator([SimulatedThermostat(0x0A1B2C), SimulatedShutterContact(0x0A1B2D)])
+    device_path = await simulator.start_pty()
+
+    await _run_against(hass, simulator, device_path)
+
+    await simulator.stop()
+
+
+async def test_duty_cycle_is_enforced():
+    ''' Test that transmissions beyond the credits are refused and lost packets are not acknowledged '''
+
+    simulator = CulSimulator([SimulatedThermostat(0x0A1B2C)], credits=1500, packet_loss=1.0)
+    written = []
+    simulator._writers.append(written.append)
+
+    command = 'Zs0B010040123456' + '0A1B2C' + '0047'
+    simulator._command_received(command)
+    simulator._command_received(command)
+    await asyncio.sleep(0.1)
+
+    assert written == ['LOVF']
+    assert simulator.refused == 1
+    assert len(simulator.transmitted) == 1
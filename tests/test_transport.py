@@ -0,0 +1,237 @@
+'''
+Test module for the CUL transport and the MAX! message handling of connections
+'''
+
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from maxcul._const import (
+    ATTR_BATTERY_LOW,
+    ATTR_DESIRED_TEMPERATURE,
+    ATTR_MEASURED_TEMPERATURE,
+    ATTR_MODE,
+    ATTR_VALVE_POSITION,
+    MODE_MANUAL
+)
+
+from custom_components.maxcul import (
+    SIGNAL_BATTERY_UPDATE,
+    SIGNAL_THERMOSTAT_UPDATE,
+    MaxCulConnection
+)
+
+from custom_components.maxcul.transport import (
+    TELNET_PREFIX,
+    CulProtocol,
+    async_probe_culs
+)
+
+from .conftest import THERMOSTAT_STATE_FRAME, WALL_THERMOSTAT_STATE_FRAME, connect_protocol
+
+
+def test_protocol_splits_lines():
+    ''' Test that the protocol reassembles lines from arbitrary chunks '''
+
+    lines = []
+    protocol = CulProtocol(lines.append)
+    protocol.connection_made(MagicMock())
+
+    protocol.data_received(b'V 1.67 nan')
+    protocol.data_received(b'oCUL868\r\n21  900\r')
+    protocol.data_received(b'\n\r\nZ0B')
+
+    assert lines == ['V 1.67 nanoCUL868', '21  900']
+
+
+async def test_frame_is_dispatched_on_loop(hass: HomeAssistant):
+    ''' Test that a raw CUL line is decoded and dispatched to its device signal '''
+
+    connection = MaxCulConnection(hass, '/dev/tty0')
+    connection.add_paired_device(0x0A1B2C)
+
+    payloads = []
+    async_dispatcher_connect(
+        hass,
+        connection.device_signal(SIGNAL_THERMOSTAT_UPDATE, 0x0A1B2C),
+        payloads.append
+    )
+
+    connection.feed_line(THERMOSTAT_STATE_FRAME)
+
+    assert len(payloads) == 1
+    assert payloads[0][ATTR_MEASURED_TEMPERATURE] == 23.0
+    assert payloads[0][ATTR_DESIRED_TEMPERATURE] == 21.5
+    assert payloads[0][ATTR_VALVE_POSITION] == 0
+    assert payloads[0][ATTR_MODE] == MODE_MANUAL
+
+
+async def test_frames_of_unpaired_devices_are_dropped(hass: HomeAssistant):
+    ''' Test that broadcasts of devices which are not paired are ignored '''
+
+    connection = MaxCulConnection(hass, '/dev/tty0')
+
+    payloads = []
+    async_dispatcher_connect(
+        hass,
+        connection.device_signal(SIGNAL_THERMOSTAT_UPDATE, 0x0A1B2C),
+        payloads.append
+    )
+
+    connection.feed_line(THERMOSTAT_STATE_FRAME)
+
+    assert not payloads
+
+
+async def test_battery_flips_are_dispatched(hass: HomeAssistant):
+    ''' Test that the battery signal of a device is only sent when its flag changes '''
+
+    connection = MaxCulConnection(hass, '/dev/tty0')
+    connection.add_paired_device(0x0A1B2C)
+    connection.add_paired_device(0x0B1C2D)
+
+    payloads = []
+    for device_id in (0x0A1B2C, 0x0B1C2D):
+        async_dispatcher_connect(
+            hass,
+            connection.device_signal(SIGNAL_BATTERY_UPDATE, device_id),
+            payloads.append
+        )
+
+    connection.feed_line(THERMOSTAT_STATE_FRAME)
+    connection.feed_line(THERMOSTAT_STATE_FRAME.replace('Z0F01', 'Z0F02', 1))
+    await hass.async_block_till_done()
+
+    assert [payload[ATTR_BATTERY_LOW] for payload in payloads] == [False]
+    assert connection.battery_low(0x0A1B2C) is False
+
+    connection.feed_line(WALL_THERMOSTAT_STATE_FRAME)
+    await hass.async_block_till_done()
+
+    assert payloads[-1] == {'device_id': 0x0B1C2D, ATTR_BATTERY_LOW: True}
+    assert connection.battery_low(0x0B1C2D) is True
+
+
+@pytest.mark.enable_socket
+async def test_probe_returns_banners_concurrently(hass: HomeAssistant):
+    ''' Test that CUL devices are probed in parallel and a silent device is given up '''
+
+    closed = []
+
+    async def handle_cul(reader, writer):
+        while await reader.readline():
+            writer.write(b'V 1.67 nanoCUL868\r\n')
+        closed.append(writer)
+
+    async def handle_silent(reader, writer):
+        while await reader.readline():
+            pass
+        closed.append(writer)
+
+    cul_server = await asyncio.start_server(handle_cul, '127.0.0.1', 0)
+    silent_server = await asyncio.start_server(handle_silent, '127.0.0.1', 0)
+
+    cul_path = f"{TELNET_PREFIX}127.0.0.1:{cul_server.sockets[0].getsockname()[1]}"
+    silent_path = f"{TELNET_PREFIX}127.0.0.1:{silent_server.sockets[0].getsockname()[1]}"
+
+    start = time.monotonic()
+    banners = await async_probe_culs(hass.loop, [cul_path, silent_path], timeout=1)
+
+    assert time.monotonic() - start < 2
+    assert banners == {
+        cul_path: 'V 1.67 nanoCUL868',
+        silent_path: None
+    }
+
+    await asyncio.sleep(0.1)
+    assert len(closed) == 2
+
+    for writer in closed:
+        writer.close()
+
+    for server in (cul_server, silent_server):
+        server.close()
+        await server.wait_closed()
+
+
+async def test_probe_does_not_need_python_3_11(hass: HomeAssistant, monkeypatch: pytest.MonkeyPatch):
+    ''' Test that probing works without asyncio.timeout, which Python 3.10 lacks '''
+
+    monkeypatch.delattr(asyncio, 'timeout', raising=False)
+
+    assert await async_probe_culs(hass.loop, ['foo://bar'], timeout=1) == {'foo://bar': None}
+
+
+@pytest.mark.enable_socket
+async def test_lost_connection_is_reestablished(hass: HomeAssistant):
+    ''' Test that a dropped network CUL is reconnected and initialized again '''
+
+    received = []
+    clients = []
+
+    async def handle_cul(reader, writer):
+        clients.append(writer)
+        while line := await reader.readline():
+            received.append(line.strip().decode())
+            if line.startswith(b'V'):
+                writer.write(b'V 1.67 nanoCUL868\r\n')
+
+    server = await asyncio.start_server(handle_cul, '127.0.0.1', 0)
+    device_path = f"{TELNET_PREFIX}127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+    with (
+        patch('custom_components.maxcul.connection.CUL_BOOT_DELAY', 0),
+        patch('custom_components.maxcul.connection.RECONNECT_BACKOFF_MIN', 0.05)
+    ):
+        connection = MaxCulConnection(hass, device_path)
+        connection.start()
+
+        async def wait_for(condition):
+            for _ in range(100):
+                if condition():
+                    return
+                await asyncio.sleep(0.05)
+            raise AssertionError('condition not met')
+
+        await wait_for(lambda: 'T01' in received)
+        assert connection.is_connected
+
+        clients[0].close()
+        await wait_for(lambda: received.count('T01') == 2)
+
+        assert connection.is_connected
+        assert connection.reconnect_count == 1
+        assert connection.downtime > 0
+
+        connection.stop()
+
+    for writer in clients:
+        writer.close()
+    server.close()
+    await server.wait_closed()
+
+
+async def test_silent_link_is_aborted(hass: HomeAssistant):
+    ''' Test that the keepalive asks an idle CUL for its budget and drops a dead link '''
+
+    connection = MaxCulConnection(hass, f"{TELNET_PREFIX}cul:2323")
+    written = connect_protocol(connection)
+    transport = connection._protocol._transport
+
+    connection._last_line_received -= 65
+    connection._keepalive(None)
+
+    assert written == ['X']
+    transport.abort.assert_not_called()
+
+    connection._last_line_received -= 15
+    connection._keepalive(None)
+
+    transport.abort.assert_called_once()
+
+    connection.stop()
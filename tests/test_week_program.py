@@ -0,0 +1,190 @@
+'''
+Test module for the validation and encoding of weekly programs
+'''
+
+import pytest
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.maxcul import MaxCulConnection
+
+from custom_components.maxcul.week_program import (
+    MAX_SWITCH_POINTS,
+    WEEK_PROGRAM_SCHEMA,
+    WeekProfileMessage,
+    encode_day_program,
+    parse_until
+)
+
+from .conftest import ack_frame, connect_protocol
+
+
+@pytest.mark.parametrize(
+    ('value', 'minutes'),
+    [('00:05', 5), ('06:00', 360), ('6:30', 390), ('23:55', 1435), ('24:00', 1440)]
+)
+def test_until_is_parsed(value: str, minutes: int):
+    ''' Test that times of the day are returned in minutes '''
+
+    assert parse_until(value) == minutes
+
+
+@pytest.mark.parametrize(
+    'value',
+    ['00:00', '24:05', '25:00', '06:60', '06:03', '06', '06:00:00', 'noon', '', None]
+)
+def test_invalid_until_is_rejected(value):
+    ''' Test that times outside of the day, off the 5 minute grid or not in HH:MM are rejected '''
+
+    with pytest.raises(vol.Invalid):
+        parse_until(value)
+
+
+def test_week_program_is_validated():
+    ''' Test that switch points must be ordered and last until the end of the day '''
+
+    with pytest.raises(vol.Invalid):
+        WEEK_PROGRAM_SCHEMA({'monday': [{'temperature': 20, 'until': '22:00'}]})
+
+    with pytest.raises(vol.Invalid):
+        WEEK_PROGRAM_SCHEMA({'monday': [
+            {'temperature': 20, 'until': '22:00'},
+            {'temperature': 18, 'until': '06:00'},
+            {'temperature': 17, 'until': '24:00'}
+        ]})
+
+    with pytest.raises(vol.Invalid):
+        WEEK_PROGRAM_SCHEMA({'monday': [{'temperature': 20, 'until': '06:03'}]})
+
+
+def test_week_program_limits():
+    ''' Test the limits of days, switch points and temperatures '''
+
+    with pytest.raises(vol.Invalid):
+        WEEK_PROGRAM_SCHEMA({'someday': [{'temperature': 20, 'until': '24:00'}]})
+
+    with pytest.raises(vol.Invalid):
+        WEEK_PROGRAM_SCHEMA({'monday': []})
+
+    with pytest.raises(vol.Invalid):
+        WEEK_PROGRAM_SCHEMA({'monday': [
+            {'temperature': 20, 'until': f"{hour:02d}:00"}
+            for hour in range(24 - MAX_SWITCH_POINTS, 25)
+        ]})
+
+    with pytest.raises(vol.Invalid):
+        WEEK_PROGRAM_SCHEMA({'monday': [{'temperature': 31, 'until': '24:00'}]})
+
+    with pytest.raises(vol.Invalid):
+        WEEK_PROGRAM_SCHEMA({'monday': [
+            {'temperature': 20, 'until': '12:00'},
+            {'temperature': 20, 'until': '12:00'},
+            {'temperature': 20, 'until': '24:00'}
+        ]})
+
+    # temperatures are rounded to the half degree steps of the thermostats
+    assert WEEK_PROGRAM_SCHEMA({'sunday': [{'temperature': '20.8', 'until': '24:00'}]}) == {
+        'sunday': [[21.0, 1440]]
+    }
+
+
+def test_day_program_is_encoded():
+    ''' Test the payload of a day and the split of more than 7 switch points '''
+
+    assert encode_day_program('saturday', [[17.0, 360], [21.5, 1440]]) == ['00' + '4448' + '5720']
+
+    program = [[4.5 + index, 100 * (index + 1)] for index in range(MAX_SWITCH_POINTS - 1)]
+    program.append([30.5, 1440])
+
+    payloads = encode_day_program('friday', program)
+
+    assert len(payloads) == 2
+    assert payloads[0][:2] == '06'
+    assert payloads[1][:2] == '16'
+
+    decoded = [WeekProfileMessage.decode_payload(payload) for payload in payloads]
+    assert [(payload['day'], payload['part']) for payload in decoded] == [('friday', 0), ('friday', 1)]
+    assert [len(payload['program']) for payload in decoded] == [7, 6]
+    assert decoded[0]['program'] + decoded[1]['program'] == program
+
+
+async def test_week_program_sends_changed_days(hass: HomeAssistant):
+    ''' Test that only days differing from the acknowledged program are uploaded '''
+
+    connection = MaxCulConnection(hass, '/dev/tty0')
+    written = connect_protocol(connection)
+    connection._protocol.data_received(b'21  900\r\n')
+
+    workday = WEEK_PROGRAM_SCHEMA({
+        'monday': [
+            {'temperature': 17, 'until': '06:00'},
+            {'temperature': 21.5, 'until': '22:00'},
+            {'temperature': 17, 'until': '24:00'}
+        ]
+    })['monday']
+    # 8 switch points take two messages
+    busy_day = [[18 + index / 2, 180 * (index + 1)] for index in range(8)]
+
+    days = connection.set_week_program(0x0A1B2C, {'monday': workday, 'sunday': busy_day})
+    await hass.async_block_till_done()
+
+    assert days == ['monday', 'sunday']
+    # pymaxcul does not decode week profiles, the payload follows the 12 byte header
+    sent = [
+        WeekProfileMessage.decode_payload(line[24:])
+        for line in written if line.startswith('Zs')
+    ]
+    assert [(payload['day'], payload['part']) for payload in sent] == [
+        ('monday', 0),
+        ('sunday', 0),
+        ('sunday', 1)
+    ]
+    assert sent[0]['program'] == [[17.0, 360], [21.5, 1320], [17.0, 1440]]
+    assert sent[1]['program'] + sent[2]['program'] == busy_day
+
+    for line in written:
+        if line.startswith('Zs'):
+            connection.feed_line(ack_frame(int(line[4:6], 16), 0x0A1B2C))
+
+    assert connection.week_program(0x0A1B2C) == {'monday': workday, 'sunday': busy_day}
+
+    written.clear()
+    days = connection.set_week_program(0x0A1B2C, {'monday': workday, 'sunday': busy_day[1:]})
+    await hass.async_block_till_done()
+
+    # the remaining 7 switch points fit into one message
+    assert days == ['sunday']
+    assert len([line for line in written if line.startswith('Zs')]) == 1
+
+    # the day is unknown again until the device acknowledged the new program
+    assert 'sunday' not in connection.week_program(0x0A1B2C)
+
+    connection.stop()
+
+
+async def test_week_program_drops_stale_parts(hass: HomeAssistant):
+    ''' Test that a shorter program of a day drops queued parts of an earlier upload '''
+
+    connection = MaxCulConnection(hass, '/dev/tty0')
+    written = connect_protocol(connection)
+
+    # no credits, all parts stay queued
+    connection._protocol.data_received(b'00  000\r\n')
+
+    long_day = [[18 + index / 2, 120 * (index + 1)] for index in range(10)] + [[17.0, 1440]]
+    connection.set_week_program(0x0A1B2C, {'monday': long_day})
+
+    assert connection.queue_depth == 2
+
+    connection.set_week_program(0x0A1B2C, {'monday': [[17.0, 360], [21.5, 1320], [17.0, 1440]]})
+
+    assert connection.queue_depth == 1
+
+    connection._protocol.data_received(b'21  900\r\n')
+
+    sent = [WeekProfileMessage.decode_payload(line[24:]) for line in written if line.startswith('Zs')]
+    assert [(payload['day'], payload['part']) for payload in sent] == [('monday', 0)]
+    assert sent[0]['program'] == [[17.0, 360], [21.5, 1320], [17.0, 1440]]
+
+    connection.stop()